@@ -0,0 +1,45 @@
+"""timezone-aware timestamps on users, plans and subscriptions
+
+Needs a maintenance window: each ALTER COLUMN ... TYPE rewrites its table under an ACCESS EXCLUSIVE lock,
+so users, plans and subscriptions refuse reads and writes until the rewrite is done.
+Databases already past 0002 got this conversion from an earlier version of 0002 and never run this one.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001a"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+TIMESTAMP_COLUMNS = [
+    ("users", "created_at"),
+    ("plans", "created_at"),
+    ("plans", "updated_at"),
+    ("subscriptions", "start_date"),
+    ("subscriptions", "end_date"),
+]
+
+
+def upgrade():
+    # Naive timestamps were written as UTC
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.DateTime(timezone=True),
+            postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+        )
+
+
+def downgrade():
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.DateTime(),
+            postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+        )
@@ -0,0 +1,57 @@
+"""hot-path subscription indexes, one active subscription per user
+
+Safe on a live database: the dedupe UPDATE only locks the duplicate active rows it deactivates,
+and the indexes are built CONCURRENTLY so the subscriptions table keeps taking reads and writes.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001a"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # The old check-then-insert could let duplicates through: keep each user's newest active subscription
+    op.execute(
+        """
+        UPDATE subscriptions SET is_active = false
+        WHERE is_active AND id NOT IN (
+            SELECT max(id) FROM subscriptions WHERE is_active GROUP BY user_id
+        )
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_subscriptions_user_id_is_active", "subscriptions", ["user_id", "is_active"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_subscriptions_plan_id_id", "subscriptions", ["plan_id", "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_subscriptions_active_end_date", "subscriptions", ["end_date"],
+            postgresql_where=sa.text("is_active"), postgresql_concurrently=True,
+        )
+        op.create_index(
+            "uq_subscriptions_one_active_per_user", "subscriptions", ["user_id"],
+            unique=True, postgresql_where=sa.text("is_active"), postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name in (
+            "uq_subscriptions_one_active_per_user",
+            "ix_subscriptions_active_end_date",
+            "ix_subscriptions_plan_id_id",
+            "ix_subscriptions_user_id_is_active",
+        ):
+            op.drop_index(name, table_name="subscriptions", postgresql_concurrently=True)
@@ -0,0 +1,54 @@
+"""subscription analytics rollups: active subscribers per plan, daily new / cancelled counts
+
+Adds subscriptions.cancelled_at and fills the rollups from the existing rows.
+Cancellations made before this revision have no timestamp, so past days only count new subscriptions.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("subscriptions", sa.Column("cancelled_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_table(
+        "plan_subscription_stats",
+        sa.Column("plan_id", sa.Integer(), sa.ForeignKey("plans.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("active_subscribers", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_table(
+        "daily_subscription_stats",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("new_subscriptions", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("cancellations", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute(
+        """
+        INSERT INTO plan_subscription_stats (plan_id, active_subscribers)
+        SELECT plans.id, count(subscriptions.id)
+        FROM plans LEFT JOIN subscriptions ON subscriptions.plan_id = plans.id AND subscriptions.is_active
+        GROUP BY plans.id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO daily_subscription_stats (day, new_subscriptions)
+        SELECT date(timezone('UTC', start_date)), count(*)
+        FROM subscriptions WHERE start_date IS NOT NULL
+        GROUP BY 1
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("daily_subscription_stats")
+    op.drop_table("plan_subscription_stats")
+    op.drop_column("subscriptions", "cancelled_at")
@@ -0,0 +1,32 @@
+"""renewal_runs: checkpoints of the chunked subscription renewal job
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "renewal_runs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("cutoff", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_subscription_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("renewed", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("batches", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("checkpoint_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table("renewal_runs")
@@ -0,0 +1,96 @@
+# Admission control for POST /auth/login
+# A credential-stuffing burst must not turn into unbounded bcrypt work:
+#  - token buckets per client IP and per account refuse attempts beyond a steady rate
+#  - at most `max_concurrent` logins per worker verify a password at once, a few more wait
+#    briefly for a slot, anything beyond is refused right away
+# Refused logins raise LoginThrottledError, which main.py turns into 429 + Retry-After
+import asyncio
+import math
+from functools import lru_cache
+
+from .cache_backend import get_cache_backend
+from .config import get_settings
+
+class LoginThrottledError(Exception):
+    """Login refused by admission control. retry_after is in seconds."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Login throttled, retry after {retry_after:.1f}s")
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class LoginAdmission:
+    """Caps concurrent logins in this worker, with a bounded wait queue and a deadline."""
+
+    def __init__(self, max_concurrent: int, queue_limit: int, queue_timeout: float):
+        self.max_concurrent = max(max_concurrent, 1)
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # A semaphore belongs to one event loop (tests start a new loop per client)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    def _reject(self):
+        self.rejected += 1
+        raise LoginThrottledError(self.queue_timeout)
+
+    async def __aenter__(self):
+        semaphore = self._get_semaphore()
+        if semaphore.locked():
+            if self.waiting >= self.queue_limit:
+                self._reject()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._reject()
+            finally:
+                self.waiting -= 1
+        else:
+            await semaphore.acquire()
+        self.active += 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent,
+            "queue_limit": self.queue_limit,
+        }
+
+def check_login_rate(client_ip: str | None, username: str):
+    """Take a token from the client's and the account's bucket, raise LoginThrottledError when either is empty."""
+    settings = get_settings()
+    backend = get_cache_backend()
+    buckets = [
+        (f"login:ip:{client_ip}", settings.login_ip_per_minute, settings.login_ip_burst),
+        (f"login:account:{username.strip().lower()}", settings.login_account_per_minute, settings.login_account_burst),
+    ]
+    for key, per_minute, burst in buckets:
+        if per_minute <= 0 or (key.startswith("login:ip:") and client_ip is None):
+            continue
+        wait = backend.take_token(key, per_minute / 60, burst)
+        if wait > 0:
+            get_login_admission().rejected += 1
+            raise LoginThrottledError(wait)
+
+# Built from the settings on first use
+@lru_cache
+def get_login_admission() -> LoginAdmission:
+    settings = get_settings()
+    return LoginAdmission(settings.login_max_concurrent, settings.login_queue_limit, settings.login_queue_timeout)
@@ -0,0 +1,23 @@
+# Batch lookups: GET /users/batch, /plans/batch and /subscriptions/batch?ids=1,2,3
+# One request and one IN (...) query for many ids, instead of a GET /{id} per id.
+# Found rows come back keyed by id; ids that don't exist are listed in "missing"
+# (and ids the caller may not see in "forbidden"), so callers never have to diff the result
+from fastapi import HTTPException, Query
+
+MAX_BATCH_IDS = 100
+
+def batch_ids(ids: str = Query(..., description=f"Comma separated ids, at most {MAX_BATCH_IDS}")) -> list[int]:
+    """Dependency: the ?ids= list, parsed, without duplicates, in request order."""
+    try:
+        parsed = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be comma separated integers")
+    parsed = list(dict.fromkeys(parsed))
+    if not parsed or len(parsed) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=422, detail=f"Pass 1 to {MAX_BATCH_IDS} ids")
+    return parsed
+
+def missing_ids(ids: list[int], found) -> list[int]:
+    """The requested ids that are not in `found` (ids or rows with an id)."""
+    found_ids = {item if isinstance(item, int) else item.id for item in found}
+    return [item_id for item_id in ids if item_id not in found_ids]
@@ -0,0 +1,296 @@
+# Caches shared by routes and CRUD
+# Every worker keeps its own copy (TTLCache / PlanCatalogCache) in front of the shared tier in app/cache_backend.py
+# Each cache is built from the settings on first use (get_principal_cache() etc.), not at import
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from pydantic import TypeAdapter
+
+from .cache_backend import get_cache_backend
+from .config import get_settings
+from .database.schemas.plan import Plan
+from .database.schemas.user import Principal
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire `ttl` seconds after they were set. Thread safe."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SharedCache:
+    """A TTLCache in this worker in front of the shared cache backend.
+    Values go to the backend as bytes (dumps / loads); invalidate() drops a key in every worker.
+    """
+
+    def __init__(self, prefix: str, maxsize: int, ttl: float, dumps, loads):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._dumps = dumps
+        self._loads = loads
+
+    def get_local(self, key):
+        """This worker's copy only. Never does I/O, so it is safe on the event loop."""
+        return self.local.get(key)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None:
+            raw = get_cache_backend().get(self.prefix + key)
+            if raw is not None:
+                value = self._loads(raw)
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        get_cache_backend().set(self.prefix + key, self._dumps(value), self.ttl)
+
+    def invalidate(self, key):
+        self.local.delete(key)
+        backend = get_cache_backend()
+        backend.delete(self.prefix + key)
+        backend.publish(self.prefix + key)
+
+    def clear(self):
+        """Drop this worker's copies (the shared tier keeps its entries until they expire)."""
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.local.hits, "misses": self.local.misses, "size": len(self.local)}
+
+# Resolved principals for get_current_user, keyed by token subject (email)
+# crud.users invalidates entries when a user is updated or deleted
+@lru_cache
+def get_principal_cache() -> SharedCache:
+    settings = get_settings()
+    return SharedCache(
+        "principal:",
+        maxsize=settings.principal_cache_size,
+        # Upper bound on how stale a principal can get when it changes outside the CRUD layer
+        ttl=settings.principal_cache_ttl,
+        dumps=lambda principal: principal.model_dump_json().encode(),
+        loads=Principal.model_validate_json,
+    )
+
+# Token version of a user who no longer exists or was deactivated: every token is older
+ALL_REVOKED = float("inf")
+
+class TokenRevocations:
+    """Current token version of users (bumped on password, role or email change, deactivation, deletion).
+    Access tokens carry the version they were issued with ("ver"); an older one is rejected.
+    The users table is the source of truth (crud.users.get_token_version loads it on a miss); this worker
+    keeps what it loaded for the TTL, and revocations are also pushed to the shared tier so other workers
+    learn them before their copy expires. A missing shared record never counts as "not revoked".
+    """
+
+    prefix = "tokenver:"
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get_local(self, user_id: int) -> int | float | None:
+        """This worker's copy only, safe on the event loop. None means unknown, not "never revoked"."""
+        return self.local.get(user_id)
+
+    def get_shared(self, user_id: int) -> int | None:
+        """The version a revoking worker published, if the shared tier still has it."""
+        raw = get_cache_backend().get(f"{self.prefix}{user_id}")
+        return int(raw) if raw is not None else None
+
+    def set_local(self, user_id: int, version: int | float):
+        self.local.set(user_id, version)
+
+    def revoke(self, user_id: int, version: int):
+        """Reject tokens older than `version` in every worker.
+        Kept as long as an access token lives: by then every older token has expired anyway.
+        """
+        self.local.set(user_id, version)
+        backend = get_cache_backend()
+        backend.set(f"{self.prefix}{user_id}", str(version).encode(), get_settings().access_token_expire_minutes * 60)
+        backend.publish(f"{self.prefix}{user_id}")
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return {"hits": self.local.hits, "misses": self.local.misses, "size": len(self.local)}
+
+# Checked by get_current_user, crud.users revokes on every change a token must not survive
+@lru_cache
+def get_token_revocations() -> TokenRevocations:
+    settings = get_settings()
+    return TokenRevocations(maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl)
+
+class PlanCatalog:
+    """Serialized snapshot of every plan: the JSON list, each plan's JSON and their ETags.
+    ETags are content hashes, so every worker hands out the same tag for the same catalog.
+    """
+
+    def __init__(self, plans: list):
+        self.items = {}
+        for plan in plans:
+            body = plan.model_dump_json().encode()
+            self.items[plan.id] = (body, _etag(body))
+        self.body = b"[" + b",".join(body for body, _ in self.items.values()) + b"]"
+        self.etag = _etag(self.body)
+
+    @classmethod
+    def from_json(cls, body: bytes) -> "PlanCatalog":
+        # Re-serializing the same plans gives the same bytes, so ETags agree across workers
+        return cls(_plan_list.validate_json(body))
+
+_plan_list = TypeAdapter(list[Plan])
+
+# Invalidation message for the catalog, and the prefix of its keys in the shared tier
+PLAN_CATALOG_KEY = "plans:catalog"
+# Counter bumped by every invalidate(): the shared catalog is stored under the generation it was loaded at
+PLAN_CATALOG_GENERATION_KEY = "plans:generation"
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+class PlanCatalogCache:
+    """Holds the current PlanCatalog until a plan write invalidates it, or for `ttl` seconds at most
+    (pub/sub delivers at most once: a missed invalidation must not keep a worker stale until restart).
+    The version counter stops a load that raced with a write from storing a stale catalog in this worker.
+    The shared tier has its own counter (the generation): a write in another worker bumps it before this
+    worker hears about the write, so a catalog loaded earlier lands under a key nobody reads any more.
+    """
+
+    def __init__(self, ttl: float):
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._expires = 0.0
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self) -> "PlanCatalog | None":
+        catalog = self._catalog
+        if catalog is not None and time.monotonic() >= self._expires:
+            catalog = None
+        if catalog is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return catalog
+
+    def generation(self) -> int:
+        """The shared catalog's generation. Read it before loading the plans the catalog is built from."""
+        raw = get_cache_backend().get(PLAN_CATALOG_GENERATION_KEY)
+        return int(raw) if raw is not None else 0
+
+    def get_shared(self, generation: int) -> "PlanCatalog | None":
+        """The catalog another worker already built at `generation`, if the shared tier still has it."""
+        body = get_cache_backend().get(f"{PLAN_CATALOG_KEY}:{generation}")
+        return PlanCatalog.from_json(body) if body is not None else None
+
+    def store(self, version: int, catalog: PlanCatalog, generation: int | None = None):
+        """Keep `catalog` in this worker, and share it under `generation` when one is given.
+        The first catalog shared at a generation stays: every worker then hands out the same ETag.
+        """
+        with self._lock:
+            if version != self.version:
+                return
+            self._catalog = catalog
+            self._expires = time.monotonic() + self.ttl
+        if generation is not None:
+            get_cache_backend().set_if_absent(
+                f"{PLAN_CATALOG_KEY}:{generation}", catalog.body, get_settings().cache_shared_ttl
+            )
+
+    def drop_local(self):
+        with self._lock:
+            self.version += 1
+            self._catalog = None
+
+    def invalidate(self):
+        """Drop the catalog in this worker, in the shared tier (a new generation) and, through pub/sub,
+        in every other worker. Catalogs shared at older generations expire unread.
+        """
+        self.drop_local()
+        backend = get_cache_backend()
+        backend.incr(PLAN_CATALOG_GENERATION_KEY)
+        backend.publish(PLAN_CATALOG_KEY)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "version": self.version}
+
+# crud.plans invalidates it on create/update/deactivate/delete
+@lru_cache
+def get_plan_catalog_cache() -> PlanCatalogCache:
+    return PlanCatalogCache(ttl=get_settings().plan_catalog_local_ttl)
+
+# --- Invalidation from other workers ---
+def handle_invalidation(message: str):
+    principal_cache = get_principal_cache()
+    if message == PLAN_CATALOG_KEY:
+        get_plan_catalog_cache().drop_local()
+    elif message.startswith(principal_cache.prefix):
+        principal_cache.local.delete(message[len(principal_cache.prefix):])
+    elif message.startswith(TokenRevocations.prefix):
+        # Read the new version from the shared tier on next use
+        get_token_revocations().local.delete(int(message[len(TokenRevocations.prefix):]))
+
+def drop_local_caches():
+    """Forget every copy this worker holds; the next reads go to the shared tier or the database."""
+    get_plan_catalog_cache().drop_local()
+    get_principal_cache().clear()
+    get_token_revocations().clear()
+
+def start_invalidation_listener():
+    """Subscribe this worker to invalidations (called from the app's lifespan startup).
+    Invalidations published while the subscription was down are lost, so every (re)subscribe starts clean.
+    """
+    get_cache_backend().subscribe(handle_invalidation, on_subscribe=drop_local_caches)
+
+def stop_invalidation_listener():
+    get_cache_backend().close()
+
+def cache_stats() -> dict:
+    return {
+        "shared": get_cache_backend().stats(),
+        "principals": get_principal_cache().stats(),
+        "token_revocations": get_token_revocations().stats(),
+        "plan_catalog": get_plan_catalog_cache().stats(),
+    }
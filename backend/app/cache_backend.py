@@ -0,0 +1,335 @@
+# Shared cache tier behind the in-process caches in app/cache.py
+# CACHE_BACKEND=memory keeps everything inside the worker (single worker, tests).
+# CACHE_BACKEND=redis shares cached values between workers and broadcasts invalidations over pub/sub,
+# so a write handled by one worker drops the stale copy in every other worker too.
+# The same backend holds the login rate-limit token buckets (app/admission.py)
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Token buckets tracked by the memory backend before the least recently used are forgotten
+MAX_BUCKETS = 100_000
+
+# Token bucket in one atomic step: refill by elapsed time (Redis clock), then take a token.
+# Returns "0" when a token was taken, else the seconds until one is available
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - ts, 0) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+class CacheBackend(ABC):
+    """Byte values with a TTL, an invalidation channel and token buckets. Counts hits and misses."""
+
+    name = "base"
+    remote = False  # True when calls do network I/O (keep them off the event loop)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _count(self, value):
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float):
+        ...
+
+    @abstractmethod
+    def set_if_absent(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set `key` only if it doesn't exist (atomically, across workers). True when it was set."""
+
+    @abstractmethod
+    def incr(self, key: str) -> int | None:
+        """Add one to the counter `key` (atomically, across workers; a missing key counts from 0).
+        Returns the new value, None when the backend could not be reached.
+        """
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def publish(self, message: str):
+        ...
+
+    @abstractmethod
+    def subscribe(self, handler, on_subscribe=None):
+        """Call handler(message) for every invalidation published, by any worker.
+        on_subscribe() is called each time the subscription is (re)established: whatever was published
+        while it was down is lost, so local copies must be dropped then.
+        """
+
+    @abstractmethod
+    def take_token(self, key: str, rate: float, burst: int) -> float:
+        """Take one token from the bucket `key` (refilled at `rate` per second, holding at most `burst`).
+        Returns 0 when a token was taken, else the seconds until the next one.
+        """
+
+    def close(self):
+        pass
+
+class MemoryBackend(CacheBackend):
+    """Process-local backend: nothing is shared, publish only reaches this process."""
+
+    name = "memory"
+
+    def __init__(self):
+        super().__init__()
+        self._data = {}
+        self._handlers = []
+        self._buckets = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._data[key]
+                entry = None
+        return self._count(entry[1] if entry else None)
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+
+    def set_if_absent(self, key, value, ttl):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] >= time.monotonic():
+                return False
+            self._data[key] = (time.monotonic() + ttl, value)
+            return True
+
+    def incr(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            value = int(entry[1]) + 1 if entry is not None and entry[0] >= time.monotonic() else 1
+            self._data[key] = (math.inf, str(value).encode())
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def publish(self, message):
+        for handler in list(self._handlers):
+            handler(message)
+
+    def subscribe(self, handler, on_subscribe=None):
+        # Same process, nothing can be missed: on_subscribe isn't needed
+        self._handlers.append(handler)
+
+    def take_token(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def close(self):
+        self._handlers.clear()
+
+class RedisBackend(CacheBackend):
+    """Redis (or fakeredis) backend. Redis errors are counted and treated as misses,
+    so an unavailable Redis only costs the database lookups the cache would have saved.
+    The invalidation subscription is retried in the background until Redis answers, and re-established
+    (with backoff) whenever the connection drops.
+    """
+
+    name = "redis"
+    remote = True
+    # Seconds between subscription attempts: doubled after each failure, up to the max
+    retry_delay = 0.5
+    max_retry_delay = 30.0
+
+    def __init__(self, client):
+        super().__init__()
+        self.client = client
+        self._pubsub = None
+        self._thread = None
+        self._connector = None
+        self._handler = None
+        self._on_subscribe = None
+        self._stopping = threading.Event()
+        self._token_bucket = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def _failed(self, action: str, exc: Exception):
+        with self._lock:
+            self.errors += 1
+        logger.warning("cache %s failed: %s", action, exc)
+
+    def get(self, key):
+        try:
+            value = self.client.get(key)
+        except Exception as exc:
+            self._failed("get", exc)
+            value = None
+        return self._count(value)
+
+    def set(self, key, value, ttl):
+        try:
+            self.client.set(key, value, px=max(int(ttl * 1000), 1))
+        except Exception as exc:
+            self._failed("set", exc)
+
+    def set_if_absent(self, key, value, ttl):
+        # Fails open like take_token: without Redis every request simply runs
+        try:
+            return bool(self.client.set(key, value, px=max(int(ttl * 1000), 1), nx=True))
+        except Exception as exc:
+            self._failed("set_if_absent", exc)
+            return True
+
+    def incr(self, key):
+        try:
+            return self.client.incr(key)
+        except Exception as exc:
+            self._failed("incr", exc)
+            return None
+
+    def delete(self, key):
+        try:
+            self.client.delete(key)
+        except Exception as exc:
+            self._failed("delete", exc)
+
+    def publish(self, message):
+        try:
+            self.client.publish(INVALIDATION_CHANNEL, message)
+        except Exception as exc:
+            self._failed("publish", exc)
+
+    def subscribe(self, handler, on_subscribe=None):
+        # Never raises: the worker boots without Redis and subscribes once it is reachable.
+        # One listener thread per worker process; messages published by this worker come back too (harmless)
+        self._handler = handler
+        self._on_subscribe = on_subscribe
+        self._stopping.clear()
+        self._start_connecting()
+
+    def _on_message(self, message):
+        data = message["data"]
+        self._handler(data.decode() if isinstance(data, bytes) else data)
+
+    def _start_connecting(self):
+        self._connector = threading.Thread(target=self._connect, name="cache-invalidation-connect", daemon=True)
+        self._connector.start()
+
+    def _connect(self):
+        delay = self.retry_delay
+        while not self._stopping.is_set():
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_message})
+            except Exception as exc:
+                pubsub.close()
+                self._failed("subscribe", exc)
+                self._stopping.wait(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            self._pubsub = pubsub
+            if self._on_subscribe is not None:
+                self._on_subscribe()
+            self._thread = pubsub.run_in_thread(sleep_time=0.5, daemon=True, exception_handler=self._listener_failed)
+            if self._stopping.is_set():  # close() ran meanwhile
+                self._thread.stop()
+            return
+
+    def _listener_failed(self, exc, pubsub, thread):
+        # Runs in the listener thread: stop it and subscribe again from scratch
+        self._failed("invalidation listener", exc)
+        thread.stop()
+        try:
+            pubsub.close()
+        except Exception:
+            pass
+        if not self._stopping.is_set():
+            self._start_connecting()
+
+    def take_token(self, key, rate, burst):
+        # Fails open: a Redis outage must not lock everybody out
+        try:
+            return float(self._token_bucket(keys=[key], args=[rate, burst]))
+        except Exception as exc:
+            self._failed("take_token", exc)
+            return 0.0
+
+    def close(self):
+        self._stopping.set()
+        if self._connector is not None:
+            self._connector.join(timeout=2)
+            self._connector = None
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+# Created on first use from the settings, like the database engines
+_backend = None
+
+def get_cache_backend() -> CacheBackend:
+    global _backend
+    if _backend is None:
+        settings = get_settings()
+        if settings.cache_backend == "redis":
+            import redis
+
+            _backend = RedisBackend(redis.Redis.from_url(settings.cache_redis_url))
+        else:
+            _backend = MemoryBackend()
+    return _backend
+
+def set_cache_backend(backend: CacheBackend | None) -> CacheBackend | None:
+    """Swap the backend (tests, scripts). Returns the previous one, None resets to the settings."""
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
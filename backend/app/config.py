@@ -0,0 +1,172 @@
+# Application settings
+# Read once from the environment (and .env) on first use, then shared by every module
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+def _bool(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+@dataclass(frozen=True)
+class Settings:
+    # --- Database ---
+    database_url: str | None
+    async_database_url: str | None
+    db_async: bool  # serve requests on an AsyncSession (asyncpg) instead of the threadpool
+    db_pool_size: int
+    db_max_overflow: int
+    db_pool_timeout: float  # seconds to wait for a free connection
+    db_pool_recycle: int  # seconds before a connection is replaced, -1 = never
+    db_pool_pre_ping: bool
+    db_connection_budget: int  # connections all web workers may open to one server together, 0 = no limit
+    web_concurrency: int  # worker processes sharing the budget (gunicorn.conf.py starts this many)
+    auto_create_tables: bool  # create_all at startup, for local development without Alembic
+
+    # --- Read replica (get_read_db) ---
+    read_database_url: str | None  # unset: reads use the primary
+    read_async_database_url: str | None
+    replica_max_lag: float  # seconds behind the primary before reads go back to it
+    replica_check_interval: float  # seconds between replica health / lag checks
+    replica_connect_timeout: int  # seconds, so a dead replica fails fast
+    replica_sticky_seconds: float  # after a write, the caller's reads stay on the primary this long
+
+    # --- Auth ---
+    secret_key: str | None
+    algorithm: str
+    access_token_expire_minutes: int
+
+    # --- Password hashing ---
+    bcrypt_rounds: int  # stored hashes with any other cost are rehashed on the next login
+    hash_pool_size: int  # hashing processes per worker, 0 = threadpool
+    hash_queue_limit: int  # hash jobs allowed to wait before new ones are refused
+
+    # --- Login admission control ---
+    login_max_concurrent: int  # password verifications running at once per worker
+    login_queue_limit: int  # logins allowed to wait for a slot before new ones get 429
+    login_queue_timeout: float  # seconds a login waits for a slot before giving up with 429
+    login_ip_per_minute: float  # token bucket per client IP (0 = off)
+    login_ip_burst: int
+    login_account_per_minute: float  # token bucket per username (0 = off)
+    login_account_burst: int
+
+    # --- Bulk user import ---
+    user_import_max_rows: int  # rows accepted per POST /users/bulk
+    user_import_batch_size: int  # rows per multi-row INSERT
+
+    # --- Caches ---
+    cache_backend: str  # "memory" (per worker) or "redis" (shared by every worker, pub/sub invalidation)
+    cache_redis_url: str
+    cache_shared_ttl: float  # lifetime of the plan catalog in the shared tier
+    plan_catalog_local_ttl: float  # lifetime of a worker's own copy, bounds staleness if an invalidation is missed
+    principal_cache_size: int
+    principal_cache_ttl: float  # bound on staleness for changes made outside the CRUD layer
+    plan_cache_max_age: int  # Cache-Control max-age on the public plan catalog
+
+    # --- Idempotency-Key (POST /users/, POST /subscriptions/) ---
+    idempotency_ttl: float  # how long a stored response is replayed
+    idempotency_lock_timeout: float  # a request that neither finishes nor fails releases its key after this
+    idempotency_wait_timeout: float  # how long a concurrent duplicate waits for the first one (then 409)
+
+    # --- Observability ---
+    metrics_enabled: bool  # request timing middleware and GET /metrics
+    server_timing: bool  # Server-Timing header on responses
+
+    # --- Background jobs ---
+    celery_broker_url: str
+    expiry_sweep_interval: float
+    expiry_sweep_batch_size: int
+    analytics_reconcile_interval: float  # seconds between rollup reconciliations
+    analytics_reconcile_days: int  # daily counts recomputed by each reconciliation
+    renewal_interval: float  # seconds between renewal runs
+    renewal_lead: float  # renew subscriptions ending within this many seconds
+    renewal_batch_size: int  # subscriptions per renewal UPDATE (and checkpoint)
+
+    @property
+    def pool_options(self) -> dict:
+        """Keyword arguments for create_engine / create_async_engine.
+        With DB_CONNECTION_BUDGET set, each worker gets an equal share of it: DB_POOL_SIZE persistent
+        connections at most, the rest of the share as overflow.
+        """
+        pool_size, max_overflow = self.db_pool_size, self.db_max_overflow
+        if self.db_connection_budget:
+            share = max(self.db_connection_budget // max(self.web_concurrency, 1), 1)
+            pool_size = min(pool_size, share)
+            max_overflow = share - pool_size
+        return {
+            "pool_size": pool_size,
+            "max_overflow": max_overflow,
+            "pool_timeout": self.db_pool_timeout,
+            "pool_recycle": self.db_pool_recycle,
+            "pool_pre_ping": self.db_pool_pre_ping,
+        }
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        database_url = os.getenv("DATABASE_URL")
+        read_database_url = os.getenv("READ_DATABASE_URL") or None
+        return cls(
+            database_url=database_url,
+            async_database_url=os.getenv("ASYNC_DATABASE_URL") or (
+                database_url.replace("postgresql://", "postgresql+asyncpg://", 1) if database_url else None
+            ),
+            db_async=_bool("DB_ASYNC"),
+            db_pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+            db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            db_pool_recycle=int(os.getenv("DB_POOL_RECYCLE", -1)),
+            db_pool_pre_ping=_bool("DB_POOL_PRE_PING"),
+            db_connection_budget=int(os.getenv("DB_CONNECTION_BUDGET", 0)),
+            web_concurrency=int(os.getenv("WEB_CONCURRENCY", 1)),
+            auto_create_tables=_bool("AUTO_CREATE_TABLES"),
+            read_database_url=read_database_url,
+            read_async_database_url=os.getenv("READ_ASYNC_DATABASE_URL") or (
+                read_database_url.replace("postgresql://", "postgresql+asyncpg://", 1) if read_database_url else None
+            ),
+            replica_max_lag=float(os.getenv("REPLICA_MAX_LAG", 5)),
+            replica_check_interval=float(os.getenv("REPLICA_CHECK_INTERVAL", 5)),
+            replica_connect_timeout=int(os.getenv("REPLICA_CONNECT_TIMEOUT", 2)),
+            replica_sticky_seconds=float(os.getenv("REPLICA_STICKY_SECONDS", 5)),
+            secret_key=os.getenv("SECRET_KEY"),
+            algorithm=os.getenv("ALGORITHM", "HS256"),
+            access_token_expire_minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30)),
+            bcrypt_rounds=int(os.getenv("BCRYPT_ROUNDS", 12)),
+            hash_pool_size=int(os.getenv("HASH_POOL_SIZE", os.cpu_count() or 1)),
+            hash_queue_limit=int(os.getenv("HASH_QUEUE_LIMIT", 64)),
+            login_max_concurrent=int(os.getenv("LOGIN_MAX_CONCURRENT", 2 * (os.cpu_count() or 1))),
+            login_queue_limit=int(os.getenv("LOGIN_QUEUE_LIMIT", 32)),
+            login_queue_timeout=float(os.getenv("LOGIN_QUEUE_TIMEOUT", 2)),
+            login_ip_per_minute=float(os.getenv("LOGIN_IP_PER_MINUTE", 60)),
+            login_ip_burst=int(os.getenv("LOGIN_IP_BURST", 20)),
+            login_account_per_minute=float(os.getenv("LOGIN_ACCOUNT_PER_MINUTE", 5)),
+            login_account_burst=int(os.getenv("LOGIN_ACCOUNT_BURST", 10)),
+            user_import_max_rows=int(os.getenv("USER_IMPORT_MAX_ROWS", 10000)),
+            user_import_batch_size=int(os.getenv("USER_IMPORT_BATCH_SIZE", 1000)),
+            cache_backend=os.getenv("CACHE_BACKEND", "memory").lower(),
+            cache_redis_url=os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/1"),
+            cache_shared_ttl=float(os.getenv("CACHE_SHARED_TTL", 300)),
+            plan_catalog_local_ttl=float(os.getenv("PLAN_CATALOG_LOCAL_TTL", 30)),
+            principal_cache_size=int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000)),
+            principal_cache_ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", 60)),
+            plan_cache_max_age=int(os.getenv("PLAN_CACHE_MAX_AGE", 60)),
+            idempotency_ttl=float(os.getenv("IDEMPOTENCY_TTL", 86400)),
+            idempotency_lock_timeout=float(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 30)),
+            idempotency_wait_timeout=float(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 10)),
+            metrics_enabled=_bool("METRICS_ENABLED", "true"),
+            server_timing=_bool("SERVER_TIMING", "true"),
+            celery_broker_url=os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0"),
+            expiry_sweep_interval=float(os.getenv("EXPIRY_SWEEP_INTERVAL", 300)),
+            expiry_sweep_batch_size=int(os.getenv("EXPIRY_SWEEP_BATCH_SIZE", 1000)),
+            analytics_reconcile_interval=float(os.getenv("ANALYTICS_RECONCILE_INTERVAL", 3600)),
+            analytics_reconcile_days=int(os.getenv("ANALYTICS_RECONCILE_DAYS", 2)),
+            renewal_interval=float(os.getenv("RENEWAL_INTERVAL", 3600)),
+            renewal_lead=float(os.getenv("RENEWAL_LEAD", 86400)),
+            renewal_batch_size=int(os.getenv("RENEWAL_BATCH_SIZE", 1000)),
+        )
+
+@lru_cache
+def get_settings() -> Settings:
+    """The process-wide settings. Environment variables win over .env."""
+    load_dotenv()
+    return Settings.from_env()
@@ -0,0 +1,171 @@
+# Subscription analytics: rollup maintenance, reads and reconciliation
+# Writes add their deltas in the same statement as the subscription change (data-modifying CTEs),
+# so a rollup can't miss a committed write and the write stays one round trip.
+# Changes made around the CRUD layer (manual SQL, cascades run by the database itself) are fixed by reconcile_rollups
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+
+from sqlalchemy import Date, Integer, cast, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..database import models
+
+plan_stats_table = models.PlanSubscriptionStats.__table__
+daily_stats_table = models.DailySubscriptionStats.__table__
+subscriptions_table = models.Subscription.__table__
+plans_table = models.Plan.__table__
+
+def plan_delta(changed, delta: int, where=None):
+    """Add `delta` active subscribers to the plan of every row of `changed` (a CTE or subquery with plan_id)."""
+    rows = select(changed.c.plan_id, literal(delta, Integer) * func.count()).group_by(changed.c.plan_id)
+    if where is not None:
+        rows = rows.where(where)
+    stmt = pg_insert(plan_stats_table).from_select(["plan_id", "active_subscribers"], rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[plan_stats_table.c.plan_id],
+        set_={"active_subscribers": plan_stats_table.c.active_subscribers + stmt.excluded.active_subscribers},
+    )
+    return stmt
+
+def plan_delta_cte(changed, delta: int, where=None, name: str = "plan_rollup"):
+    """plan_delta as a CTE, to run inside the statement that changes the subscriptions."""
+    return plan_delta(changed, delta, where).cte(name)
+
+def daily_delta_cte(changed, day: date, new: int = 0, cancelled: int = 0, where=None, name: str = "daily_rollup"):
+    """Count every row of `changed` as a new subscription and/or a cancellation on `day`."""
+    count = func.count()
+    rows = select(literal(day, Date), literal(new, Integer) * count, literal(cancelled, Integer) * count).select_from(changed)
+    if where is not None:
+        rows = rows.where(where)
+    # No rows changed: the aggregate still returns one row of zeros, don't create a row for that
+    rows = rows.having(count > 0)
+    stmt = pg_insert(daily_stats_table).from_select(["day", "new_subscriptions", "cancellations"], rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[daily_stats_table.c.day],
+        set_={
+            "new_subscriptions": daily_stats_table.c.new_subscriptions + stmt.excluded.new_subscriptions,
+            "cancellations": daily_stats_table.c.cancellations + stmt.excluded.cancellations,
+        },
+    )
+    return stmt.cte(name)
+
+# --- Reads: one row per plan / per day, however many subscriptions there are ---
+def get_plan_stats(db: Session) -> dict:
+    """Active subscribers and monthly recurring revenue (price / duration_months per subscriber) per plan."""
+    rows = db.execute(
+        select(
+            plans_table.c.id.label("plan_id"),
+            plans_table.c.name,
+            plans_table.c.price,
+            plans_table.c.duration_months,
+            func.coalesce(plan_stats_table.c.active_subscribers, 0).label("active_subscribers"),
+        )
+        .select_from(plans_table.outerjoin(plan_stats_table, plan_stats_table.c.plan_id == plans_table.c.id))
+        .order_by(plans_table.c.id)
+    ).mappings().all()
+    plans = [
+        {**row, "mrr": round(row["active_subscribers"] * row["price"] / max(row["duration_months"], 1), 2)}
+        for row in rows
+    ]
+    return {
+        "active_subscribers": sum(plan["active_subscribers"] for plan in plans),
+        "mrr": round(sum(plan["mrr"] for plan in plans), 2),
+        "plans": plans,
+    }
+
+def get_daily_stats(db: Session, start: date, end: date) -> list[dict]:
+    """New subscriptions and cancellations for every day from `start` to `end` (inclusive), zeros included."""
+    counts = {
+        row.day: row
+        for row in db.execute(
+            select(daily_stats_table).where(daily_stats_table.c.day >= start, daily_stats_table.c.day <= end)
+        )
+    }
+    days = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        row = counts.get(day)
+        days.append({
+            "day": day,
+            "new_subscriptions": row.new_subscriptions if row else 0,
+            "cancellations": row.cancellations if row else 0,
+        })
+    return days
+
+# --- Reconciliation ---
+def _utc_day(column):
+    return func.date(func.timezone("UTC", column))
+
+def reconcile_rollups(db: Session, days: int = 2, today: date | None = None) -> dict:
+    """Recompute the rollups from the subscriptions table and fix any drift.
+    Active subscribers are checked for every plan, daily counts for the last `days` days.
+    No lock is taken: each fix is one statement that reads the true counts and the rollups from the same
+    snapshot and adds the difference. Subscription writes committed meanwhile add their own deltas to the
+    rollup, so adding (not overwriting) keeps them, and they never wait for the scan.
+    Returns:
+        dict: number of plan and day rows corrected (or created).
+    """
+    today = today or datetime.now(timezone.utc).date()
+    since = today - timedelta(days=days - 1)
+    since_ts = datetime.combine(since, dt_time.min, tzinfo=timezone.utc)
+
+    # Active subscribers per plan: true count minus rollup, for the plans where they differ
+    actual = (
+        select(plans_table.c.id.label("plan_id"), func.count(subscriptions_table.c.id).label("active"))
+        .select_from(plans_table.outerjoin(
+            subscriptions_table,
+            (subscriptions_table.c.plan_id == plans_table.c.id) & (subscriptions_table.c.is_active == True),
+        ))
+        .group_by(plans_table.c.id)
+        .subquery("actual")
+    )
+    drift = actual.c.active - func.coalesce(plan_stats_table.c.active_subscribers, 0)
+    plan_drift = (
+        select(actual.c.plan_id, cast(drift, Integer))
+        .select_from(actual.outerjoin(plan_stats_table, plan_stats_table.c.plan_id == actual.c.plan_id))
+        .where(drift != 0)
+    )
+    stmt = pg_insert(plan_stats_table).from_select(["plan_id", "active_subscribers"], plan_drift)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[plan_stats_table.c.plan_id],
+        set_={"active_subscribers": plan_stats_table.c.active_subscribers + stmt.excluded.active_subscribers},
+    )
+    plans_fixed = db.execute(stmt.returning(plan_stats_table.c.plan_id)).all()
+
+    # Daily counts: new subscriptions by start day, cancellations by cancellation day, against the rollup rows
+    def per_day(column, new: int, cancelled: int):
+        day = _utc_day(column)
+        count = func.count()
+        return (
+            select(day.label("day"), (literal(new, Integer) * count).label("new"), (literal(cancelled, Integer) * count).label("cancelled"))
+            .where(column >= since_ts)
+            .group_by(day)
+        )
+
+    events = union_all(
+        per_day(subscriptions_table.c.start_date, 1, 0), per_day(subscriptions_table.c.cancelled_at, 0, 1)
+    ).subquery("events")
+    counted = (
+        select(events.c.day, func.sum(events.c.new).label("new"), func.sum(events.c.cancelled).label("cancelled"))
+        .group_by(events.c.day)
+        .subquery("counted")
+    )
+    rollup = select(daily_stats_table).where(daily_stats_table.c.day >= since).subquery("rollup")
+    new_drift = func.coalesce(counted.c.new, 0) - func.coalesce(rollup.c.new_subscriptions, 0)
+    cancel_drift = func.coalesce(counted.c.cancelled, 0) - func.coalesce(rollup.c.cancellations, 0)
+    day_drift = (
+        select(func.coalesce(counted.c.day, rollup.c.day), cast(new_drift, Integer), cast(cancel_drift, Integer))
+        .select_from(counted.join(rollup, rollup.c.day == counted.c.day, full=True))
+        .where((new_drift != 0) | (cancel_drift != 0))
+    )
+    stmt = pg_insert(daily_stats_table).from_select(["day", "new_subscriptions", "cancellations"], day_drift)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[daily_stats_table.c.day],
+        set_={
+            "new_subscriptions": daily_stats_table.c.new_subscriptions + stmt.excluded.new_subscriptions,
+            "cancellations": daily_stats_table.c.cancellations + stmt.excluded.cancellations,
+        },
+    )
+    days_fixed = db.execute(stmt.returning(daily_stats_table.c.day)).all()
+    db.commit()
+    return {"plans_fixed": len(plans_fixed), "days_fixed": len(days_fixed)}
@@ -1,53 +1,73 @@
+from ..cache import PlanCatalog, get_plan_catalog_cache
 from ..database.schemas import plan as plan_schemas
 from ..database import models
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 
+# Writes are single INSERT/UPDATE ... RETURNING statements: the returned row feeds schemas.Plan
+# directly, so there is no SELECT before the change and no refresh() after the commit
+plans_table = models.Plan.__table__
+
 def create_plan(db: Session, plan: plan_schemas.PlanCreate):
-    db_plan = models.Plan(
-        name=plan.name, 
-        price=plan.price, 
-        description=plan.description,
-        duration_months=plan.duration_months
-        )
-    db.add(db_plan)
+    db_plan = db.execute(
+        insert(plans_table)
+        .values(name=plan.name, price=plan.price, description=plan.description, duration_months=plan.duration_months)
+        .returning(*plans_table.c)
+    ).one()
     db.commit()
-    db.refresh(db_plan)
+    get_plan_catalog_cache().invalidate()
     return db_plan
 
-def update_plan(db: Session, plan_id: int, plan: plan_schemas.PlanUpdate):
-    db_plan = db.query(models.Plan).filter(models.Plan.id == plan_id).first()
+def _update_plan(db: Session, plan_id: int, values: dict):
+    db_plan = db.execute(
+        update(plans_table).where(plans_table.c.id == plan_id).values(**values).returning(*plans_table.c)
+    ).first()
+    db.commit()
     if db_plan:
-        # db_plan.name = plan.name
-        # db_plan.price = plan.price
-        # db_plan.description = plan.description
-        # db_plan.duration_months = plan.duration_months
-        for key, value in plan.model_dump(exclude_unset=True).items():
-            setattr(db_plan, key, value)
-        db.commit()
-        db.refresh(db_plan)
+        get_plan_catalog_cache().invalidate()
     return db_plan
 
+def update_plan(db: Session, plan_id: int, plan: plan_schemas.PlanUpdate):
+    values = plan.model_dump(exclude_unset=True)
+    if not values:
+        return get_plan(db, plan_id)
+    return _update_plan(db, plan_id, values)
+
 def get_plan(db: Session, plan_id: int):
     return db.query(models.Plan).filter(models.Plan.id == plan_id).first()
 
 def get_plans(db: Session, active_only: bool = False):
-    query = db.query(models.Plan)
+    query = db.query(models.Plan).order_by(models.Plan.id)
     if active_only:
         query = query.filter(models.Plan.is_active == True)
     return query.all()
 
+# The whole catalog, serialized once and served from memory until a plan changes
+def get_plan_catalog(db: Session) -> PlanCatalog:
+    plan_catalog = get_plan_catalog_cache()
+    catalog = plan_catalog.get()
+    if catalog is None:
+        version = plan_catalog.version
+        # Read before the plans: a write this load might miss bumps the generation once it commits,
+        # so a stale catalog can only be shared under a generation nobody reads any more
+        generation = plan_catalog.generation()
+        # Another worker may have built it already (shared cache tier), else build it from the DB and share it
+        catalog = plan_catalog.get_shared(generation)
+        if catalog is not None:
+            plan_catalog.store(version, catalog)
+        else:
+            catalog = PlanCatalog([plan_schemas.Plan.model_validate(p) for p in get_plans(db)])
+            plan_catalog.store(version, catalog, generation=generation)
+    return catalog
+
 def deactivate_plan(db: Session, plan_id: int):
-    plan = db.query(models.Plan).filter(models.Plan.id == plan_id).first()
-    if plan:
-        plan.is_active = False
-        db.commit()
-        db.refresh(plan)
-    return plan
+    return _update_plan(db, plan_id, {"is_active": False})
 
 def delete_plan(db: Session, plan_id: int):
     db_plan = get_plan(db, plan_id)
     if db_plan:
         db.delete(db_plan)
         db.commit()
+        get_plan_catalog_cache().invalidate()
         return True
     return False
\ No newline at end of file
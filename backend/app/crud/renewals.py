@@ -0,0 +1,113 @@
+# Subscription renewals: extend every active subscription that ends before a cutoff by its plan's duration
+# Set-based: each chunk is one UPDATE ... FROM plans over up to batch_size subscriptions, the new end date
+# computed by Postgres (end_date + make_interval(months => plans.duration_months)), and the run's checkpoint
+# (models.RenewalRun) is moved in the same transaction. A run stopped at any point resumes after its last
+# committed chunk, and nothing is renewed twice.
+# Renewals don't touch the analytics rollups: the subscriber stays active and no subscription is new or cancelled
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import Interval, func, insert, select, text, update
+from sqlalchemy.orm import Session
+
+from ..database import models
+
+subscriptions_table = models.Subscription.__table__
+plans_table = models.Plan.__table__
+runs_table = models.RenewalRun.__table__
+
+def open_renewal_run(db: Session, cutoff: datetime | None = None) -> int:
+    """Id of the unfinished run if there is one (it is resumed, whatever `cutoff` says),
+    else of a new run renewing the subscriptions that end before `cutoff` (default: now).
+    The table lock makes two workers starting at the same time agree on one run.
+    """
+    db.execute(text(f"LOCK TABLE {runs_table.name} IN SHARE ROW EXCLUSIVE MODE"))
+    run_id = db.execute(
+        select(runs_table.c.id).where(runs_table.c.finished_at.is_(None)).order_by(runs_table.c.id).limit(1)
+    ).scalar()
+    if run_id is None:
+        now = datetime.now(timezone.utc)
+        run_id = db.execute(
+            insert(runs_table).values(cutoff=cutoff or now, started_at=now).returning(runs_table.c.id)
+        ).scalar()
+    db.commit()
+    return run_id
+
+def renew_batch(db: Session, run_id: int, batch_size: int = 1000) -> int:
+    """Renew the next chunk of a run and save the checkpoint, in one transaction.
+    A chunk smaller than `batch_size` was the last one: the run is marked finished.
+    Returns:
+        int: subscriptions renewed by this chunk.
+    """
+    now = datetime.now(timezone.utc)
+    # The run row is locked first: a second worker on the same run waits here, then starts from the new checkpoint
+    run = db.execute(
+        select(runs_table.c.cutoff, runs_table.c.last_subscription_id, runs_table.c.finished_at)
+        .where(runs_table.c.id == run_id)
+        .with_for_update()
+    ).one()
+    if run.finished_at is not None:
+        db.rollback()
+        return 0
+
+    # Subscriptions on a retired plan are not renewed, they run out and the expiry sweeper deactivates them
+    due_ids = (
+        select(subscriptions_table.c.id)
+        .join(plans_table, plans_table.c.id == subscriptions_table.c.plan_id)
+        .where(
+            subscriptions_table.c.is_active == True,
+            subscriptions_table.c.end_date <= run.cutoff,
+            subscriptions_table.c.id > run.last_subscription_id,
+            plans_table.c.is_active == True,
+        )
+        .order_by(subscriptions_table.c.id)
+        .limit(batch_size)
+        .with_for_update(of=subscriptions_table)
+        .scalar_subquery()
+    )
+    # Month arithmetic by Postgres, clamped to the month end like relativedelta (Jan 31 + 1 month = Feb 28)
+    renewed = (
+        update(subscriptions_table)
+        .where(subscriptions_table.c.plan_id == plans_table.c.id, subscriptions_table.c.id.in_(due_ids))
+        .values(end_date=subscriptions_table.c.end_date + func.make_interval(0, plans_table.c.duration_months, type_=Interval))
+        .returning(subscriptions_table.c.id)
+        .cte("renewed")
+    )
+    count, last_id = db.execute(select(func.count(), func.max(renewed.c.id))).one()
+
+    checkpoint = {"batches": runs_table.c.batches + 1, "checkpoint_at": now}
+    if count:
+        checkpoint.update(last_subscription_id=last_id, renewed=runs_table.c.renewed + count)
+    if count < batch_size:
+        checkpoint["finished_at"] = now
+    db.execute(update(runs_table).where(runs_table.c.id == run_id).values(**checkpoint))
+    db.commit()
+    return count
+
+def run_renewals(
+    db: Session, batch_size: int = 1000, cutoff: datetime | None = None, max_batches: int | None = None
+) -> dict:
+    """Renew everything due, one chunk per transaction, resuming the unfinished run if there is one.
+    `max_batches` stops early (the run stays open and the next call carries on from its checkpoint).
+    Returns:
+        dict: run id, rows renewed by this call, number of batches, batch latency in ms and whether the run is done.
+    """
+    run_id = open_renewal_run(db, cutoff)
+    rows, batch_times = 0, []
+    finished = False
+    while max_batches is None or len(batch_times) < max_batches:
+        start = time.perf_counter()
+        count = renew_batch(db, run_id, batch_size)
+        batch_times.append((time.perf_counter() - start) * 1000)
+        rows += count
+        if count < batch_size:
+            finished = True
+            break
+    return {
+        "run_id": run_id,
+        "rows": rows,
+        "batches": len(batch_times),
+        "batch_ms_avg": round(sum(batch_times) / len(batch_times), 3) if batch_times else 0.0,
+        "batch_ms_max": round(max(batch_times), 3) if batch_times else 0.0,
+        "finished": finished,
+    }
@@ -1,44 +1,114 @@
+import time
 from datetime import datetime, timezone
-from dateutil.relativedelta import relativedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import DateTime, Interval, case, func, insert, literal, select, true, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
 from ..database import models, schemas
+from .analytics import daily_delta_cte, plan_delta_cte
+
+class ActiveSubscriptionExistsError(Exception):
+    """The user already has an active subscription (uq_subscriptions_one_active_per_user)."""
+
+subscriptions_table = models.Subscription.__table__
+plans_table = models.Plan.__table__
+
+def _returning_with_plan(db: Session, stmt, extra_columns=(), rollups=None):
+    # Writes are one round trip: the INSERT/UPDATE runs in a CTE and the same statement
+    # joins the plan onto the changed row (WITH changed AS (... RETURNING *) SELECT ... JOIN plans).
+    # rollups(changed) returns more data-modifying CTEs to run in that statement (analytics rollups).
+    # Returns a dict shaped like schemas.Subscription, or None when no row was written
+    changed = stmt.returning(*subscriptions_table.c, *extra_columns).cte("changed")
+    query = (
+        select(changed, *[col.label(f"plan__{col.name}") for col in plans_table.c])
+        .join(plans_table, plans_table.c.id == changed.c.plan_id)
+    )
+    for cte in rollups(changed) if rollups else ():
+        query = query.add_cte(cte)
+    row = db.execute(query).mappings().first()
+    if row is None:
+        return None
+    db_sub = {col.name: row[col.name] for col in subscriptions_table.c}
+    db_sub["plan"] = {col.name: row[f"plan__{col.name}"] for col in plans_table.c}
+    return db_sub
 
 def create_subscription(db: Session, sub: schemas.SubscriptionCreate, user_id: int):
-    # 1. Validate plan ID
-    plan = db.query(models.Plan).filter(models.Plan.id == sub.plan_id, models.Plan.is_active == True).first()
-
-    if not plan:
-        return None # The route handles the 404/400 error
-    
-    # set start/end date based on plan duration
-    start_date = datetime.now(timezone.utc)
-    end_date = start_date + relativedelta(months=plan.duration_months)
-
-    db_sub = models.Subscription(plan_id=sub.plan_id, start_date=start_date, end_date=end_date, is_active=True, user_id=user_id)
-    db.add(db_sub)
-    db.commit()
-    db.refresh(db_sub)
+    # The plan is validated (exists and is active) by the INSERT ... SELECT itself:
+    # no row inserted means a bad plan, and the route handles the 404.
+    # end_date = start + plan duration, month arithmetic done by Postgres (clamped to the month end like relativedelta)
+    now = datetime.now(timezone.utc)
+    start_date = literal(now, DateTime(timezone=True))
+    from_plan = select(
+        literal(user_id),
+        plans_table.c.id,
+        start_date,
+        start_date + func.make_interval(0, plans_table.c.duration_months, type_=Interval),
+        true(),
+    ).where(plans_table.c.id == sub.plan_id, plans_table.c.is_active == True)
+    stmt = insert(subscriptions_table).from_select(["user_id", "plan_id", "start_date", "end_date", "is_active"], from_plan)
+
+    # Rollups: one more active subscriber on the plan, one more new subscription today
+    def rollups(changed):
+        return [plan_delta_cte(changed, 1), daily_delta_cte(changed, now.date(), new=1)]
+
+    # The partial unique index decides, so two concurrent requests can't both get an active subscription
+    try:
+        db_sub = _returning_with_plan(db, stmt, rollups=rollups)
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        if "uq_subscriptions_one_active_per_user" in str(exc.orig):
+            raise ActiveSubscriptionExistsError(user_id) from exc
+        raise
     return db_sub
 
 # Fetch all foer a specific user
+# schemas.Subscription embeds the plan, so every read joins it in (many-to-one, one row per subscription)
 def get_subscriptions_by_user(db: Session, user_id: int):
-    return db.query(models.Subscription).filter(models.Subscription.user_id == user_id).all()
+    return (
+        db.query(models.Subscription)
+        .options(joinedload(models.Subscription.plan))
+        .filter(models.Subscription.user_id == user_id)
+        .all()
+    )
 
 # Fetch one specific record
 def get_subscriptions_by_id(db:Session, subsub_id: int):
-    return db.query(models.Subscription).filter(models.Subscription.id == subsub_id).first() # Fetch a specific subscription by its ID
+    return db.query(models.Subscription).options(joinedload(models.Subscription.plan)).filter(models.Subscription.id == subsub_id).first() # Fetch a specific subscription by its ID
+
+# Fetch several records at once: one IN (...) query with the plan joined in
+def get_subscriptions_by_ids(db: Session, sub_ids: list[int]):
+    return (
+        db.query(models.Subscription)
+        .options(joinedload(models.Subscription.plan))
+        .filter(models.Subscription.id.in_(sub_ids))
+        .order_by(models.Subscription.id)
+        .all()
+    )
 
-# Fetch everything for admin
-def get_all_subscriptions(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Subscription).offset(skip).limit(limit).all()
+# Fetch everything for admin, one keyset page at a time (ordered by id, starting after `after_id`)
+def get_all_subscriptions(
+    db: Session,
+    after_id: int | None = None,
+    limit: int = 100,
+    is_active: bool | None = None,
+    plan_id: int | None = None,
+):
+    query = db.query(models.Subscription).options(joinedload(models.Subscription.plan))
+    if after_id is not None:
+        query = query.filter(models.Subscription.id > after_id)
+    if is_active is not None:
+        query = query.filter(models.Subscription.is_active == is_active)
+    if plan_id is not None:
+        query = query.filter(models.Subscription.plan_id == plan_id)
+    return query.order_by(models.Subscription.id).limit(limit).all()
 
 def update_subscription_end_date(db: Session, sub_id: int, new_end_date: datetime):
     # Useful for Admins extending a user's access
-    db_sub = db.query(models.Subscription).filter(models.Subscription.id == sub_id).first()
-    if db_sub:
-        db_sub.end_date = new_end_date
-        db.commit()
-        db.refresh(db_sub)
+    db_sub = _returning_with_plan(
+        db, update(subscriptions_table).where(subscriptions_table.c.id == sub_id).values(end_date=new_end_date)
+    )
+    db.commit()
     return db_sub
 
 def hard_delete_subscription(db: Session, sub_id: int):
@@ -49,12 +119,107 @@ def hard_delete_subscription(db: Session, sub_id: int):
         return True
     return False    
 
-def cancel_subscription(db: Session, sub_id: int):
-    sub = db.query(models.Subscription).filter(models.Subscription.id == sub_id).first()
-    if sub:
-        sub.is_active = False
-        # sub.end_date = datetime.now(timezone.utc)
-        db.commit()
-        db.refresh(sub)
+def cancel_subscription(db: Session, sub_id: int, user_id: int | None = None):
+    # user_id: only cancel it if it belongs to this user (None = any owner, for admins).
+    # The ownership check is part of the UPDATE, None back means missing or not theirs
+    # The row is locked and read first (target) so the rollups only count it when it really was active:
+    # cancelling twice, or racing another cancel, counts once
+    now = datetime.now(timezone.utc)
+    target = select(subscriptions_table.c.id, subscriptions_table.c.is_active.label("was_active")).where(
+        subscriptions_table.c.id == sub_id
+    )
+    if user_id is not None:
+        target = target.where(subscriptions_table.c.user_id == user_id)
+    target = target.with_for_update().cte("target")
+    stmt = (
+        update(subscriptions_table)
+        .where(subscriptions_table.c.id == target.c.id)
+        .values(
+            is_active=False,
+            cancelled_at=case((target.c.was_active, now), else_=subscriptions_table.c.cancelled_at),
+        )
+    )
+
+    def rollups(changed):
+        return [
+            plan_delta_cte(changed, -1, where=changed.c.was_active),
+            daily_delta_cte(changed, now.date(), cancelled=1, where=changed.c.was_active),
+        ]
+
+    sub = _returning_with_plan(db, stmt, extra_columns=[target.c.was_active], rollups=rollups)
+    db.commit()
     return sub
 
+# Billing export: one flat row per subscription with its plan and user columns
+def subscription_export_query():
+    return (
+        select(
+            models.Subscription.id,
+            models.Subscription.user_id,
+            models.User.email.label("user_email"),
+            models.User.name.label("user_name"),
+            models.Subscription.plan_id,
+            models.Plan.name.label("plan_name"),
+            models.Plan.price.label("plan_price"),
+            models.Plan.duration_months.label("plan_duration_months"),
+            models.Subscription.start_date,
+            models.Subscription.end_date,
+            models.Subscription.is_active,
+        )
+        .join(models.User, models.User.id == models.Subscription.user_id)
+        .join(models.Plan, models.Plan.id == models.Subscription.plan_id)
+        .order_by(models.Subscription.id)
+    )
+
+def stream_subscription_export(db: Session, batch_size: int = 1000):
+    """Yield the export in lists of `batch_size` rows, read through a server-side cursor."""
+    query = subscription_export_query().execution_options(stream_results=True, yield_per=batch_size)
+    yield from db.execute(query).mappings().partitions()
+
+# run_db can't hand back a generator, so the async session gets its own streaming twin
+async def stream_subscription_export_async(db: AsyncSession, batch_size: int = 1000):
+    result = await db.stream(subscription_export_query().execution_options(yield_per=batch_size))
+    async for rows in result.mappings().partitions():
+        yield rows
+
+def deactivate_expired_subscriptions(db: Session, batch_size: int = 1000, now: datetime | None = None) -> dict:
+    """Set is_active = False on every active subscription whose end_date has passed.
+    Works in chunks of `batch_size` rows, one short transaction each, so the hot table is never locked for long.
+    Rows another transaction holds are skipped (SKIP LOCKED) and picked up on the next run.
+    Returns:
+        dict: rows deactivated, number of batches and batch latency in ms.
+    """
+    now = now or datetime.now(timezone.utc)
+    expired_ids = (
+        select(models.Subscription.id)
+        .where(models.Subscription.is_active == True, models.Subscription.end_date < now)
+        .order_by(models.Subscription.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    # Expired subscribers leave the active counts in the same statement (not a cancellation, no daily count)
+    expired = (
+        update(subscriptions_table)
+        .where(subscriptions_table.c.id.in_(expired_ids))
+        .values(is_active=False)
+        .returning(subscriptions_table.c.plan_id)
+        .cte("expired")
+    )
+    stmt = select(func.count()).select_from(expired).add_cte(plan_delta_cte(expired, -1))
+
+    rows, batch_times = 0, []
+    while True:
+        start = time.perf_counter()
+        count = db.execute(stmt).scalar()
+        db.commit()
+        batch_times.append((time.perf_counter() - start) * 1000)
+        rows += count
+        if count < batch_size:
+            break
+    return {
+        "rows": rows,
+        "batches": len(batch_times),
+        "batch_ms_avg": round(sum(batch_times) / len(batch_times), 3),
+        "batch_ms_max": round(max(batch_times), 3),
+    }
@@ -1,42 +1,155 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload, selectinload
 
+from .analytics import plan_delta
+from ..cache import ALL_REVOKED, TokenRevocations, get_principal_cache, get_token_revocations
 from ..utils import hash_password
 from ..database.models.user import User 
-from ..database.schemas.user import UserCreate, UserUpdate
+from ..database.models.subscription import Subscription
+from ..database.schemas.user import Principal, UserCreate, UserUpdate
 
-def create_user(db: Session, user: UserCreate):
-    db_user = User(email=user.email, hashed_password=hash_password(user.password), name=user.name)
-    db.add(db_user) 
-    db.commit() 
-    db.refresh(db_user)
-    return db_user
+def create_user(db: Session, user: UserCreate, hashed_password: str | None = None):
+    # Async routes hash ahead of time so bcrypt never runs on the event loop
+    if hashed_password is None:
+        hashed_password = hash_password(user.password)
+    # INSERT ... RETURNING instead of add + commit + refresh: one round trip.
+    # A new user has no subscriptions yet, so schemas.User needs nothing else
+    db_user = db.execute(
+        insert(User.__table__)
+        .values(email=user.email, hashed_password=hashed_password, name=user.name)
+        .returning(*User.__table__.c)
+    ).one()
+    db.commit()
+    return {**db_user._mapping, "subscriptions": []}
 
 def get_user(db: Session, user_id: int):
-    return db.query(User).filter(User.id == user_id).first()
+    # schemas.User embeds subscriptions and each one embeds its plan:
+    # load them in one extra query instead of one per subscription and per plan
+    return (
+        db.query(User)
+        .options(selectinload(User.subscriptions).joinedload(Subscription.plan))
+        .filter(User.id == user_id)
+        .first()
+    )
+
+# Batch lookup: one IN (...) query (plus the same subscription loading as get_user) for any number of ids
+def get_users_by_ids(db: Session, user_ids: list[int]):
+    return (
+        db.query(User)
+        .options(selectinload(User.subscriptions).joinedload(Subscription.plan))
+        .filter(User.id.in_(user_ids))
+        .order_by(User.id)
+        .all()
+    )
 
 def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(User).offset(skip).limit(limit).all() # Fetch multiple users with pagination
+def get_principal(db: Session, email: str) -> Principal | None:
+    # The shared cache tier first (another worker may have loaded it), then the database
+    principal_cache = get_principal_cache()
+    principal = principal_cache.get(email)
+    if principal is None:
+        db_user = get_user_by_email(db, email)
+        if db_user is None:
+            return None
+        principal = Principal.model_validate(db_user)
+        principal_cache.set(email, principal)
+    return principal
+
+def get_token_version(db: Session, user_id: int, revocations: TokenRevocations | None = None) -> int | float:
+    """Current token version of a user for the revocation check, remembered by this worker for the TTL.
+    A version published by the revoking worker saves the query; without one (never revoked, or evicted
+    from the shared tier) the users row decides, so a revocation is never missed.
+    """
+    revocations = revocations or get_token_revocations()
+    version = revocations.get_shared(user_id)
+    if version is None:
+        row = db.execute(select(User.token_version, User.is_active).where(User.id == user_id)).first()
+        version = row.token_version if row is not None and row.is_active else ALL_REVOKED
+    revocations.set_local(user_id, version)
+    return version
+
+def get_existing_emails(db: Session, emails: list[str]) -> set[str]:
+    # One set-based lookup for a whole import batch instead of one query per row
+    if not emails:
+        return set()
+    return set(db.execute(select(User.email).where(User.email.in_(emails))).scalars())
+
+def bulk_create_users(db: Session, users: list[dict], batch_size: int = 1000) -> dict[str, int]:
+    """Insert users in multi-row batches and commit once.
+    Args:
+        db (Session): Database session.
+        users (list[dict]): Rows with email, name and hashed_password.
+        batch_size (int, optional): Rows per INSERT statement. Defaults to 1000.
+    Returns:
+        dict[str, int]: Id of every inserted user, by email. Emails registered meanwhile are skipped, not raised.
+    """
+    statement = pg_insert(User).on_conflict_do_nothing(index_elements=[User.email]).returning(User.id, User.email)
+    created = {}
+    for start in range(0, len(users), batch_size):
+        for user_id, email in db.execute(statement, users[start:start + batch_size]):
+            created[email] = user_id
+    db.commit()
+    return created
+
+def get_users(db: Session, after_id: int | None = None, limit: int = 100, is_active: bool | None = None):
+    # Fetch multiple users with keyset pagination (ordered by id, starting after `after_id`)
+    query = db.query(User).options(selectinload(User.subscriptions).joinedload(Subscription.plan))
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+    if is_active is not None:
+        query = query.filter(User.is_active == is_active)
+    return query.order_by(User.id).limit(limit).all()
+
+# Access tokens carry these (or were issued on the strength of them): changing one revokes the user's tokens
+REVOKING_FIELDS = {"email", "hashed_password", "is_admin", "is_active"}
 
 def update_user(db: Session, user_id: int, user_update: UserUpdate):
     db_user = get_user(db, user_id)
     if db_user:
+        old_email = db_user.email
         update_data = user_update.model_dump(exclude_unset=True)
+        revoke = any(key in REVOKING_FIELDS and getattr(db_user, key) != value for key, value in update_data.items())
 
         for key, value in update_data.items():
             setattr(db_user, key, value)
-            
+        if revoke:
+            db_user.token_version = User.token_version + 1
+
         db.commit() 
         db.refresh(db_user)
+        # Tokens are keyed by email, drop both the old and the new one (in every worker)
+        principal_cache = get_principal_cache()
+        principal_cache.invalidate(old_email)
+        principal_cache.invalidate(db_user.email)
+        if revoke:
+            get_token_revocations().revoke(db_user.id, db_user.token_version)
     return db_user
 
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    # Used by login to upgrade hashes made with an old bcrypt cost
+    db.query(User).filter(User.id == user_id).update({User.hashed_password: hashed_password})
+    db.commit()
+
 def delete_user(db: Session, user_id: int):
     db_user = get_user(db, user_id)
     if db_user:
+        email, version = db_user.email, db_user.token_version
+        # Their active subscription goes with them (cascade): take it out of the plan's active count in the
+        # same transaction. Locked first, so a concurrent cancel can't take it out a second time
+        active = (
+            select(Subscription.plan_id)
+            .where(Subscription.user_id == user_id, Subscription.is_active == True)
+            .with_for_update()
+            .subquery("active")
+        )
+        db.execute(plan_delta(active, -1))
         db.delete(db_user)
         db.commit()
+        get_principal_cache().invalidate(email)
+        get_token_revocations().revoke(user_id, version + 1)
         return True
     return False
 
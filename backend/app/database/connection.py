@@ -1,26 +1,204 @@
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from fastapi import Request
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-import os
-from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from ..cache_backend import get_cache_backend
+from ..config import get_settings
+from .pool_stats import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_engine
+from .replica import RecentWriters, ReplicaHealth, caller_key
+
+# Engines are created on first use, not at import:
+# importing the app (workers, tests, Alembic) never opens a connection or needs a database URL
+_engine = None
+_async_engine = None
+_read_engine = None
+_read_async_engine = None
+
+def get_engine():
+    """The SQLAlchemy engine (connection pool), created on first call."""
+    global _engine
+    if _engine is None:
+        settings = get_settings()
+        _engine = create_engine(
+            settings.database_url, poolclass=InstrumentedQueuePool, pool_logging_name="primary", **settings.pool_options
+        )
+        instrument_engine(_engine, "primary")
+    return _engine
+
+def get_async_engine():
+    """The asyncpg engine for DB_ASYNC=true, created on first call."""
+    global _async_engine
+    if _async_engine is None:
+        settings = get_settings()
+        _async_engine = create_async_engine(
+            settings.async_database_url, poolclass=InstrumentedAsyncQueuePool, pool_logging_name="async", **settings.pool_options
+        )
+        instrument_engine(_async_engine.sync_engine, "async")
+    return _async_engine
+
+def get_read_engine():
+    """The read replica engine (READ_DATABASE_URL), created on first call. None without a replica."""
+    global _read_engine
+    settings = get_settings()
+    if _read_engine is None and settings.read_database_url:
+        _read_engine = create_engine(
+            settings.read_database_url, poolclass=InstrumentedQueuePool, pool_logging_name="replica",
+            connect_args={"connect_timeout": settings.replica_connect_timeout}, **settings.pool_options
+        )
+        instrument_engine(_read_engine, "replica")
+    return _read_engine
 
-load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL")
+def get_read_async_engine():
+    """The read replica engine for DB_ASYNC=true, created on first call. None without a replica."""
+    global _read_async_engine
+    settings = get_settings()
+    if _read_async_engine is None and settings.read_async_database_url:
+        _read_async_engine = create_async_engine(
+            settings.read_async_database_url, poolclass=InstrumentedAsyncQueuePool, pool_logging_name="replica_async",
+            connect_args={"timeout": settings.replica_connect_timeout}, **settings.pool_options
+        )
+        instrument_engine(_read_async_engine.sync_engine, "replica_async")
+    return _read_async_engine
 
-# Create the SQLAlchemy engine (connection)
-engine = create_engine(DATABASE_URL)
+def get_engines() -> dict:
+    """The engines created so far, by pool name (sync engines, for pool inspection)."""
+    engines = {}
+    if _engine is not None:
+        engines["primary"] = _engine
+    if _async_engine is not None:
+        engines["async"] = _async_engine.sync_engine
+    if _read_engine is not None:
+        engines["replica"] = _read_engine
+    if _read_async_engine is not None:
+        engines["replica_async"] = _read_async_engine.sync_engine
+    return engines
 
-# Create a session to interact with the database
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def reset_engines(close: bool = True):
+    """Forget the engines, the next get_*engine() call creates new ones.
+    close=False is for a forked worker (gunicorn post_fork): the inherited connections belong to the
+    parent and must be left alone, not closed from here (SQLAlchemy's "using engines with multiprocessing").
+    Async engines are never closed here (that needs their event loop, see dispose_engines).
+    """
+    global _engine, _async_engine, _read_engine, _read_async_engine
+    for engine in (_engine, _read_engine):
+        if engine is not None:
+            engine.dispose(close=close)
+    for engine in (_async_engine, _read_async_engine):
+        if engine is not None:
+            engine.sync_engine.dispose(close=False)
+    _engine = _async_engine = _read_engine = _read_async_engine = None
+
+async def dispose_engines():
+    """Close every pooled connection and forget the engines (shutdown)."""
+    global _engine, _async_engine, _read_engine, _read_async_engine
+    for engine in (_engine, _read_engine):
+        if engine is not None:
+            engine.dispose()
+    for engine in (_async_engine, _read_async_engine):
+        if engine is not None:
+            await engine.dispose()
+    _engine = _async_engine = _read_engine = _read_async_engine = None
+
+# Session factories, bound to the engine when a session is opened
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(autoflush=False, expire_on_commit=False)
+
+def new_session():
+    """A Session on the primary engine, for code outside a request (jobs, scripts)."""
+    return SessionLocal(bind=get_engine())
 
 # Create a base class for declarative models
 Base = declarative_base()
 
-# Dependency to get DB session
-# This function open/close sessions properly 
-# This opens a session for a request and closes it when the request is done
-def get_db():
-    db = SessionLocal()
+@asynccontextmanager
+async def _open_session(replica: bool = False):
+    # In async mode an AsyncSession, else a Session closed in the threadpool
+    if get_settings().db_async:
+        async with AsyncSessionLocal(bind=get_read_async_engine() if replica else get_async_engine()) as db:
+            yield db
+        return
+    db = SessionLocal(bind=get_read_engine() if replica else get_engine())
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        await run_in_threadpool(db.close)
+
+# Dependency to get DB session
+# This function open/close sessions properly
+# This opens a session for a request and closes it when the request is done
+# In async mode it yields an AsyncSession instead of a Session
+async def get_db():
+    async with _open_session() as db:
+        yield db
+
+# --- Read replica ---
+# Built from the settings on first use, like the engines (cache_clear() rebuilds them)
+@lru_cache
+def get_replica_health() -> ReplicaHealth:
+    settings = get_settings()
+    return ReplicaHealth(max_lag=settings.replica_max_lag, check_interval=settings.replica_check_interval)
+
+@lru_cache
+def get_recent_writers() -> RecentWriters:
+    return RecentWriters(window=get_settings().replica_sticky_seconds)
+
+def replica_configured() -> bool:
+    settings = get_settings()
+    return bool(_read_engine or _read_async_engine or settings.read_database_url)
+
+async def use_replica(request: Request) -> bool:
+    """Whether this read can go to the replica: there is one, it is healthy and caught up,
+    and the caller hasn't written anything in the last REPLICA_STICKY_SECONDS.
+    """
+    if not replica_configured():
+        return False
+    health = get_replica_health()
+    if get_settings().db_async:
+        healthy = await health.check_async(get_read_async_engine())
+    elif health.due():
+        healthy = await run_in_threadpool(health.check, get_read_engine())
+    else:
+        healthy = health.healthy
+    if not healthy:
+        return False
+    caller = caller_key(request.headers.get("authorization"))
+    if caller is None:
+        return True
+    writers = get_recent_writers()
+    if get_cache_backend().remote:
+        return not await run_in_threadpool(writers.wrote_recently, caller)
+    return not writers.wrote_recently(caller)
+
+# Dependency for read-only routes: like get_db, on the replica when use_replica() allows it
+async def get_read_db(request: Request):
+    async with _open_session(replica=await use_replica(request)) as db:
+        yield db
+
+async def run_db(db, fn, *args, response_model=None, **kwargs):
+    """Run a CRUD function from an async route without blocking the event loop.
+    Args:
+        db (Session | AsyncSession): The session yielded by get_db.
+        fn (callable): A CRUD function taking the session as its first argument.
+        response_model (type, optional): Pydantic schema to build from the result before returning.
+            Lazy relationships are then loaded here instead of on the event loop. Defaults to None.
+    Returns:
+        The CRUD result, or the schema instance(s) when response_model is given.
+    """
+    def call(session):
+        result = fn(session, *args, **kwargs)
+        if response_model is None or result is None or isinstance(result, bool):
+            return result
+        if isinstance(result, list):
+            return [response_model.model_validate(item) for item in result]
+        return response_model.model_validate(result)
+
+    # A sync Session runs in the threadpool like a plain `def` route did,
+    # an AsyncSession runs the same code on the event loop through greenlets
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(call)
+    return await run_in_threadpool(call, db)
@@ -1,3 +1,5 @@
 from .user import User
 from .plan import Plan
-from .subscription import Subscription
\ No newline at end of file
+from .subscription import Subscription
+from .analytics import DailySubscriptionStats, PlanSubscriptionStats
+from .renewal import RenewalRun
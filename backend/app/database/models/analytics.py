@@ -0,0 +1,23 @@
+# Subscription analytics rollups, kept up to date by the subscription writes themselves (crud.subscriptions)
+# and recomputed from the subscriptions table by the reconciliation job (crud.analytics.reconcile_rollups).
+# Dashboards read these small tables instead of aggregating every subscription on each load
+from sqlalchemy import Column, Date, ForeignKey, Integer
+
+from ..connection import Base
+
+class PlanSubscriptionStats(Base):
+    """Active subscriptions per plan (one row per plan)."""
+
+    __tablename__ = "plan_subscription_stats"
+
+    plan_id = Column(Integer, ForeignKey("plans.id", ondelete="CASCADE"), primary_key=True)
+    active_subscribers = Column(Integer, nullable=False, default=0, server_default="0")
+
+class DailySubscriptionStats(Base):
+    """New subscriptions and cancellations per day (UTC)."""
+
+    __tablename__ = "daily_subscription_stats"
+
+    day = Column(Date, primary_key=True)
+    new_subscriptions = Column(Integer, nullable=False, default=0, server_default="0")
+    cancellations = Column(Integer, nullable=False, default=0, server_default="0")
@@ -12,7 +12,7 @@ class Plan(Base):
     description = Column(String, nullable=True)
     duration_months = Column(Integer, nullable=False)  # Duration in months
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
     subscriptions = relationship("Subscription", back_populates="plan")
\ No newline at end of file
@@ -0,0 +1,19 @@
+# Subscription renewal runs (crud.renewals): one row per run, updated in the same transaction as each
+# chunk of renewals, so a run that stops half way (worker crash, deploy) resumes after the last committed chunk
+from sqlalchemy import Column, DateTime, Integer
+
+from ..connection import Base
+
+class RenewalRun(Base):
+    """Progress of one renewal run: subscriptions ending before `cutoff`, walked in id order."""
+
+    __tablename__ = "renewal_runs"
+
+    id = Column(Integer, primary_key=True)
+    cutoff = Column(DateTime(timezone=True), nullable=False)
+    last_subscription_id = Column(Integer, nullable=False, default=0, server_default="0")  # checkpoint
+    renewed = Column(Integer, nullable=False, default=0, server_default="0")
+    batches = Column(Integer, nullable=False, default=0, server_default="0")
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    checkpoint_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)  # None while it still has work left
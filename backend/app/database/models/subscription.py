@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Boolean, DateTime
 from sqlalchemy.orm import relationship
 from ..connection import Base
 from datetime import datetime, timezone
@@ -9,9 +9,22 @@ class Subscription(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
     plan_id = Column(Integer, ForeignKey('plans.id'), nullable=False)
-    start_date = Column(DateTime, default=lambda: datetime.now(timezone.utc)) # why lambda? Because SQLAlchemy needs a callable (something it can call each time a new row is inserted). If we just write datetime.now(timezone.utc), it will evaluate once at import time.
-    end_date = Column(DateTime, nullable=True)
+    start_date = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)) # why lambda? Because SQLAlchemy needs a callable (something it can call each time a new row is inserted). If we just write datetime.now(timezone.utc), it will evaluate once at import time.
+    end_date = Column(DateTime(timezone=True), nullable=True)
     is_active = Column(Boolean, default=True)
+    # Set when the owner or an admin cancels it (not when it simply expires), feeds the daily cancellation counts
+    cancelled_at = Column(DateTime(timezone=True), nullable=True)
 
     user = relationship("User", back_populates="subscriptions")
-    plan = relationship("Plan", back_populates="subscriptions")
\ No newline at end of file
+    plan = relationship("Plan", back_populates="subscriptions")
+
+    __table_args__ = (
+        # get_subscriptions_by_user (user_id) and the active-subscription lookup (user_id, is_active)
+        Index("ix_subscriptions_user_id_is_active", user_id, is_active),
+        # Admin listing filtered by plan, walked in id order by the keyset pagination
+        Index("ix_subscriptions_plan_id_id", plan_id, id),
+        # Expiry sweeper: finds active rows past their end_date without scanning inactive history
+        Index("ix_subscriptions_active_end_date", end_date, postgresql_where=is_active),
+        # At most one active subscription per user, enforced by the DB instead of a check-then-insert
+        Index("uq_subscriptions_one_active_per_user", user_id, unique=True, postgresql_where=is_active),
+    )
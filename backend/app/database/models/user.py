@@ -17,7 +17,11 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Goes up whenever issued access tokens must stop working (see REVOKING_FIELDS in crud.users)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
-    subscriptions = relationship("Subscription", back_populates="user")
+    # Deleting a user deletes their subscriptions (ON DELETE CASCADE): leave it to the database
+    # instead of having the ORM set user_id to NULL on them
+    subscriptions = relationship("Subscription", back_populates="user", cascade="all, delete", passive_deletes=True)
 
@@ -0,0 +1,97 @@
+# Connection pool instrumentation
+# Separates "waiting for a pooled connection" from "waiting on a slow query":
+# every checkout is timed, and connects / invalidations / overflow use are counted per engine
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+class PoolStats:
+    """Counters for one engine's pool. Safe to update from many threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_timeouts = 0
+            self.checkout_wait_total = 0.0
+            self.checkout_wait_max = 0.0
+            self.connects = 0
+            self.invalidations = 0
+            self.overflow_peak = 0
+
+    def record_checkout(self, wait: float, overflow: int):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+            self.overflow_peak = max(self.overflow_peak, overflow)
+
+    def record_timeout(self):
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_invalidation(self):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self, pool) -> dict:
+        """Current pool state plus the counters collected since startup."""
+        with self._lock:
+            return {
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                # pool.overflow() counts down from -pool_size while the pool fills: only connections past it count
+                "overflow": max(pool.overflow(), 0),
+                "overflow_peak": self.overflow_peak,
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_wait_avg_ms": round(self.checkout_wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "checkout_wait_max_ms": round(self.checkout_wait_max * 1000, 3),
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+            }
+
+# One PoolStats per pool logging name ("primary", "async", ...)
+_registry: dict[str, PoolStats] = {}
+
+def get_pool_stats(name: str) -> PoolStats:
+    if name not in _registry:
+        _registry[name] = PoolStats()
+    return _registry[name]
+
+class _TimedCheckout:
+    # Pool.connect() is where a request blocks when the pool is exhausted,
+    # so time it there (this also covers opening a brand new connection)
+    def connect(self):
+        stats = get_pool_stats(self._orig_logging_name)
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except exc.TimeoutError:
+            stats.record_timeout()
+            raise
+        stats.record_checkout(time.perf_counter() - start, self.overflow())
+        return conn
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+def instrument_engine(engine, name: str):
+    """Count new connections and invalidations for an engine built with an instrumented pool."""
+    stats = get_pool_stats(name)
+    event.listen(engine, "connect", lambda dbapi_conn, record: stats.record_connect())
+    event.listen(engine, "invalidate", lambda dbapi_conn, record, exception: stats.record_invalidation())
+    event.listen(engine, "soft_invalidate", lambda dbapi_conn, record, exception: stats.record_invalidation())
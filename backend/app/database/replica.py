@@ -0,0 +1,140 @@
+# Read replica routing for GET endpoints (get_read_db in connection.py)
+# Reads go to the replica unless:
+#  - it is unhealthy or lagging more than REPLICA_MAX_LAG (checked every REPLICA_CHECK_INTERVAL seconds)
+#  - the caller wrote something in the last REPLICA_STICKY_SECONDS: they must read their own write,
+#    which the replica may not have replayed yet
+# Writes are noticed by ReadYourWritesMiddleware and remembered in the shared cache backend,
+# so the next read sticks to the primary whichever worker serves it
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from ..cache_backend import get_cache_backend
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind. A server that isn't replaying WAL (a primary, as in local tests with
+# two instances) is not behind. A standby that has replayed all it received is only caught up while its
+# WAL receiver is streaming: if replication broke, "all it received" stopped growing at the break,
+# so it counts as infinitely behind (NULL replay timestamp too: nothing replayed yet)
+LAG_QUERY = text("""
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 'Infinity'::float8
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())::float8, 'Infinity'::float8)
+END
+""")
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+class ReplicaHealth:
+    """Last known state of the replica. Only one request at a time runs the check, the others use the last result."""
+
+    def __init__(self, max_lag: float, check_interval: float):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.healthy = True
+        self.lag = None
+        self.checked_at = float("-inf")
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def due(self) -> bool:
+        return time.monotonic() - self.checked_at >= self.check_interval
+
+    def _claim(self) -> bool:
+        # Stamp first: concurrent requests see a fresh checked_at and don't start their own check
+        with self._lock:
+            if not self.due():
+                return False
+            self.checked_at = time.monotonic()
+            return True
+
+    def _record(self, lag):
+        self.lag = float(lag)
+        self.healthy = self.lag <= self.max_lag
+        if not self.healthy:
+            logger.warning("replica %.1fs behind (max %.1fs), reading from the primary", self.lag, self.max_lag)
+
+    def _failed(self, exc: Exception):
+        self.healthy = False
+        self.failures += 1
+        logger.warning("replica check failed, reading from the primary: %s", exc)
+
+    def check(self, engine) -> bool:
+        """Check the replica through a sync engine if the last check is old. Blocking: call it off the event loop."""
+        if self._claim():
+            try:
+                with engine.connect() as conn:
+                    self._record(conn.execute(LAG_QUERY).scalar())
+            except Exception as exc:
+                self._failed(exc)
+        return self.healthy
+
+    async def check_async(self, engine) -> bool:
+        """Same as check() through an AsyncEngine."""
+        if self._claim():
+            try:
+                async with engine.connect() as conn:
+                    self._record((await conn.execute(LAG_QUERY)).scalar())
+            except Exception as exc:
+                self._failed(exc)
+        return self.healthy
+
+    def stats(self) -> dict:
+        # Infinite lag (replication broken) isn't valid JSON: reported as null, with healthy false
+        lag = self.lag if self.lag is None or math.isfinite(self.lag) else None
+        return {"healthy": self.healthy, "lag_seconds": lag, "failed_checks": self.failures}
+
+class RecentWriters:
+    """Callers who wrote in the last `window` seconds, kept in the shared cache backend."""
+
+    prefix = "wrote:"
+
+    def __init__(self, window: float):
+        self.window = window
+
+    def mark(self, caller: str):
+        get_cache_backend().set(self.prefix + caller, b"1", self.window)
+
+    def wrote_recently(self, caller: str) -> bool:
+        return get_cache_backend().get(self.prefix + caller) is not None
+
+def caller_key(authorization: str | None) -> str | None:
+    """Who is asking: a digest of the bearer token (same token, same client session). None when anonymous."""
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()[:32]
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware: after a successful write, send the caller's reads to the primary for a while.
+    The mark is stored before the response starts, so the client can't read before it exists.
+    """
+
+    def __init__(self, app, writers, enabled):
+        self.app = app
+        self.writers = writers  # callable returning the RecentWriters (built on first use)
+        self.enabled = enabled  # callable: is a replica configured at all
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in SAFE_METHODS or not self.enabled():
+            await self.app(scope, receive, send)
+            return
+        caller = caller_key(dict(scope["headers"]).get(b"authorization", b"").decode() or None)
+
+        async def send_after_marking(message):
+            if caller and message["type"] == "http.response.start" and message["status"] < 400:
+                writers = self.writers()
+                if get_cache_backend().remote:
+                    await run_in_threadpool(writers.mark, caller)
+                else:
+                    writers.mark(caller)
+            await send(message)
+
+        await self.app(scope, receive, send_after_marking)
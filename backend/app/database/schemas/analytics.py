@@ -0,0 +1,22 @@
+from datetime import date
+from pydantic import BaseModel
+
+# Admin analytics (GET /analytics/...), read from the rollup tables
+# mrr: monthly recurring revenue, each active subscriber paying price / duration_months per month
+class PlanAnalytics(BaseModel):
+    plan_id: int
+    name: str
+    price: float
+    duration_months: int
+    active_subscribers: int
+    mrr: float
+
+class SubscriptionAnalytics(BaseModel):
+    active_subscribers: int
+    mrr: float
+    plans: list[PlanAnalytics]
+
+class DailySubscriptions(BaseModel):
+    day: date
+    new_subscriptions: int
+    cancellations: int
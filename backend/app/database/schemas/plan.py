@@ -29,4 +29,7 @@ class Plan(PlanBase):
     created_at: datetime
     updated_at: datetime
 
-    
\ No newline at end of file
+# Response of GET /plans/batch?ids=
+class PlanBatch(BaseModel):
+    items: dict[int, Plan]
+    missing: list[int]
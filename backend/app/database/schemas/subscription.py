@@ -23,3 +23,9 @@ class Subscription(SubscriptionBase):
     is_active: bool
 
     plan: Optional[Plan] = None
+
+# Response of GET /subscriptions/batch?ids=: same per-item rule as GET /subscriptions/{id}
+class SubscriptionBatch(BaseModel):
+    items: dict[int, Subscription]
+    missing: list[int]
+    forbidden: list[int] = []  # they exist but belong to someone else
@@ -7,7 +7,7 @@
     BaseModel - is a data validator / filter - defines how daat moves through the internet
 '''
 from pydantic import BaseModel, EmailStr, ConfigDict 
-from typing import Optional
+from typing import Literal, Optional
 from .subscription import Subscription
 
 # These are the core fields needed for any user, whether creating or reading
@@ -40,5 +40,34 @@ class User(UserBase):
     is_active: bool
     subscriptions: list[Subscription] = []
 
+# Response of GET /users/batch?ids=: found users keyed by id, and the ids that were not returned
+class UserBatch(BaseModel):
+    items: dict[int, User]
+    missing: list[int]
+    forbidden: list[int] = []  # other users' ids, for a caller who is not an admin
 
+# The authenticated caller, as resolved by get_current_user
+# Small and immutable so it can be cached between requests
+# Built from the access token's claims, which carry no name (only tokens without claims load it)
+class Principal(BaseModel):
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+    id: int
+    email: EmailStr
+    name: Optional[str] = None
+    is_active: bool
+    is_admin: bool
+    token_version: int = 0
+
+# Outcome of one row of a bulk import (POST /users/bulk), `row` is 1-based
+class UserImportResult(BaseModel):
+    row: int
+    email: Optional[str] = None
+    status: Literal["created", "duplicate", "invalid"]
+    id: Optional[int] = None
+    detail: Optional[str] = None
 
+class UserImportReport(BaseModel):
+    created: int
+    duplicates: int
+    invalid: int
+    results: list[UserImportResult]
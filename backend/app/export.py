@@ -0,0 +1,28 @@
+# Row encoders for the streaming subscription export
+# Each call turns one batch of rows into bytes, so a response never holds more than a batch
+import csv
+import io
+import json
+
+EXPORT_COLUMNS = [
+    "id", "user_id", "user_email", "user_name",
+    "plan_id", "plan_name", "plan_price", "plan_duration_months",
+    "start_date", "end_date", "is_active",
+]
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+def encode_ndjson(rows) -> bytes:
+    lines = [json.dumps({col: _json_value(row[col]) for col in EXPORT_COLUMNS}) for row in rows]
+    return ("\n".join(lines) + "\n").encode()
+
+def csv_header() -> bytes:
+    return (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+
+def encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_json_value(row[col]) for col in EXPORT_COLUMNS])
+    return buffer.getvalue().encode()
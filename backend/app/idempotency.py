@@ -0,0 +1,123 @@
+# Idempotency-Key support for POST endpoints that clients retry (POST /users/, POST /subscriptions/)
+# The first request with a key claims it in the shared cache backend (SET NX) and runs;
+# its response (success or 4xx) is stored under the key for IDEMPOTENCY_TTL seconds.
+#  - a retry after it finished gets the stored response back, the CRUD layer is never called
+#  - a duplicate arriving while the first is still running waits for its response
+#  - the same key with a different body is refused (422): it is a client bug, not a retry
+# A 5xx or a crash releases the key so the next retry runs for real.
+# Keys live in the cache backend: use CACHE_BACKEND=redis when more than one worker serves requests
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import Response
+
+from .cache_backend import get_cache_backend
+from .config import get_settings
+
+KEY_PREFIX = "idem:"
+MAX_KEY_LENGTH = 255
+REPLAY_HEADER = "Idempotent-Replayed"
+
+class IdempotencyError(Exception):
+    """The request can't be run or replayed for its Idempotency-Key (main.py answers with status_code)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def fingerprint(payload) -> str:
+    """Keyed hash of the request body: compared between retries, reveals nothing (passwords) if the store leaks."""
+    raw = payload.model_dump_json() if isinstance(payload, BaseModel) else json.dumps(jsonable_encoder(payload), sort_keys=True)
+    return hmac.new(get_settings().secret_key.encode(), raw.encode(), hashlib.sha256).hexdigest()
+
+async def _backend_call(fn, *args):
+    # Redis calls are network I/O, keep them off the event loop (the memory backend is just a dict)
+    if get_cache_backend().remote:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+class IdempotentRequest:
+    """Async context manager around the work of one request:
+
+        async with IdempotentRequest(idempotency_key, f"subscriptions:{current_user.id}", sub) as idem:
+            if idem.replay:
+                return idem.replay
+            ...
+            return idem.respond(result, status_code=201)
+
+    Without a key (header not sent) it does nothing and respond() just encodes the result.
+    """
+
+    def __init__(self, key: str | None, scope: str, payload):
+        if key is not None and not 0 < len(key) <= MAX_KEY_LENGTH:
+            raise IdempotencyError(400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+        self.key = key
+        # Scoped per endpoint (and caller), so two users can't collide on the same key
+        self.store_key = f"{KEY_PREFIX}{scope}:{key}"
+        self.fingerprint = fingerprint(payload) if key is not None else None
+        self.replay = None
+        self._owner = False
+        self._record = None
+
+    async def __aenter__(self):
+        if self.key is None:
+            return self
+        settings = get_settings()
+        backend = get_cache_backend()
+        pending = json.dumps({"state": "pending", "fp": self.fingerprint}).encode()
+        deadline = time.monotonic() + settings.idempotency_wait_timeout
+        delay = 0.01
+        while True:
+            # The pending marker expires on its own if this worker dies mid-request
+            if await _backend_call(backend.set_if_absent, self.store_key, pending, settings.idempotency_lock_timeout):
+                self._owner = True
+                return self
+            raw = await _backend_call(backend.get, self.store_key)
+            if raw is not None:
+                record = json.loads(raw)
+                if record["fp"] != self.fingerprint:
+                    raise IdempotencyError(422, "Idempotency-Key was already used with a different request")
+                if record["state"] == "done":
+                    self.replay = Response(
+                        content=record["body"].encode(),
+                        status_code=record["status"],
+                        media_type="application/json",
+                        headers={**record.get("headers", {}), REPLAY_HEADER: "true"},
+                    )
+                    return self
+            # Still running elsewhere (or it just failed and the key is free again): wait and look again
+            if time.monotonic() >= deadline:
+                raise IdempotencyError(409, "A request with this Idempotency-Key is still in progress")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.2)
+
+    def respond(self, result, status_code: int = 200) -> Response:
+        """JSON response for `result` (a schema instance or anything jsonable), stored for retries."""
+        body = result.model_dump_json() if isinstance(result, BaseModel) else json.dumps(jsonable_encoder(result))
+        self._record = {"status": status_code, "body": body}
+        return Response(content=body.encode(), status_code=status_code, media_type="application/json")
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if not self._owner:
+            return False
+        backend = get_cache_backend()
+        record = self._record
+        if isinstance(exc, HTTPException) and exc.status_code < 500:
+            # Client errors are answers too: the retry must get the same 400/404, not a different outcome
+            record = {"status": exc.status_code, "body": json.dumps({"detail": exc.detail}), "headers": exc.headers or {}}
+        elif exc is not None:
+            record = None
+        if record is None:
+            await _backend_call(backend.delete, self.store_key)
+            return False
+        value = json.dumps({"state": "done", "fp": self.fingerprint, **record}).encode()
+        await _backend_call(backend.set, self.store_key, value, get_settings().idempotency_ttl)
+        return False
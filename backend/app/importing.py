@@ -0,0 +1,29 @@
+# Row decoders for the bulk user import (POST /users/bulk)
+# Only turn the request body into a list of dicts; each row is validated on its own by the route
+import csv
+import io
+import json
+
+IMPORT_COLUMNS = ["email", "name", "password"]
+
+def parse_json(body: bytes) -> list:
+    """A JSON array of {"email", "name", "password"} objects."""
+    try:
+        rows = json.loads(body)
+    except ValueError:
+        raise ValueError("Body is not valid JSON")
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of users")
+    return rows
+
+def parse_csv(body: bytes) -> list[dict]:
+    """CSV with a header row containing the email, name and password columns."""
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("CSV must be UTF-8")
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [col for col in IMPORT_COLUMNS if col not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV header is missing: {', '.join(missing)}")
+    return [{col: row[col] for col in IMPORT_COLUMNS} for row in reader]
@@ -1,28 +1,102 @@
 # Control Center - The first file that runs when the server is started
-# Initialize the application, connect the db and wire up all the modular routes
-from fastapi import FastAPI
-from .routes import subscription, user, plan, auth
-# Importing Engine - the physical connection to Postgres
-from .database.connection import engine, Base
+# Initialize the application and wire up all the modular routes
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from .config import get_settings
+from .routes import subscription, user, plan, auth, admin, analytics
+# Engines are created lazily, on the first request that needs one
+from .database.connection import Base, dispose_engines, get_engine
 # Importing Blueprints (models) so the app knows what tables to create
-from .database.models import user as user_model
 from .database.models.user import User
 from .database.models.plan import Plan
 from .database.models.subscription import Subscription
+from .database.models.analytics import DailySubscriptionStats, PlanSubscriptionStats
+from .database.models.renewal import RenewalRun
+from .admission import LoginThrottledError
+from .metrics import RequestMetricsMiddleware, metrics_endpoint
+from .cache import start_invalidation_listener, stop_invalidation_listener
+from .utils import HashingBusyError, get_hash_executor
+from .pagination import InvalidCursorError
+from .idempotency import IdempotencyError
+from .database import connection
+from .database.replica import ReadYourWritesMiddleware
+
+# Startup / shutdown
+# Importing this module touches neither the database nor the network, so workers and tests boot fast.
+# The schema is owned by Alembic (alembic upgrade head); AUTO_CREATE_TABLES=true keeps the old
+# create_all behaviour for quick local setups
+_schema_created = False
+
+def create_schema():
+    """create_all once per process tree: under gunicorn the master runs it before forking
+    (gunicorn.conf.py) and the workers inherit the flag, instead of racing each other on the DDL.
+    """
+    global _schema_created
+    if get_settings().auto_create_tables and not _schema_created:
+        Base.metadata.create_all(bind=get_engine())
+        _schema_created = True
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(create_schema)
+    start_invalidation_listener()
+    yield
+    stop_invalidation_listener()
+    get_hash_executor().shutdown()
+    await dispose_engines()
+
+# Too many logins/registrations waiting on bcrypt: shed load instead of queueing forever
+async def hashing_busy_handler(request: Request, exc: HashingBusyError):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please retry"}, headers={"Retry-After": "1"})
+
+# Login refused by admission control (rate limit or too many logins in flight)
+async def login_throttled_handler(request: Request, exc: LoginThrottledError):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many login attempts, please retry later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": "Invalid cursor"})
+
+# Idempotency-Key reused with another body (422), still in progress (409) or malformed (400)
+async def idempotency_error_handler(request: Request, exc: IdempotencyError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
+def create_app() -> FastAPI:
+    """Application factory (uvicorn app.main:create_app --factory)."""
+    # App initialization - creates the main instance of our web aplication
+    # The title appears in /docs
+    app = FastAPI(title="Subscription Management API", lifespan=lifespan)
+
+    app.add_exception_handler(HashingBusyError, hashing_busy_handler)
+    app.add_exception_handler(InvalidCursorError, invalid_cursor_handler)
+    app.add_exception_handler(LoginThrottledError, login_throttled_handler)
+    app.add_exception_handler(IdempotencyError, idempotency_error_handler)
+
+    # Rote registration
+    # Routers are like mini-apps (in our modularized code)
+    # include_router tells FastAPI - Take all the URLs defined in these files and make them part of the app
+    app.include_router(user.router)
+    app.include_router(subscription.router)
+    app.include_router(plan.router)
+    app.include_router(auth.router)
+    app.include_router(admin.router)
+    app.include_router(analytics.router)
+
+    # Request timing / query counts: Server-Timing header and Prometheus on /metrics
+    settings = get_settings()
+    if settings.metrics_enabled:
+        app.add_middleware(RequestMetricsMiddleware, server_timing=settings.server_timing)
+        app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
+    # Read replica: after a write, the caller's next reads stay on the primary (read-your-writes)
+    app.add_middleware(ReadYourWritesMiddleware, writers=connection.get_recent_writers, enabled=connection.replica_configured)
+    return app
 
-# DB initialization
-# This tells SQLAlchemy to look at all the classes that inherits from 'Base' (User, Plan, Subscription)
-# and create those tables in the DB, if they don't exist yet. 
-user_model.Base.metadata.create_all(bind=engine)
-
-# App initialization - creates the main instance of our web aplication
-# The title appears in /docs
-app = FastAPI(title="Subscription Management API")
-
-# Rote registration
-# Routers are like mini-apps (in our modularized code)
-# include_router tells FastAPI - Take all the URLs defined in these files and make them part of the app
-app.include_router(user.router)
-app.include_router(subscription.router)
-app.include_router(plan.router)
-app.include_router(auth.router)
\ No newline at end of file
+# uvicorn app.main:app keeps working
+app = create_app()
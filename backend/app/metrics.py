@@ -0,0 +1,129 @@
+# Per-request timing and database query instrumentation
+# RequestMetricsMiddleware times every request, and the SQLAlchemy cursor hooks below add each query's
+# count and duration to the request that ran it (a contextvar, so threadpool and async sessions both work).
+# Results go out two ways:
+#  - a Server-Timing header on the response (app / db time, query count), visible in browser dev tools
+#  - Prometheus histograms labelled by route template (/subscriptions/{sub_id}, not the raw URL), on GET /metrics
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+from starlette.responses import Response
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, until the response is complete",
+    ["method", "route", "status"],
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in database queries per request",
+    ["method", "route"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries per request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf")),
+)
+
+class RequestStats:
+    """Queries run by one request and the time they took. Threads of the same request add to it."""
+
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+# --- SQLAlchemy hooks ---
+# Listening on the Engine class covers every engine (primary, async, tests) without wiring each one.
+# Queries outside a request (Celery, scripts) find no RequestStats and are ignored
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._query_start = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    start = getattr(context, "_query_start", None)
+    if stats is not None and start is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+# Labelled children resolved once per (method, route, status): labels() takes a lock and builds a key every call
+_children = {}
+
+def _observers(method: str, route: str, status: int):
+    key = (method, route, status)
+    children = _children.get(key)
+    if children is None:
+        children = _children[key] = (
+            REQUEST_DURATION.labels(method, route, str(status)),
+            REQUEST_DB_DURATION.labels(method, route),
+            REQUEST_DB_QUERIES.labels(method, route),
+        )
+    return children
+
+def _route_template(scope) -> str:
+    # Set by the router once a route matched; unmatched URLs share one label to keep cardinality bounded
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware task/stream overhead): times the request,
+    adds Server-Timing to the response and observes the Prometheus histograms.
+    """
+
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    # Time to the first byte: for streamed responses the body is still to come
+                    app_ms = (time.perf_counter() - start) * 1000
+                    value = f'app;dur={app_ms:.1f}, db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"'
+                    message = {**message, "headers": [*message.get("headers", []), (b"server-timing", value.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            duration, db_duration, db_queries = _observers(scope["method"], _route_template(scope), status)
+            duration.observe(time.perf_counter() - start)
+            db_duration.observe(stats.db_time)
+            db_queries.observe(stats.queries)
+
+def metrics_endpoint(request: Request) -> Response:
+    """Prometheus text exposition. With several worker processes set PROMETHEUS_MULTIPROC_DIR,
+    so every worker writes its samples there and any worker can serve them all.
+    """
+    registry = REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,31 @@
+# Opaque cursors for keyset (seek) pagination
+# A cursor only carries the last primary key seen, so page N costs the same as page 1:
+# "WHERE id > :last ORDER BY id LIMIT n" is an index range scan, OFFSET would scan and discard N rows
+import base64
+import json
+
+class InvalidCursorError(ValueError):
+    """The cursor was not produced by encode_cursor."""
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str | None) -> int | None:
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        last_id = data["id"]
+    except (ValueError, TypeError, KeyError) as exc:
+        raise InvalidCursorError(cursor) from exc
+    if not isinstance(last_id, int):
+        raise InvalidCursorError(cursor)
+    return last_id
+
+def next_cursor(rows: list, limit: int) -> str | None:
+    """The cursor for the page after `rows`, or None on the last page.
+    CRUD functions fetch limit + 1 rows; the extra row only tells us there is more.
+    """
+    if len(rows) <= limit:
+        return None
+    return encode_cursor(rows[limit - 1].id)
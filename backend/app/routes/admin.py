@@ -0,0 +1,47 @@
+# Admin-only operational endpoints (metrics, diagnostics)
+from fastapi import APIRouter, Depends
+
+from ..admission import get_login_admission
+from ..cache import cache_stats
+from ..config import get_settings
+from ..database import connection
+from ..database.schemas.user import Principal
+from ..database.pool_stats import get_pool_stats
+from .auth import get_current_admin
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+@router.get("/metrics/pool")
+async def read_pool_metrics(admin_user: Principal = Depends(get_current_admin)):
+    """Connection pool statistics per engine.
+    Compare checkout_wait_* with request latency to tell pool queueing apart from slow queries.
+    Returns:
+        dict: Pool settings and counters, keyed by engine name (engines not used yet are left out).
+    """
+    options = get_settings().pool_options
+    return {
+        name: {
+            **get_pool_stats(name).snapshot(eng.pool),
+            "max_overflow": options["max_overflow"],
+            "timeout": options["pool_timeout"],
+        }
+        for name, eng in connection.get_engines().items()
+    }
+
+@router.get("/metrics/cache")
+async def read_cache_metrics(admin_user: Principal = Depends(get_current_admin)):
+    """Hit/miss counters of this worker's caches and of the shared cache backend.
+    Returns:
+        dict: "shared" (backend name, hits, misses, errors), "principals" and "plan_catalog".
+    """
+    return cache_stats()
+
+@router.get("/metrics/login")
+async def read_login_metrics(admin_user: Principal = Depends(get_current_admin)):
+    """Login admission control in this worker: logins verifying now, waiting, and refused so far."""
+    return get_login_admission().stats()
+
+@router.get("/metrics/replica")
+async def read_replica_metrics(admin_user: Principal = Depends(get_current_admin)):
+    """Read replica state as last checked by this worker. "configured" is false without READ_DATABASE_URL."""
+    return {"configured": connection.replica_configured(), **connection.get_replica_health().stats()}
@@ -0,0 +1,33 @@
+# Admin analytics: subscribers, MRR and daily new / cancelled subscriptions
+# Served from the rollup tables (crud.analytics), so the cost depends on the number of plans
+# and days asked for, never on the size of the subscriptions table
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from ..crud import analytics as analytics_crud
+from ..database.connection import get_read_db, run_db
+from ..database.schemas import analytics as analytics_schemas
+from ..database.schemas.user import Principal
+from .auth import get_current_admin
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+@router.get("/subscriptions", response_model=analytics_schemas.SubscriptionAnalytics)
+async def read_subscription_analytics(
+    db: Session = Depends(get_read_db),
+    admin_user: Principal = Depends(get_current_admin)
+):
+    """Active subscribers and MRR, in total and per plan."""
+    return await run_db(db, analytics_crud.get_plan_stats)
+
+@router.get("/subscriptions/daily", response_model=list[analytics_schemas.DailySubscriptions])
+async def read_daily_subscriptions(
+    days: int = Query(30, ge=1, le=366),
+    db: Session = Depends(get_read_db),
+    admin_user: Principal = Depends(get_current_admin)
+):
+    """New subscriptions and cancellations per day (UTC) for the last `days` days, today included."""
+    today = datetime.now(timezone.utc).date()
+    return await run_db(db, analytics_crud.get_daily_stats, today - timedelta(days=days - 1), today)
@@ -1,17 +1,22 @@
 # Routers = application layer (entry point for API requests)
-import os
 from datetime import datetime, timedelta, timezone
-from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt, JWTError
 
-from ..database.models.user import User
+from starlette.concurrency import run_in_threadpool
 
-from ..utils import verify_password
+from ..admission import check_login_rate, get_login_admission
+from ..cache import get_principal_cache, get_token_revocations
+from ..cache_backend import get_cache_backend
+from ..config import get_settings
+from ..database.schemas.user import Principal
+
+from ..utils import verify_and_update_password_async
 from ..crud.users import get_user_by_email
 from ..database.schemas.token import Token
 from ..database import connection
+from ..database.connection import run_db
 from sqlalchemy.orm import Session
 from ..crud import users as user_crud
 
@@ -19,11 +24,7 @@ from ..crud import users as user_crud
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 # --- JWT Configuration ---
-load_dotenv()  # Load environment variables from .env file
-
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# SECRET_KEY, ALGORITHM and ACCESS_TOKEN_EXPIRE_MINUTES come from app.config, read on use
 
 # OAuth2 scheme for token extraction from requests
 # This tells FastAPI: When a route requires authentication, I expect a Bearer Token in the HTTP header.
@@ -42,12 +43,20 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=15))
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    settings = get_settings()
+    encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
+
+def token_claims(user) -> dict:
+    """Claims that identify `user` (a User row or Principal) without a database lookup.
+    sub: email, uid: user id, adm: admin flag, ver: token version (see crud.users.REVOKING_FIELDS).
+    """
+    return {"sub": user.email, "uid": user.id, "adm": user.is_admin, "ver": user.token_version}
     
 # --- Login Route ---
 @router.post("/login", response_model=Token)
-def login(
+async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(connection.get_db)
     ):
@@ -58,21 +67,37 @@ def login(
     Returns:
         Token: A Pydantic model containing the access token and token type.
     """
-    # 1. Get user by email and verify password
-    user = user_crud.get_user_by_email(db, form_data.username)
-
-    # 2. verify credentials
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # 0. Admission control: rate limits per IP and per account, then a bounded number of logins at once.
+    # Refused attempts get 429 before any database or bcrypt work
+    client_ip = request.client.host if request.client else None
+    if get_cache_backend().remote:
+        await run_in_threadpool(check_login_rate, client_ip, form_data.username)
+    else:
+        check_login_rate(client_ip, form_data.username)
+    async with get_login_admission():
+        # 1. Get user by email and verify password
+        user = await run_db(db, user_crud.get_user_by_email, form_data.username)
+
+        # 2. verify credentials
+        # bcrypt runs on the hashing process pool, not in this worker
+        verified, new_hash = False, None
+        if user:
+            verified, new_hash = await verify_and_update_password_async(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    # The stored hash was made with a different cost factor, store the fresh one
+    if new_hash:
+        await run_db(db, user_crud.update_password_hash, user.id, new_hash)
     
     # 3. Create JWT token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token_expires = timedelta(minutes=get_settings().access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data=token_claims(user), expires_delta=access_token_expires
     )
 
     # 4. Return token
@@ -81,14 +106,14 @@ def login(
 
 # --- Current user dependency ---
 # Validates and extracts user info from JWT token
-def get_current_user(token: str = Depends(oauth2_schema), db: Session = Depends(connection.get_db)):
+async def get_current_user(token: str = Depends(oauth2_schema), db: Session = Depends(connection.get_db)):
     """Dependency to get the current user from the JWT token.
     Args:
         token (str, optional): The JWT token. Defaults to Depends(OAuth2PasswordRequestForm).
     Raises:
         HTTPException: If the token is invalid or expired.
     Returns:
-        str: The username extracted from the token.
+        Principal: The user the token belongs to.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -96,21 +121,37 @@ def get_current_user(token: str = Depends(oauth2_schema), db: Session = Depends(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        settings = get_settings()
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    
-    user = get_user_by_email(db, email=email)
+
+    user_id = payload.get("uid")
+    if user_id is not None:
+        # The signed claims already say who the caller is and whether they are an admin.
+        # Only the revocation check remains: answered from this worker's memory, else one primary key
+        # lookup of the user's token version (off the event loop), remembered for the TTL
+        version = get_token_revocations().get_local(user_id)
+        if version is None:
+            version = await run_db(db, user_crud.get_token_version, user_id)
+        if payload.get("ver", 0) < version:
+            raise credentials_exception
+        return Principal(id=user_id, email=email, is_active=True, is_admin=payload.get("adm", False), token_version=payload.get("ver", 0))
+
+    # Tokens issued before the claims existed: resolve the email.
+    # Resolved principals are cached, so most requests skip the users lookup.
+    # This worker's copy is checked on the event loop, the shared tier and the DB off it
+    user = get_principal_cache().get_local(email) or await run_db(db, user_crud.get_principal, email)
     if user is None:
         raise credentials_exception
-    return user # If all good -> current user object is returned and injected into route dependencies
+    return user # If all good -> current user (Principal) is returned and injected into route dependencies
 
 # --- Protected route example ---
 @router.get("/me")
-def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     """Protected route to get the current user's information.
     Args:
         current_user (str, optional): The current user extracted from the token. Defaults to Depends(get_current_user).
@@ -120,7 +161,7 @@ def read_users_me(current_user: User = Depends(get_current_user)):
     """
     return {"email": current_user.email}
 
-def get_current_admin(current_user: User = Depends(get_current_user)):
+async def get_current_admin(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
@@ -135,13 +176,13 @@ User logs in → /auth/login
 
 Server verifies email + password
 
-Server issues JWT (contains sub = email, exp = expiry)
+Server issues JWT (contains sub = email, uid = user id, adm = admin flag, ver = token version, exp = expiry)
 
 Client saves token (usually in localStorage / cookies / memory)
 
 Client makes API requests with header Authorization: Bearer <token>
 
-Server checks token with get_current_user
+Server checks token with get_current_user (signature, expiry, not revoked: no database lookup)
 
 If valid → gives access, else → 401
 """
\ No newline at end of file
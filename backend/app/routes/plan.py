@@ -1,43 +1,77 @@
-from fastapi import APIRouter, Depends, HTTPException
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
-from ..database.models.user import User
+from ..cache import get_plan_catalog_cache
+from ..config import get_settings
+
+from ..database.schemas.user import Principal
 from .auth import get_current_admin
-from ..database.connection import get_db
+from ..database.connection import get_db, run_db
 from ..crud import plans as plan_crud
 from ..database.schemas import plan as plan_schemas
+from ..batch import batch_ids, missing_ids
 
 router = APIRouter(prefix="/plans", tags=["plans"])
 
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 asks for If-None-Match
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def _cached_response(request: Request, body: bytes, etag: str) -> Response:
+    # Public catalog: clients and CDNs may cache it and revalidate with If-None-Match
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={get_settings().plan_cache_max_age}"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def _plan_catalog(db):
+    # Served from memory when warm: no DB call and no serialization
+    return get_plan_catalog_cache().get() or await run_db(db, plan_crud.get_plan_catalog)
+
 @router.get("/", response_model=list[plan_schemas.Plan])
-def read_plans(db: Session = Depends(get_db)):
-    return plan_crud.get_plans(db)
+async def read_plans(request: Request, db: Session = Depends(get_db)):
+    catalog = await _plan_catalog(db)
+    return _cached_response(request, catalog.body, catalog.etag)
+
+# Several plans at once, straight from the catalog: each plan's JSON is already there
+@router.get("/batch", response_model=plan_schemas.PlanBatch)
+async def read_plans_batch(ids: list[int] = Depends(batch_ids), db: Session = Depends(get_db)):
+    catalog = await _plan_catalog(db)
+    found = [plan_id for plan_id in ids if plan_id in catalog.items]
+    items = b",".join(b'"%d":%s' % (plan_id, catalog.items[plan_id][0]) for plan_id in found)
+    body = b'{"items":{' + items + b'},"missing":' + orjson.dumps(missing_ids(ids, found)) + b"}"
+    return Response(content=body, media_type="application/json")
 
 @router.get("/{plan_id}", response_model=plan_schemas.Plan)
-def read_plan(plan_id: int, db: Session = Depends(get_db)):
-    db_plan = plan_crud.get_plan(db, plan_id=plan_id)
-    if db_plan is None:
+async def read_plan(plan_id: int, request: Request, db: Session = Depends(get_db)):
+    catalog = await _plan_catalog(db)
+    if plan_id not in catalog.items:
         raise HTTPException(status_code=404, detail="Plan not found")
-    return db_plan
+    return _cached_response(request, *catalog.items[plan_id])
 
 @router.post("/", response_model=plan_schemas.Plan)
-def create_plan(
-    plan: plan_schemas.PlanCreate, 
+async def create_plan(
+    plan: plan_schemas.PlanCreate,
     db: Session = Depends(get_db),
-    admin_user: User = Depends(get_current_admin)    
+    admin_user: Principal = Depends(get_current_admin)
 ):
-    return plan_crud.create_plan(db, plan)
+    return await run_db(db, plan_crud.create_plan, plan, response_model=plan_schemas.Plan)
 
-@router.put("/{plan_id}", response_model=plan_schemas.Plan) 
-def update_plan(plan_id: int, plan: plan_schemas.PlanUpdate, db: Session = Depends(get_db)):
-    updated = plan_crud.update_plan(db, plan_id, plan)
+@router.put("/{plan_id}", response_model=plan_schemas.Plan)
+async def update_plan(plan_id: int, plan: plan_schemas.PlanUpdate, db: Session = Depends(get_db)):
+    updated = await run_db(db, plan_crud.update_plan, plan_id, plan, response_model=plan_schemas.Plan)
     if not updated:
         raise HTTPException(status_code=404, detail="Plan not found")
     return updated
 
 @router.delete("/{plan_id}", status_code=204)
-def delete_plan(plan_id: int, db: Session = Depends(get_db)):
-    success = plan_crud.delete_plan(db, plan_id)
+async def delete_plan(plan_id: int, db: Session = Depends(get_db)):
+    success = await run_db(db, plan_crud.delete_plan, plan_id)
     if not success:
         raise HTTPException(status_code=404, detail="Plan not found")
-    return None
\ No newline at end of file
+    return None
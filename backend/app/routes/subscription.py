@@ -1,57 +1,117 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from ..database.connection import get_db
+from starlette.concurrency import iterate_in_threadpool
+from ..database.connection import get_db, get_read_db, run_db
 from ..crud import subscriptions as sub_crud
+from ..pagination import decode_cursor, next_cursor
+from ..serialization import json_batch_response, json_rows_response
+from ..batch import batch_ids, missing_ids
+from ..export import csv_header, encode_csv, encode_ndjson
+from ..idempotency import IdempotentRequest
 from ..database.schemas import subscription as sub_schemas
 from .auth import get_current_user, get_current_admin
-from ..database.models.user import User
-from ..database.models.subscription import Subscription as sub_model
+from ..database.schemas.user import Principal
 
 router = APIRouter(prefix="/subscriptions", tags=["subscriptions"])
 
 @router.post("/", response_model=sub_schemas.Subscription)
-def create_subscription(
+async def create_subscription(
     sub: sub_schemas.SubscriptionCreate, 
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user),
+    idempotency_key: str | None = Header(None)
 ):
+    # A retried request (same Idempotency-Key) gets the first response back without running again
+    async with IdempotentRequest(idempotency_key, f"subscriptions:{current_user.id}", sub) as idem:
+        if idem.replay:
+            return idem.replay
 
-    # 1. Check if they have an active sub (Duplicate check)
-    existing_sub = db.query(sub_model).filter(sub_model.user_id==current_user.id, sub_model.is_active==True).first()
-    if existing_sub:
-        raise HTTPException(status_code=400, detail=f"User with ID {current_user.id} already has an active subscription")
-    
-    # Now call the CRUD
-    # Use current_user.id instead of passing it in the URL
-    result = sub_crud.create_subscription(db, sub, current_user.id)
-    if result is None:
-        raise HTTPException(status_code=404, detail="Invalid or inactive plan selected")
-    return result
+        # Call the CRUD
+        # Use current_user.id instead of passing it in the URL
+        # Duplicate check: the DB's one-active-subscription-per-user index rejects the insert
+        try:
+            result = await run_db(db, sub_crud.create_subscription, sub, current_user.id, response_model=sub_schemas.Subscription)
+        except sub_crud.ActiveSubscriptionExistsError:
+            raise HTTPException(status_code=400, detail=f"User with ID {current_user.id} already has an active subscription")
+        if result is None:
+            raise HTTPException(status_code=404, detail="Invalid or inactive plan selected")
+        return idem.respond(result)
 
 @router.get("/me", response_model=list[sub_schemas.Subscription])
-def get_my_subscriptions(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+async def get_my_subscriptions(
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    return sub_crud.get_subscriptions_by_user(db, current_user.id)
+    # List endpoints return the rows as JSON bytes (app/serialization.py), not schema objects
+    subs = await run_db(db, sub_crud.get_subscriptions_by_user, current_user.id)
+    return json_rows_response(sub_schemas.Subscription, subs)
 
 # Admin Route: See every subscription in the system
+# Keyset paginated: pass the X-Next-Cursor header of one page as ?cursor= to get the next
 @router.get("/all", response_model=list[sub_schemas.Subscription])
-def read_all_subscriptions(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin)
+async def read_all_subscriptions(
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    is_active: bool | None = None,
+    plan_id: int | None = None,
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_admin)
+):
+    subs = await run_db(db, sub_crud.get_all_subscriptions, decode_cursor(cursor), limit + 1, is_active, plan_id)
+    next_page = next_cursor(subs, limit)
+    headers = {"X-Next-Cursor": next_page} if next_page else None
+    return json_rows_response(sub_schemas.Subscription, subs[:limit], headers=headers)
+
+# Admin Route: export every subscription (with plan and user columns) as NDJSON or CSV
+# Rows are streamed in batches from a server-side cursor, so memory stays flat
+# and the first bytes go out before the whole table has been read
+@router.get("/export")
+async def export_subscriptions(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    batch_size: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_admin)
+):
+    if isinstance(db, AsyncSession):
+        batches = sub_crud.stream_subscription_export_async(db, batch_size)
+    else:
+        # One threadpool hop per batch, not per row
+        batches = iterate_in_threadpool(sub_crud.stream_subscription_export(db, batch_size))
+
+    async def body():
+        if format == "csv":
+            yield csv_header()
+        async for rows in batches:
+            yield encode_csv(rows) if format == "csv" else encode_ndjson(rows)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="subscriptions.{format}"'}
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+# ADMIN/USER route: several at once, with the ownership check of read_subscription applied to each
+@router.get("/batch", response_model=sub_schemas.SubscriptionBatch)
+async def read_subscriptions_batch(
+    ids: list[int] = Depends(batch_ids),
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    # In a real app: if not current_user.is_admin: raise 403  
-    return sub_crud.get_all_subscriptions(db)
+    subs = await run_db(db, sub_crud.get_subscriptions_by_ids, ids)
+    forbidden = [] if current_user.is_admin else [s.id for s in subs if s.user_id != current_user.id]
+    visible = [s for s in subs if s.id not in forbidden]
+    return json_batch_response(sub_schemas.Subscription, visible, missing=missing_ids(ids, subs), forbidden=forbidden)
 
 # ADMIN/USER route: see detail of one
 @router.get("/{sub_id}", response_model=sub_schemas.Subscription)
-def read_subscription(
+async def read_subscription(
     sub_id: int, 
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    db_sub = sub_crud.get_subscriptions_by_id(db, sub_id)
+    db_sub = await run_db(db, sub_crud.get_subscriptions_by_id, sub_id, response_model=sub_schemas.Subscription)
     if not db_sub:
         raise HTTPException(status_code=404, detail="Subscription not found")
     
@@ -63,17 +123,17 @@ def read_subscription(
 
 # User/Admin Route: Cancel a subscription
 @router.patch("/{subscription_id}/cancel", response_model=sub_schemas.Subscription)
-def cancel_subscription(
+async def cancel_subscription(
     subscription_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    sub = sub_crud.get_subscriptions_by_id(db, subscription_id)
-    if not sub:
-        raise HTTPException(status_code=404, detail="Subscription not found")
-    
-    # Ownership Check: Only owner or admin can cancel
-    if sub.user_id != current_user.id and not current_user.is_admin:
+    # Ownership Check: Only owner or admin can cancel (enforced by the UPDATE itself)
+    owner_id = None if current_user.is_admin else current_user.id
+    sub = await run_db(db, sub_crud.cancel_subscription, subscription_id, owner_id, response_model=sub_schemas.Subscription)
+    if sub is None:
+        # Nothing cancelled: only now look up whether it is missing or someone else's
+        if not await run_db(db, sub_crud.get_subscriptions_by_id, subscription_id):
+            raise HTTPException(status_code=404, detail="Subscription not found")
         raise HTTPException(status_code=403, detail="Not authorized to cancel this subscription")
-        
-    return sub_crud.cancel_subscription(db, subscription_id)
\ No newline at end of file
+    return sub
\ No newline at end of file
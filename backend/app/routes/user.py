@@ -1,6 +1,16 @@
 from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from pydantic import ValidationError
+from ..config import get_settings
 from ..database import connection
+from ..database.connection import run_db
+from ..idempotency import IdempotentRequest, fingerprint
+from ..importing import parse_csv, parse_json
+from ..utils import hash_password_async, hash_passwords_async
+from ..pagination import decode_cursor, next_cursor
+from ..serialization import json_batch_response, json_rows_response
+from ..batch import batch_ids, missing_ids
+from .auth import get_current_admin, get_current_user
 
 from ..crud import users as user_crud
 from ..database.schemas import user as user_schema
@@ -14,40 +24,160 @@ router = APIRouter(prefix="/users", tags=["users"])
 # and will use Pydantic schemas for request validation and response formatting
 # Handles user registration route
 @router.post("/", response_model=user_schema.User, status_code=201)
-def register_user(user: user_schema.UserCreate, db: Session = Depends(connection.get_db)):
+async def register_user(
+    user: user_schema.UserCreate,
+    db: Session = Depends(connection.get_db),
+    idempotency_key: str | None = Header(None)
+):
     """
     Register a new user in the system.
     Checks if the email is already taken before creating.
+    A retry with the same Idempotency-Key header gets the first response back (no second bcrypt hash).
+    """
+    # Anonymous: scoped by the email being registered, so unrelated clients reusing a key never share
+    # a response (hashed, the store holds no addresses)
+    scope = f"users:{fingerprint(user.email.strip().lower())}"
+    async with IdempotentRequest(idempotency_key, scope, user) as idem:
+        if idem.replay:
+            return idem.replay
+
+        # 1. Check for duplicate email
+        existing_user = await run_db(db, user_crud.get_user_by_email, email=user.email)
+        if existing_user:
+            raise HTTPException(status_code=400, detail="Email already registered")
+
+        # 2. Hash on the hashing process pool (bcrypt is CPU bound) and call the CRUD
+        hashed_password = await hash_password_async(user.password)
+        created = await run_db(db, user_crud.create_user, user, hashed_password, response_model=user_schema.User)
+        return idem.respond(created, status_code=201)
+
+# Admin bulk import: a JSON array or a CSV file (Content-Type: text/csv) of email, name, password
+@router.post("/bulk", response_model=user_schema.UserImportReport)
+async def import_users(
+    request: Request,
+    db: Session = Depends(connection.get_db),
+    admin_user: user_schema.Principal = Depends(get_current_admin)
+):
+    """
+    Create many users at once and report the outcome of every row.
+    Bad rows and duplicate emails are reported, they don't fail the whole import.
     """
-    # 1. Check for duplicate email
-    existing_user = user_crud.get_user_by_email(db, email=user.email)
-    if existing_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
+    settings = get_settings()
+    body = await request.body()
+    try:
+        rows = parse_csv(body) if "csv" in request.headers.get("content-type", "") else parse_json(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(rows) > settings.user_import_max_rows:
+        raise HTTPException(status_code=413, detail=f"At most {settings.user_import_max_rows} users per import")
 
-    # 2. Call the CRUD
-    return user_crud.create_user(db, user)
+    # 1. Validate every row like POST /users/ would
+    results = [None] * len(rows)
+    valid = {}  # email -> (row index, UserCreate), first occurrence wins
+    for index, raw in enumerate(rows):
+        try:
+            user = user_schema.UserCreate.model_validate(raw)
+        except ValidationError as e:
+            error = e.errors()[0]
+            # Echo the email back as text, whatever the row held ({"email": 5} is reported, not a 500)
+            email = raw.get("email") if isinstance(raw, dict) else None
+            results[index] = user_schema.UserImportResult(
+                row=index + 1,
+                email=email if email is None or isinstance(email, str) else str(email),
+                status="invalid",
+                detail=f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}",
+            )
+            continue
+        if user.email in valid:
+            results[index] = user_schema.UserImportResult(
+                row=index + 1, email=user.email, status="duplicate", detail="Duplicate email in this import"
+            )
+            continue
+        valid[user.email] = (index, user)
+
+    # 2. Existing emails in one query, so no password is hashed for nothing
+    existing = await run_db(db, user_crud.get_existing_emails, list(valid))
+    new_users = [(index, user) for email, (index, user) in valid.items() if email not in existing]
+    for email in existing:
+        index, _ = valid[email]
+        results[index] = user_schema.UserImportResult(
+            row=index + 1, email=email, status="duplicate", detail="Email already registered"
+        )
+
+    # 3. Hash on every hashing process at once, then insert in multi-row batches
+    hashed = await hash_passwords_async([user.password for _, user in new_users])
+    created = await run_db(
+        db,
+        user_crud.bulk_create_users,
+        [{"email": user.email, "name": user.name, "hashed_password": h} for (_, user), h in zip(new_users, hashed)],
+        settings.user_import_batch_size,
+    )
+    for index, user in new_users:
+        if user.email in created:
+            results[index] = user_schema.UserImportResult(
+                row=index + 1, email=user.email, status="created", id=created[user.email]
+            )
+        else:
+            # Registered by someone else between the lookup and the insert
+            results[index] = user_schema.UserImportResult(
+                row=index + 1, email=user.email, status="duplicate", detail="Email already registered"
+            )
+
+    return user_schema.UserImportReport(
+        created=sum(r.status == "created" for r in results),
+        duplicates=sum(r.status == "duplicate" for r in results),
+        invalid=sum(r.status == "invalid" for r in results),
+        results=results,
+    )
+
+# Admin listing, keyset paginated like GET /subscriptions/all
+@router.get("/", response_model=list[user_schema.User])
+async def list_users(
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    is_active: bool | None = None,
+    db: Session = Depends(connection.get_read_db),
+    admin_user: user_schema.Principal = Depends(get_current_admin)
+):
+    users = await run_db(db, user_crud.get_users, decode_cursor(cursor), limit + 1, is_active)
+    next_page = next_cursor(users, limit)
+    headers = {"X-Next-Cursor": next_page} if next_page else None
+    return json_rows_response(user_schema.User, users[:limit], headers=headers)
+
+# Many users in one request: admins see any of them, other callers only themselves
+# Declared before /{user_id}, which would otherwise take "batch" for an id
+@router.get("/batch", response_model=user_schema.UserBatch)
+async def get_users_batch(
+    ids: list[int] = Depends(batch_ids),
+    db: Session = Depends(connection.get_read_db),
+    current_user: user_schema.Principal = Depends(get_current_user)
+):
+    forbidden = [] if current_user.is_admin else [user_id for user_id in ids if user_id != current_user.id]
+    allowed = [user_id for user_id in ids if user_id not in forbidden]
+    users = await run_db(db, user_crud.get_users_by_ids, allowed) if allowed else []
+    return json_batch_response(user_schema.User, users, missing=missing_ids(allowed, users), forbidden=forbidden)
 
 @router.get("/{user_id}", response_model=user_schema.User)
-def get_user(user_id: int, db: Session = Depends(connection.get_db)):
-    db_user = user_crud.get_user(db, user_id=user_id)
+async def get_user(user_id: int, db: Session = Depends(connection.get_read_db)):
+    db_user = await run_db(db, user_crud.get_user, user_id=user_id, response_model=user_schema.User)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 @router.put("/{user_id}", response_model=user_schema.User)
-def update_user(
+async def update_user(
     user_id: int, 
     user: user_schema.UserUpdate, 
     db: Session = Depends(connection.get_db)
 ):
-    db_user = user_crud.update_user(db, user_id=user_id, user_update=user)
+    db_user = await run_db(db, user_crud.update_user, user_id=user_id, user_update=user, response_model=user_schema.User)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: int, db: Session = Depends(connection.get_db)):
-    success = user_crud.delete_user(db, user_id=user_id)
+async def delete_user(user_id: int, db: Session = Depends(connection.get_db)):
+    success = await run_db(db, user_crud.delete_user, user_id=user_id)
     if not success: 
         raise HTTPException(status_code=404, detail="User not found")
     return None
\ No newline at end of file
@@ -0,0 +1,76 @@
+# Fast JSON for list endpoints
+# By default FastAPI validates whatever a route returns against response_model (a second time, run_db
+# already built the schemas), then encodes it with the stdlib json module. For ORM rows we loaded ourselves
+# that work is wasted: here the schema's fields are read straight off the rows by a getter compiled once
+# per schema, nested objects shared by many rows (a plan) are converted once, and orjson writes the bytes.
+# Routes keep response_model for the OpenAPI docs and return the bytes in a Response, which FastAPI passes through.
+# Only for rows whose relationships are eager loaded: reading a lazy one here would hit the DB on the event loop
+import types
+import typing
+from functools import lru_cache
+from operator import attrgetter
+
+import orjson
+from pydantic import BaseModel
+from starlette.responses import Response
+
+# Same output as Pydantic for UTC datetimes ("...Z")
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+def _unwrap(annotation):
+    """Optional[X] -> (X, False), list[X] -> (X, True)."""
+    if typing.get_origin(annotation) in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(args) == 1:
+            annotation = args[0]
+    if typing.get_origin(annotation) is list:
+        return typing.get_args(annotation)[0], True
+    return annotation, False
+
+@lru_cache
+def row_serializer(schema: type[BaseModel]):
+    """A function turning one trusted object (ORM row) into a dict shaped like `schema`."""
+    names, nested = [], []
+    for name, field in schema.model_fields.items():
+        inner, is_list = _unwrap(field.annotation)
+        names.append(name)
+        if isinstance(inner, type) and issubclass(inner, BaseModel):
+            nested.append((name, row_serializer(inner), is_list))
+    get_values = attrgetter(*names)
+    single = len(names) == 1
+
+    def serialize(obj, memo: dict) -> dict:
+        key = id(obj)
+        if key in memo:
+            return memo[key]
+        values = get_values(obj)
+        row = {names[0]: values} if single else dict(zip(names, values))
+        for name, child, is_list in nested:
+            value = row[name]
+            if value is None:
+                continue
+            row[name] = [child(item, memo) for item in value] if is_list else child(value, memo)
+        memo[key] = row
+        return row
+
+    return serialize
+
+def dump_rows(schema: type[BaseModel], rows) -> bytes:
+    """JSON array of `rows` as `schema`, without Pydantic validation."""
+    serialize = row_serializer(schema)
+    # memo: each object is converted once per response, however many rows point at it
+    memo = {}
+    return orjson.dumps([serialize(row, memo) for row in rows], option=ORJSON_OPTIONS)
+
+def json_rows_response(schema: type[BaseModel], rows, headers: dict | None = None) -> Response:
+    return Response(content=dump_rows(schema, rows), media_type="application/json", headers=headers)
+
+def dump_batch(schema: type[BaseModel], rows, **id_lists) -> bytes:
+    """Batch lookup body: {"items": {id: row as `schema`}, plus id_lists such as missing=[...]}."""
+    serialize = row_serializer(schema)
+    memo = {}
+    items = {row.id: serialize(row, memo) for row in rows}
+    return orjson.dumps({"items": items, **id_lists}, option=ORJSON_OPTIONS | orjson.OPT_NON_STR_KEYS)
+
+def json_batch_response(schema: type[BaseModel], rows, **id_lists) -> Response:
+    return Response(content=dump_batch(schema, rows, **id_lists), media_type="application/json")
@@ -1,12 +1,118 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
 from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+
+from .config import get_settings
+
+# Passwords per bulk hashing job: how long a login can wait behind one when every process is busy
+BULK_HASH_CHUNK = 32
 
-# one shared hashing context for the whole app
-_pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# one shared hashing context for the whole app (per process: hashing processes build their own)
+@lru_cache
+def get_pwd_context() -> CryptContext:
+    # bcrypt cost factor. Stored hashes with any other cost are rehashed on the next successful login
+    rounds = get_settings().bcrypt_rounds
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
 
 def hash_password(password: str) -> str:
     """Hash a password for storage. Return a secure hash for the given plain-text password."""
-    return _pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """Hash several passwords in one call (one round trip to a hashing process per chunk)."""
+    context = get_pwd_context()
+    return [context.hash(password) for password in passwords]
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a stored password against one provided by user"""
-    return _pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Verify a password and, if the stored hash uses an outdated cost, return a fresh hash to store."""
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+class HashingBusyError(Exception):
+    """Raised when the hashing queue is full. Routes turn this into a 503."""
+
+class HashingExecutor:
+    """Runs bcrypt in a bounded process pool so it never holds the GIL of a request worker.
+    At most `workers + queue_limit` jobs are in flight, anything beyond is refused with HashingBusyError.
+    Bulk jobs (run_bulk) hold at most `workers - 1` processes, so logins and sign-ups always find one free.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        # With a single process, bulk jobs still take turns with interactive ones, one chunk at a time
+        self.bulk_slots = max(workers - 1, 1)
+        self._pending = 0
+        self._pool = None
+        self._bulk_semaphore = None
+        self._loop = None
+
+    def _get_pool(self):
+        # Created on first use: a worker that never hashes never starts processes,
+        # and "spawn" keeps the children clear of the parent's threads and sockets
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def run(self, fn, *args):
+        if self._pending >= max(self.workers, 1) + self.queue_limit:
+            raise HashingBusyError("Password hashing queue is full")
+        self._pending += 1
+        try:
+            if self.workers == 0:
+                return await run_in_threadpool(fn, *args)
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    def _get_bulk_semaphore(self) -> asyncio.Semaphore:
+        # A semaphore belongs to one event loop (tests start a new loop per client)
+        loop = asyncio.get_running_loop()
+        if self._bulk_semaphore is None or self._loop is not loop:
+            self._bulk_semaphore = asyncio.Semaphore(self.bulk_slots)
+            self._loop = loop
+        return self._bulk_semaphore
+
+    async def run_bulk(self, fn, *args):
+        """run() for batch work: jobs beyond `bulk_slots` wait here, not in the pool's queue ahead of logins."""
+        async with self._get_bulk_semaphore():
+            return await self.run(fn, *args)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+# HASH_POOL_SIZE processes (0 = the threadpool instead of a process pool), created on first use
+@lru_cache
+def get_hash_executor() -> HashingExecutor:
+    settings = get_settings()
+    return HashingExecutor(workers=settings.hash_pool_size, queue_limit=settings.hash_queue_limit)
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the hashing executor."""
+    return await get_hash_executor().run(hash_password, password)
+
+async def hash_passwords_async(passwords: list[str]) -> list[str]:
+    """Hash a batch of passwords in small chunks on the bulk share of the hashing processes, results in input order."""
+    parts = [passwords[i:i + BULK_HASH_CHUNK] for i in range(0, len(passwords), BULK_HASH_CHUNK)]
+    executor = get_hash_executor()
+    hashed = await asyncio.gather(*(executor.run_bulk(hash_passwords, part) for part in parts))
+    return [h for part in hashed for h in part]
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """verify_and_update_password on the hashing executor."""
+    return await get_hash_executor().run(verify_and_update_password, plain_password, hashed_password)
@@ -0,0 +1,95 @@
+# Celery app for background jobs
+# Run a worker and the beat scheduler next to the API:
+#   celery -A app.worker worker --loglevel=info
+#   celery -A app.worker beat --loglevel=info
+import logging
+from datetime import datetime, timedelta, timezone
+
+from celery import Celery
+from sqlalchemy.exc import OperationalError
+
+from .config import get_settings
+from .crud import analytics as analytics_crud
+from .crud import renewals as renewals_crud
+from .crud import subscriptions as sub_crud
+from .database.connection import new_session
+
+CELERY_BROKER_URL = get_settings().celery_broker_url
+# How often the expiry sweeper runs, and how many rows each of its UPDATEs touches
+EXPIRY_SWEEP_INTERVAL = get_settings().expiry_sweep_interval
+EXPIRY_SWEEP_BATCH_SIZE = get_settings().expiry_sweep_batch_size
+# How often the analytics rollups are checked against the subscriptions table, and how many days back
+ANALYTICS_RECONCILE_INTERVAL = get_settings().analytics_reconcile_interval
+ANALYTICS_RECONCILE_DAYS = get_settings().analytics_reconcile_days
+# How often renewals run, how far ahead of their end date subscriptions are renewed, and chunk size
+RENEWAL_INTERVAL = get_settings().renewal_interval
+RENEWAL_LEAD = get_settings().renewal_lead
+RENEWAL_BATCH_SIZE = get_settings().renewal_batch_size
+
+logger = logging.getLogger(__name__)
+
+celery_app = Celery("subscription_engine", broker=CELERY_BROKER_URL)
+celery_app.conf.beat_schedule = {
+    "expire-subscriptions": {
+        "task": "app.worker.expire_subscriptions",
+        "schedule": EXPIRY_SWEEP_INTERVAL,
+    },
+    "reconcile-analytics": {
+        "task": "app.worker.reconcile_analytics",
+        "schedule": ANALYTICS_RECONCILE_INTERVAL,
+    },
+    "renew-subscriptions": {
+        "task": "app.worker.renew_subscriptions",
+        "schedule": RENEWAL_INTERVAL,
+    },
+}
+
+@celery_app.task(name="app.worker.expire_subscriptions")
+def expire_subscriptions(batch_size: int = EXPIRY_SWEEP_BATCH_SIZE) -> dict:
+    """Deactivate subscriptions whose end_date has passed."""
+    db = new_session()
+    try:
+        report = sub_crud.deactivate_expired_subscriptions(db, batch_size=batch_size)
+    finally:
+        db.close()
+    logger.info(
+        "expired %(rows)d subscriptions in %(batches)d batches (avg %(batch_ms_avg).1fms, max %(batch_ms_max).1fms)",
+        report,
+    )
+    return report
+
+@celery_app.task(name="app.worker.reconcile_analytics")
+def reconcile_analytics(days: int = ANALYTICS_RECONCILE_DAYS) -> dict:
+    """Recompute the analytics rollups and fix what drifted (writes made around the CRUD layer)."""
+    db = new_session()
+    try:
+        report = analytics_crud.reconcile_rollups(db, days=days)
+    finally:
+        db.close()
+    if report["plans_fixed"] or report["days_fixed"]:
+        logger.info("analytics rollups corrected: %(plans_fixed)d plans, %(days_fixed)d days", report)
+    return report
+
+# acks_late: a worker killed mid-run leaves the message in the queue, and the redelivered task (or a retry
+# after a lost connection) resumes the run from its last checkpoint
+@celery_app.task(
+    name="app.worker.renew_subscriptions",
+    acks_late=True,
+    autoretry_for=(OperationalError,),
+    retry_backoff=True,
+    max_retries=5,
+)
+def renew_subscriptions(batch_size: int = RENEWAL_BATCH_SIZE) -> dict:
+    """Extend every active subscription ending within RENEWAL_LEAD seconds by its plan's duration."""
+    db = new_session()
+    try:
+        cutoff = datetime.now(timezone.utc) + timedelta(seconds=RENEWAL_LEAD)
+        report = renewals_crud.run_renewals(db, batch_size=batch_size, cutoff=cutoff)
+    finally:
+        db.close()
+    logger.info(
+        "renewal run %(run_id)d: renewed %(rows)d subscriptions in %(batches)d batches "
+        "(avg %(batch_ms_avg).1fms, max %(batch_ms_max).1fms)",
+        report,
+    )
+    return report
@@ -0,0 +1,256 @@
+# API load test: seeds a database, starts the app with uvicorn and drives the hot paths
+#   login, GET /plans/, GET /subscriptions/me, POST /subscriptions/, admin listings
+# Each scenario runs for --duration seconds with --concurrency clients and reports throughput and p50/p95/p99.
+# Results can be saved as a baseline; later runs on the same machine with the same dataset fail (exit 1) when a scenario regresses.
+#
+# The database at BENCH_DATABASE_URL is WIPED and reseeded, point it at a scratch database.
+# Usage (from backend/, SECRET_KEY set):
+#   BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_api --users 10000 --save-baseline
+#   BENCH_DATABASE_URL=postgresql://... python -m benchmarks.bench_api --users 10000
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine, insert, text
+
+from .common import percentile, start_server, stop_server, wait_until_up
+
+BASELINE_FILE = Path(__file__).with_name("baselines.json")
+PASSWORD = "benchpassword"
+SCENARIOS = ["login", "plans", "my_subscriptions", "subscribe", "admin_subscriptions", "admin_users"]
+
+# --- Seeding ---
+def seed(database_url: str, users: int, plans: int, history: int, fresh: int) -> dict:
+    """Recreate the schema and insert the dataset with multi-row INSERTs.
+    Every user shares one bcrypt hash (hashing 10k passwords would dominate the setup).
+    Returns the ids the scenarios pick from.
+    """
+    from app.database.connection import Base
+    from app.database.models.plan import Plan
+    from app.database.models.subscription import Subscription
+    from app.database.models.user import User
+    from app.utils import hash_password
+
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    hashed = hash_password(PASSWORD)
+    now = datetime.now(timezone.utc)
+
+    with engine.begin() as conn:
+        conn.execute(insert(Plan.__table__), [
+            {"name": f"Plan {i}", "price": 5.0 + i, "description": "bench", "duration_months": 1 + i % 12,
+             "is_active": True, "created_at": now, "updated_at": now}
+            for i in range(plans)
+        ])
+        plan_ids = list(conn.execute(text("SELECT id FROM plans ORDER BY id")).scalars())
+
+        # Seeded users: `history` expired subscriptions + one active each.
+        # Fresh users: no subscription yet, each POST /subscriptions/ consumes one
+        rows = [{"email": "bench-admin@bench.com", "name": "Bench Admin", "hashed_password": hashed,
+                 "is_active": True, "is_admin": True, "created_at": now}]
+        rows += [{"email": f"bench-{i}@bench.com", "name": f"Bench {i}", "hashed_password": hashed,
+                  "is_active": True, "is_admin": False, "created_at": now} for i in range(users)]
+        rows += [{"email": f"fresh-{i}@bench.com", "name": f"Fresh {i}", "hashed_password": hashed,
+                  "is_active": True, "is_admin": False, "created_at": now} for i in range(fresh)]
+        for start in range(0, len(rows), 5000):
+            conn.execute(insert(User.__table__), rows[start:start + 5000])
+        user_ids = list(conn.execute(text("SELECT id FROM users WHERE email LIKE 'bench-%' AND NOT is_admin ORDER BY id")).scalars())
+
+        subs = []
+        for user_id in user_ids:
+            for h in range(history):
+                start = now - timedelta(days=60 * (h + 2))
+                subs.append({"user_id": user_id, "plan_id": random.choice(plan_ids), "start_date": start,
+                             "end_date": start + timedelta(days=30), "is_active": False})
+            subs.append({"user_id": user_id, "plan_id": random.choice(plan_ids), "start_date": now,
+                         "end_date": now + timedelta(days=30), "is_active": True})
+        for start in range(0, len(subs), 5000):
+            conn.execute(insert(Subscription.__table__), subs[start:start + 5000])
+        conn.execute(text("ANALYZE"))
+        max_sub_id = conn.execute(text("SELECT max(id) FROM subscriptions")).scalar() or 0
+        admin_id = conn.execute(text("SELECT id FROM users WHERE is_admin")).scalar()
+        fresh_ids = list(conn.execute(text("SELECT id FROM users WHERE email LIKE 'fresh-%' ORDER BY id")).scalars())
+    engine.dispose()
+    # bench-{i} and fresh-{i} were inserted in order, so their ids are in the same order
+    return {"plan_ids": plan_ids, "user_ids": user_ids, "fresh_ids": fresh_ids, "admin_id": admin_id,
+            "user_count": users, "fresh_count": fresh, "max_user_id": max(user_ids), "max_sub_id": max_sub_id}
+
+def make_token(email: str, user_id: int, is_admin: bool = False) -> str:
+    # Same claims, signing code and settings as the server, so tokens skip the (bcrypt bound) login
+    from app.database.schemas.user import Principal
+    from app.routes.auth import create_access_token, token_claims
+
+    user = Principal(id=user_id, email=email, is_active=True, is_admin=is_admin)
+    return create_access_token(data=token_claims(user), expires_delta=timedelta(hours=2))
+
+# --- Load generation ---
+async def run_scenario(base_url: str, name: str, request_fn, duration: float, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await request_fn(client)
+                if response is None:  # scenario ran out of data (fresh users)
+                    return
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else 0.0,
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+def build_scenarios(data: dict) -> dict:
+    from app.pagination import encode_cursor
+
+    user_tokens = [make_token(f"bench-{i}@bench.com", data["user_ids"][i]) for i in range(min(data["user_count"], 1000))]
+    admin = {"Authorization": f"Bearer {make_token('bench-admin@bench.com', data['admin_id'], is_admin=True)}"}
+    fresh = iter(range(data["fresh_count"]))
+
+    async def login(client):
+        email = f"bench-{random.randrange(data['user_count'])}@bench.com"
+        return await client.post("/auth/login", data={"username": email, "password": PASSWORD})
+
+    async def plans(client):
+        return await client.get("/plans/")
+
+    async def my_subscriptions(client):
+        return await client.get("/subscriptions/me", headers={"Authorization": f"Bearer {random.choice(user_tokens)}"})
+
+    async def subscribe(client):
+        i = next(fresh, None)
+        if i is None:
+            return None
+        headers = {"Authorization": f"Bearer {make_token(f'fresh-{i}@bench.com', data['fresh_ids'][i])}"}
+        return await client.post("/subscriptions/", json={"plan_id": random.choice(data["plan_ids"])}, headers=headers)
+
+    async def admin_subscriptions(client):
+        cursor = encode_cursor(random.randrange(data["max_sub_id"] + 1))
+        return await client.get("/subscriptions/all", params={"cursor": cursor, "limit": 100}, headers=admin)
+
+    async def admin_users(client):
+        cursor = encode_cursor(random.randrange(data["max_user_id"] + 1))
+        return await client.get("/users/", params={"cursor": cursor, "limit": 100}, headers=admin)
+
+    return {
+        "login": login,
+        "plans": plans,
+        "my_subscriptions": my_subscriptions,
+        "subscribe": subscribe,
+        "admin_subscriptions": admin_subscriptions,
+        "admin_users": admin_users,
+    }
+
+# --- Baselines ---
+def dataset_key(args) -> str:
+    # Baselines only compare like with like: same machine, dataset and load shape
+    # (a baseline from another box would hide regressions on a faster one and fail every run on a slower one)
+    return (
+        f"machine={platform.machine()},cpus={os.cpu_count()},"
+        f"users={args.users},plans={args.plans},history={args.history},concurrency={args.concurrency},workers={args.workers}"
+    )
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['rps']} req/s < baseline {base['rps']} req/s")
+        if result["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']}ms > baseline {base['p95_ms']}ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--plans", type=int, default=5)
+    parser.add_argument("--history", type=int, default=3, help="expired subscriptions per user")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression vs baseline (0.25 = 25%%)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--baseline-file", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--output", type=Path, help="also write the results as JSON here")
+    args = parser.parse_args()
+
+    database_url = os.environ.get("BENCH_DATABASE_URL")
+    if not database_url:
+        sys.exit("Set BENCH_DATABASE_URL to a scratch database (it is wiped and reseeded)")
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+
+    # Enough fresh users that POST /subscriptions/ doesn't run dry at any sensible rate
+    print(f"seeding {args.users} users ...")
+    data = seed(database_url, args.users, args.plans, args.history, fresh=5000)
+
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        # Measure the code, not the abuse protection
+        "LOGIN_IP_PER_MINUTE": "0",
+        "LOGIN_ACCOUNT_PER_MINUTE": "0",
+        "LOGIN_QUEUE_LIMIT": "100000",
+        "LOGIN_QUEUE_TIMEOUT": "60",
+    }
+    server = start_server(args.port, env, args.workers)
+    results = {}
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        asyncio.run(wait_until_up(base_url))
+        requests = build_scenarios(data)
+        for name in scenarios:
+            results[name] = asyncio.run(run_scenario(base_url, name, requests[name], args.duration, args.concurrency))
+    finally:
+        stop_server(server)
+
+    print(f"{'scenario':<22} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+    for name, r in results.items():
+        print(f"{name:<22} {r['rps']:>8.1f} {r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms {r['p99_ms']:>7.1f}ms {r['errors']:>7}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    baselines = json.loads(args.baseline_file.read_text()) if args.baseline_file.exists() else {}
+    key = dataset_key(args)
+    if args.save_baseline:
+        baselines[key] = {"results": results}
+        args.baseline_file.write_text(json.dumps(baselines, indent=2) + "\n")
+        print(f"baseline saved for {key}")
+        return
+    if key not in baselines:
+        print(f"no baseline for {key}, run with --save-baseline on this machine to record one")
+        return
+    failed = [name for name, r in results.items() if r["errors"]]
+    regressions = compare(results, baselines[key]["results"], args.tolerance)
+    regressions += [f"{name}: {results[name]['errors']} error responses" for name in failed]
+    if regressions:
+        print("REGRESSIONS:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print(f"no regressions against the baseline ({key})")
+
+if __name__ == "__main__":
+    main()
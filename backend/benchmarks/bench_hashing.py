@@ -0,0 +1,94 @@
+# Login storm benchmark: bcrypt inline (threadpool) vs the hashing process pool, then with login rate limits on
+# Starts the API with uvicorn for each mode, floods POST /auth/login and measures GET /plans/ latency meanwhile
+#
+# Usage (from backend/, DATABASE_URL and SECRET_KEY set, database migrated):
+#   python -m benchmarks.bench_hashing --duration 10 --concurrency 32
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+import httpx
+
+from .common import percentile, start_server, stop_server, wait_until_up
+
+async def run_storm(base_url: str, duration: float, concurrency: int, attack_rps: float = 0) -> dict:
+    email = f"bench-{uuid.uuid4().hex[:8]}@bench.com"
+    credentials = {"username": email, "password": "benchpassword"}
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await client.post("/users/", json={"email": email, "name": "Bench", "password": "benchpassword"})
+
+        logins = 0
+        throttled = 0
+        other_latencies = []
+        deadline = time.perf_counter() + duration
+
+        async def login_loop():
+            nonlocal logins, throttled
+            # attack_rps > 0: every mode gets the same offered load (cheap 429s would otherwise loop much faster)
+            interval = concurrency / attack_rps if attack_rps > 0 else 0
+            next_start = time.perf_counter()
+            while time.perf_counter() < deadline:
+                next_start += interval
+                response = await client.post("/auth/login", data=credentials)
+                if response.status_code == 200:
+                    logins += 1
+                elif response.status_code == 429:
+                    throttled += 1
+                await asyncio.sleep(max(0.0, next_start - time.perf_counter()))
+
+        async def probe_loop():
+            # A cheap endpoint, to see how much the login storm slows everything else down
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await client.get("/plans/")
+                other_latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(probe_loop(), *(login_loop() for _ in range(concurrency)))
+
+    return {
+        "logins_per_sec": logins / duration,
+        "throttled_per_sec": throttled / duration,
+        "other_p50_ms": statistics.median(other_latencies) if other_latencies else 0.0,
+        "other_p99_ms": percentile(other_latencies, 99),
+    }
+
+# Rate limits off: measure raw hashing throughput
+NO_RATE_LIMITS = {"LOGIN_IP_PER_MINUTE": "0", "LOGIN_ACCOUNT_PER_MINUTE": "0"}
+
+def bench(pool_size: int, args, rate_limits: bool = False) -> dict:
+    env = {**os.environ, "HASH_POOL_SIZE": str(pool_size), **({} if rate_limits else NO_RATE_LIMITS)}
+    server = start_server(args.port, env)
+    try:
+        base_url = f"http://127.0.0.1:{args.port}"
+        asyncio.run(wait_until_up(base_url))
+        return asyncio.run(run_storm(base_url, args.duration, args.concurrency, args.attack_rps))
+    finally:
+        stop_server(server)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pool-size", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--attack-rps", type=float, default=50, help="offered login rate, 0 = as fast as possible")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    results = {
+        "threadpool (HASH_POOL_SIZE=0)": bench(0, args),
+        f"process pool (HASH_POOL_SIZE={args.pool_size})": bench(args.pool_size, args),
+        "process pool + login rate limits": bench(args.pool_size, args, rate_limits=True),
+    }
+    print(f"{'mode':<34} {'logins/s':>10} {'429/s':>8} {'other p50':>10} {'other p99':>10}")
+    for mode, r in results.items():
+        print(
+            f"{mode:<34} {r['logins_per_sec']:>10.1f} {r['throttled_per_sec']:>8.1f}"
+            f" {r['other_p50_ms']:>8.1f}ms {r['other_p99_ms']:>8.1f}ms"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Serialization benchmark: cost of turning N ORM rows into the JSON body of a list endpoint
+#   fastapi_default  what the list routes did: run_db builds a schema per row, FastAPI validates the list
+#                    again against response_model, then json.dumps the jsonable result
+#   typeadapter      one precompiled TypeAdapter: validate from attributes once, dump_json in Rust
+#   trusted          app/serialization.py: fields read straight off the rows, orjson (what the routes use now)
+# No database: the rows are transient ORM objects, relationships already set like an eager load.
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_serialization --rows 10000 --repeat 5
+import argparse
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from pydantic import TypeAdapter
+
+from app.database.models.plan import Plan
+from app.database.models.subscription import Subscription
+from app.database.models.user import User
+from app.database.schemas import subscription as sub_schemas
+from app.database.schemas import user as user_schema
+from app.serialization import dump_rows
+
+def build_rows(count: int, plans: int = 5) -> dict:
+    """`count` subscriptions sharing a few plans, and `count` // 4 users with 4 subscriptions each."""
+    now = datetime.now(timezone.utc)
+    plan_rows = [
+        Plan(id=i, name=f"Plan {i}", price=5.0 + i, description="bench", duration_months=1 + i,
+             is_active=True, created_at=now, updated_at=now)
+        for i in range(plans)
+    ]
+    subs = [
+        Subscription(id=i, user_id=i // 4, plan_id=i % plans, start_date=now, end_date=now + timedelta(days=30),
+                     is_active=i % 4 == 0, plan=plan_rows[i % plans])
+        for i in range(count)
+    ]
+    users = [
+        User(id=u, email=f"user-{u}@bench.com", name=f"User {u}", is_active=True, subscriptions=subs[u * 4:u * 4 + 4])
+        for u in range(count // 4)
+    ]
+    return {"subscriptions": (sub_schemas.Subscription, subs), "users": (user_schema.User, users)}
+
+def fastapi_default(schema, rows) -> bytes:
+    adapter = TypeAdapter(list[schema])  # FastAPI keeps one per route, so build it outside the timing
+    def run():
+        models = [schema.model_validate(row) for row in rows]
+        validated = adapter.validate_python(models, from_attributes=True)
+        return json.dumps(adapter.dump_python(validated, mode="json")).encode()
+    return run
+
+def typeadapter(schema, rows):
+    adapter = TypeAdapter(list[schema])
+    def run():
+        return adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+    return run
+
+def trusted(schema, rows):
+    def run():
+        return dump_rows(schema, rows)
+    return run
+
+def best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000, help="subscriptions per run (users get a quarter as many)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per approach, the best one is reported")
+    args = parser.parse_args()
+
+    datasets = build_rows(args.rows)
+    print(f"{'rows':<14} {'approach':<16} {'ms':>9} {'ms/10k':>9} {'speedup':>8}")
+    for name, (schema, rows) in datasets.items():
+        baseline = None
+        for approach in (fastapi_default, typeadapter, trusted):
+            ms = best_ms(approach(schema, rows), args.repeat)
+            baseline = baseline or ms
+            per_10k = ms * 10000 / len(rows)
+            print(f"{name:<14} {approach.__name__:<16} {ms:>9.1f} {per_10k:>9.1f} {baseline / ms:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Startup benchmark: how long a fresh worker takes to import the app and run its lifespan startup
+# Each sample is a new interpreter, like a freshly forked / autoscaled worker.
+# Importing must not touch the database, so this runs without one (DATABASE_URL points nowhere)
+#
+# Usage (from backend/):
+#   python -m benchmarks.bench_startup --runs 5 --max-ms 2000
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in the child interpreter, prints the two timings as JSON
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def startup():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+started = asyncio.run(startup())
+print(json.dumps({"import_ms": (imported - start) * 1000, "startup_ms": (started - imported) * 1000}))
+"""
+
+def sample() -> dict:
+    env = {
+        **os.environ,
+        # Unroutable on purpose: any connection attempt at import or startup would fail or hang
+        "DATABASE_URL": "postgresql://nobody@203.0.113.1:5432/none",
+        "AUTO_CREATE_TABLES": "false",
+    }
+    out = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, timeout=60, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="exit 1 if median import + startup is slower")
+    args = parser.parse_args()
+
+    samples = [sample() for _ in range(args.runs)]
+    imports = [s["import_ms"] for s in samples]
+    startups = [s["startup_ms"] for s in samples]
+    total = statistics.median(i + s for i, s in zip(imports, startups))
+    print(f"{'phase':<10} {'median':>10} {'max':>10}")
+    print(f"{'import':<10} {statistics.median(imports):>8.1f}ms {max(imports):>8.1f}ms")
+    print(f"{'startup':<10} {statistics.median(startups):>8.1f}ms {max(startups):>8.1f}ms")
+    print(f"{'total':<10} {total:>8.1f}ms")
+    if args.max_ms is not None and total > args.max_ms:
+        print(f"startup budget exceeded: {total:.1f}ms > {args.max_ms:.1f}ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
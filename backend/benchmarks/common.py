@@ -0,0 +1,36 @@
+# Helpers shared by the benchmark scripts
+import asyncio
+import subprocess
+import sys
+
+import httpx
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def wait_until_up(base_url: str):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(100):
+            try:
+                await client.get("/plans/")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"server at {base_url} did not start")
+
+def start_server(port: int, env: dict, workers: int = 1) -> subprocess.Popen:
+    """uvicorn serving app.main:app on 127.0.0.1:port, as a child process."""
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+        ],
+        env=env,
+    )
+
+def stop_server(server: subprocess.Popen):
+    server.terminate()
+    server.wait()
@@ -0,0 +1,68 @@
+# Production launcher: gunicorn managing uvicorn workers
+#   cd backend && gunicorn -c gunicorn.conf.py
+# The app is imported once in the master (preload_app) and the workers are forked from it,
+# so the imported code is shared copy-on-write instead of loaded again in every worker.
+# Nothing is connected at import (engines are lazy); the master's own connections (AUTO_CREATE_TABLES)
+# are closed before forking, and each worker drops whatever it inherited right after the fork.
+import glob
+import os
+import sys
+import tempfile
+
+# Every worker's share of DB_CONNECTION_BUDGET depends on how many there are:
+# settle the count before the settings are read
+os.environ.setdefault("WEB_CONCURRENCY", str(os.cpu_count() or 1))
+
+# /metrics must aggregate every worker, not show whichever one a scrape lands on: each worker writes its
+# samples to PROMETHEUS_MULTIPROC_DIR. Set before the app is preloaded (prometheus_client reads it on import),
+# and emptied at startup, since samples left by a previous run would be added in
+if int(os.environ["WEB_CONCURRENCY"]) > 1:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+        for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+            os.remove(path)
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+
+from app.config import get_settings
+
+settings = get_settings()
+
+wsgi_app = "app.main:app"
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = settings.web_concurrency
+bind = os.getenv("BIND", "0.0.0.0:8000")
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", 30))  # a worker silent for this long is restarted
+graceful_timeout = 30  # seconds in-flight requests get on shutdown/reload
+keepalive = 5
+accesslog = "-"
+
+def on_starting(server):
+    # Runs in the master after the preload: DDL once for all workers, then no connection may cross the fork
+    from app.database import connection
+    from app.main import create_schema
+
+    # Plan catalog invalidation, token revocations, Idempotency-Key and read-your-writes all share state
+    # between workers through the cache backend: per-process memory would silently break them
+    if server.num_workers > 1 and settings.cache_backend == "memory":
+        server.log.error(
+            "%d workers with CACHE_BACKEND=memory: set CACHE_BACKEND=redis (or WEB_CONCURRENCY=1)", server.num_workers
+        )
+        sys.exit(1)
+
+    create_schema()
+    connection.reset_engines()
+
+def post_fork(server, worker):
+    # Sockets inherited from the master would be shared by two processes: start from fresh engines
+    from app.database import connection
+
+    connection.reset_engines(close=False)
+
+def child_exit(server, worker):
+    # A dead worker's live gauges must not be reported any more (its counters and histograms stay summed in)
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,35 @@
+def test_pool_metrics_as_admin(client, admin_token):
+    from app.database import connection
+    connection.get_engine() # requests here use the test session, so create the app engine explicitly
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/admin/metrics/pool", headers=headers)
+    assert response.status_code == 200
+    primary = response.json()["primary"]
+    for key in ("pool_size", "checked_out", "overflow", "checkouts", "checkout_wait_avg_ms", "invalidations"):
+        assert key in primary
+
+def test_pool_metrics_forbidden_for_user(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    response = client.get("/admin/metrics/pool", headers=headers)
+    assert response.status_code == 403
+
+def test_pool_stats_count_checkouts():
+    from sqlalchemy import create_engine, text
+    from app.database.pool_stats import InstrumentedQueuePool, get_pool_stats, instrument_engine
+    from tests.conftest import SQLALCHEMY_DATABASE_URL
+
+    eng = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=InstrumentedQueuePool, pool_logging_name="stats-test", pool_size=1)
+    instrument_engine(eng, "stats-test")
+    for _ in range(3):
+        with eng.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    stats = get_pool_stats("stats-test").snapshot(eng.pool)
+    assert stats["checkouts"] == 3
+    assert stats["connects"] == 1 # one physical connection, reused
+    assert stats["checked_out"] == 0
+    assert (stats["overflow"], stats["overflow_peak"]) == (0, 0) # never past pool_size
+
+    # Both connections held: one is beyond pool_size
+    with eng.connect(), eng.connect():
+        assert get_pool_stats("stats-test").snapshot(eng.pool)["overflow"] == 1
+    eng.dispose()
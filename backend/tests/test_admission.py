@@ -0,0 +1,69 @@
+import asyncio
+import dataclasses
+
+import fakeredis
+import pytest
+
+from app.admission import LoginAdmission, LoginThrottledError
+from app.cache_backend import RedisBackend
+from app.config import get_settings
+
+@pytest.fixture
+def login_limits(monkeypatch):
+    """Use small login rate limits: limits(account_burst=2, ...)."""
+    def set_limits(**overrides):
+        settings = dataclasses.replace(get_settings(), **overrides)
+        monkeypatch.setattr("app.admission.get_settings", lambda: settings)
+    return set_limits
+
+def login(client, username="user@test.com", password="testpassword"):
+    return client.post("/auth/login", data={"username": username, "password": password})
+
+def test_account_rate_limit(client, user_token, login_limits):
+    login_limits(login_account_burst=2, login_account_per_minute=1)
+    assert login(client).status_code == 200
+    assert login(client, password="wrong").status_code == 401 # failed attempts use tokens too
+    response = login(client)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Other accounts are not affected
+    client.post("/users/", json={"email": "other@test.com", "name": "Other", "password": "otherpassword"})
+    assert login(client, "other@test.com", "otherpassword").status_code == 200
+
+def test_ip_rate_limit(client, login_limits):
+    login_limits(login_ip_burst=3, login_ip_per_minute=1)
+    statuses = [login(client, f"nobody{i}@test.com").status_code for i in range(4)]
+    assert statuses == [401, 401, 401, 429]
+
+def test_concurrency_cap_queues_then_rejects():
+    async def scenario():
+        admission = LoginAdmission(max_concurrent=1, queue_limit=1, queue_timeout=0.1)
+        async with admission:
+            # The slot is taken: the next login waits, then gives up at the deadline
+            with pytest.raises(LoginThrottledError):
+                async with admission:
+                    pass
+            # Queue full: refused without waiting
+            waiter = asyncio.create_task(admission.__aenter__())
+            await asyncio.sleep(0)
+            with pytest.raises(LoginThrottledError):
+                async with admission:
+                    pass
+            with pytest.raises(LoginThrottledError):
+                await waiter
+        # Slot free again
+        async with admission:
+            assert admission.active == 1
+        return admission.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 3
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+def test_redis_token_bucket():
+    backend = RedisBackend(fakeredis.FakeRedis())
+    assert backend.take_token("login:account:a@test.com", 1, 2) == 0
+    assert backend.take_token("login:account:a@test.com", 1, 2) == 0
+    assert backend.take_token("login:account:a@test.com", 1, 2) > 0
+    assert backend.take_token("login:account:b@test.com", 1, 2) == 0
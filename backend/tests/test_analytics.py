@@ -0,0 +1,73 @@
+# Analytics rollups: kept current by the subscription writes, repaired by the reconciliation job
+from datetime import datetime, timedelta, timezone
+
+from app.crud.analytics import reconcile_rollups
+from app.crud.subscriptions import deactivate_expired_subscriptions
+from app.database.models.subscription import Subscription
+
+def make_user(client, email):
+    client.post("/users/", json={"email": email, "name": "Subscriber", "password": "testpassword"})
+    token = client.post("/auth/login", data={"username": email, "password": "testpassword"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_rollups_follow_subscribe_and_cancel(client, admin_token, user_token, count_queries):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    yearly = client.post("/plans/", json={"name": "Yearly", "price": 120, "duration_months": 12}, headers=admin).json()["id"]
+    monthly = client.post("/plans/", json={"name": "Monthly", "price": 15, "duration_months": 1}, headers=admin).json()["id"]
+
+    sub = client.post("/subscriptions/", json={"plan_id": yearly}, headers={"Authorization": f"Bearer {user_token}"}).json()
+    client.post("/subscriptions/", json={"plan_id": monthly}, headers=make_user(client, "second@test.com"))
+    client.post("/subscriptions/", json={"plan_id": monthly}, headers=make_user(client, "third@test.com"))
+
+    # Cancelling twice only counts once
+    for _ in range(2):
+        assert client.patch(f"/subscriptions/{sub['id']}/cancel", headers=admin).status_code == 200
+
+    with count_queries() as statements:
+        stats = client.get("/analytics/subscriptions", headers=admin).json()
+    assert len(statements) == 1
+    assert stats["active_subscribers"] == 2
+    assert stats["mrr"] == 30.0
+    assert [(p["name"], p["active_subscribers"], p["mrr"]) for p in stats["plans"]] == [("Yearly", 0, 0.0), ("Monthly", 2, 30.0)]
+
+    daily = client.get("/analytics/subscriptions/daily?days=3", headers=admin).json()
+    assert len(daily) == 3
+    assert daily[-1] == {"day": datetime.now(timezone.utc).date().isoformat(), "new_subscriptions": 3, "cancellations": 1}
+    assert daily[0]["new_subscriptions"] == 0
+
+    assert client.get("/analytics/subscriptions", headers={"Authorization": f"Bearer {user_token}"}).status_code == 403
+
+def test_reconciliation_repairs_drift(client, admin_token, user_token, db_session):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    plan_id = client.post("/plans/", json={"name": "Gold", "price": 10, "duration_months": 1}, headers=admin).json()["id"]
+    client.post("/subscriptions/", json={"plan_id": plan_id}, headers={"Authorization": f"Bearer {user_token}"})
+    client.post("/subscriptions/", json={"plan_id": plan_id}, headers=admin)
+
+    # The sweeper keeps the active count right by itself
+    db_session.query(Subscription).filter(Subscription.user_id == 1).update(
+        {Subscription.end_date: datetime.now(timezone.utc) - timedelta(days=1)}
+    )
+    db_session.commit()
+    assert deactivate_expired_subscriptions(db_session)["rows"] == 1
+    assert client.get("/analytics/subscriptions", headers=admin).json()["active_subscribers"] == 1
+    assert reconcile_rollups(db_session) == {"plans_fixed": 0, "days_fixed": 0}
+
+    # A change made around the CRUD layer drifts until the next reconciliation
+    db_session.query(Subscription).delete()
+    db_session.commit()
+    assert client.get("/analytics/subscriptions", headers=admin).json()["active_subscribers"] == 1
+
+    assert reconcile_rollups(db_session) == {"plans_fixed": 1, "days_fixed": 1}
+    assert client.get("/analytics/subscriptions", headers=admin).json()["active_subscribers"] == 0
+    today = client.get("/analytics/subscriptions/daily?days=1", headers=admin).json()[0]
+    assert today["new_subscriptions"] == 0
+
+def test_deleting_a_user_updates_active_counts(client, admin_token, user_token, db_session):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    plan_id = client.post("/plans/", json={"name": "Gold", "price": 10, "duration_months": 1}, headers=admin).json()["id"]
+    client.post("/subscriptions/", json={"plan_id": plan_id}, headers={"Authorization": f"Bearer {user_token}"})
+    assert client.get("/analytics/subscriptions", headers=admin).json()["active_subscribers"] == 1
+
+    client.delete("/users/2")
+    assert client.get("/analytics/subscriptions", headers=admin).json()["active_subscribers"] == 0
+    assert reconcile_rollups(db_session)["plans_fixed"] == 0
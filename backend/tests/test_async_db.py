@@ -0,0 +1,48 @@
+# The same API flow, but with the routes running on an AsyncSession (asyncpg)
+from app.database.models.user import User
+from app.utils import hash_password
+
+def test_async_user_subscription_flow(async_client, db_session):
+    # 1. Admin goes straight into the DB, like the admin_token fixture
+    admin = User(email="admin@test.com", name="Admin User", hashed_password=hash_password("adminpassword"), is_admin=True)
+    db_session.add(admin)
+    db_session.commit()
+    admin_token = async_client.post("/auth/login", data={"username": "admin@test.com", "password": "adminpassword"}).json()["access_token"]
+    plan = async_client.post("/plans/", headers={"Authorization": f"Bearer {admin_token}"}, json={
+        "name": "Async", "price": 5.0, "duration_months": 1
+    }).json()
+
+    # 2. Normal user registers, logs in and subscribes
+    user = async_client.post("/users/", json={"email": "async@test.com", "name": "Async User", "password": "testpassword"})
+    assert user.status_code == 201
+    token = async_client.post("/auth/login", data={"username": "async@test.com", "password": "testpassword"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    sub = async_client.post("/subscriptions/", headers=headers, json={"plan_id": plan["id"]})
+    assert sub.status_code == 200
+    assert sub.json()["plan"]["name"] == "Async"
+
+    # 3. Nested relationships are loaded without touching the event loop
+    response = async_client.get(f"/users/{user.json()['id']}")
+    assert response.status_code == 200
+    assert response.json()["subscriptions"][0]["plan"]["id"] == plan["id"]
+
+    mine = async_client.get("/subscriptions/me", headers=headers)
+    assert [s["id"] for s in mine.json()] == [sub.json()["id"]]
+
+def test_async_duplicate_email(async_client):
+    payload = {"email": "twice@test.com", "name": "Twice", "password": "testpassword"}
+    assert async_client.post("/users/", json=payload).status_code == 201
+    response = async_client.post("/users/", json=payload)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Email already registered"}
+
+def test_async_export_streams(async_client, db_session, seed_subscriptions):
+    admin = User(email="admin@test.com", name="Admin User", hashed_password=hash_password("adminpassword"), is_admin=True)
+    db_session.add(admin)
+    db_session.commit()
+    seed_subscriptions(admin.id, 3)
+    token = async_client.post("/auth/login", data={"username": "admin@test.com", "password": "adminpassword"}).json()["access_token"]
+
+    response = async_client.get("/subscriptions/export", headers={"Authorization": f"Bearer {token}"}, params={"batch_size": 2})
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 3
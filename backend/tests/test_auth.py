@@ -25,4 +25,167 @@ def test_login_user_not_found(client):
 def test_access_protected_route_with_junk_token(client):
     headers = {"Authorization": "Bearer not-a-real-token"}
     response = client.get("/subscriptions/me", headers=headers)
-    assert response.status_code == 401 # Unauthorized
\ No newline at end of file
+    assert response.status_code == 401 # Unauthorized
+
+def test_login_rehashes_outdated_hash(client, db_session):
+    from passlib.hash import bcrypt
+    from app.database.models.user import User
+    from app.config import get_settings
+
+    # A hash made with an older, cheaper cost factor
+    old = User(email="old@test.com", name="Old Hash", hashed_password=bcrypt.using(rounds=4).hash("testpassword"))
+    db_session.add(old)
+    db_session.commit()
+    user_id = old.id
+
+    response = client.post("/auth/login", data={"username": "old@test.com", "password": "testpassword"})
+    assert response.status_code == 200
+
+    # The login stored a new hash with the configured cost
+    assert db_session.get(User, user_id).hashed_password.startswith(f"$2b${get_settings().bcrypt_rounds:02d}$")
+
+def test_hash_executor_refuses_when_queue_full():
+    import asyncio
+    import time
+    import pytest
+    from app.utils import HashingBusyError, HashingExecutor
+
+    executor = HashingExecutor(workers=0, queue_limit=0) # room for exactly one job
+
+    async def two_jobs():
+        first = asyncio.create_task(executor.run(time.sleep, 0.2))
+        await asyncio.sleep(0.05)
+        with pytest.raises(HashingBusyError):
+            await executor.run(time.sleep, 0)
+        await first
+
+    asyncio.run(two_jobs())
+
+def test_login_is_served_while_a_bulk_hash_is_in_flight():
+    import asyncio
+    import time
+    from app.utils import HashingExecutor, hash_password, verify_and_update_password
+
+    executor = HashingExecutor(workers=2, queue_limit=8)
+    stored = hash_password("testpassword")
+
+    async def scenario():
+        # Start both processes first, spawning them is not what is measured
+        await asyncio.gather(executor.run(hash_password, "warmup"), executor.run(hash_password, "warmup"))
+        bulk = asyncio.gather(*(executor.run_bulk(time.sleep, 1) for _ in range(4)))
+        await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        verified, _ = await executor.run(verify_and_update_password, "testpassword", stored)
+        elapsed = time.perf_counter() - start
+        await bulk
+        return verified, elapsed
+
+    try:
+        verified, elapsed = asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+    # Bulk jobs held one process at a time: the login did not wait for a 1s chunk
+    assert verified
+    assert elapsed < 0.9
+
+def test_authenticated_call_served_from_principal_cache(client, user_token, count_queries):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200 # warms the cache
+
+    with count_queries() as statements:
+        response = client.get("/auth/me", headers=headers)
+    assert response.json() == {"email": "user@test.com"}
+    assert statements == []
+
+def test_principal_cache_invalidated_on_email_change(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    me = client.get("/auth/me", headers=headers)
+    assert me.status_code == 200
+
+    user = client.get("/users/1").json()
+    client.put(f"/users/{user['id']}", json={"email": "renamed@test.com"})
+
+    # The token's subject no longer exists, the cached principal must not keep it alive
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+def test_principal_cache_invalidated_on_delete(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200
+
+    client.delete("/users/1")
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+def test_token_claims_skip_the_users_lookup(client, user_token, admin_token, count_queries):
+    from jose import jwt
+    from app.config import get_settings
+
+    settings = get_settings()
+    claims = jwt.decode(user_token, settings.secret_key, algorithms=[settings.algorithm])
+    assert (claims["sub"], claims["adm"], claims["ver"]) == ("user@test.com", False, 0)
+
+    # First request of each user in this worker: only their token version is read (by primary key),
+    # identity and role come from the claims
+    with count_queries() as statements:
+        assert client.get("/auth/me", headers={"Authorization": f"Bearer {user_token}"}).status_code == 200
+        assert client.get("/admin/metrics/cache", headers={"Authorization": f"Bearer {admin_token}"}).status_code == 200
+    assert len(statements) == 2
+    assert all("token_version" in statement and "users.id" in statement for statement in statements)
+
+    # After that, no query at all
+    with count_queries() as statements:
+        assert client.get("/auth/me", headers={"Authorization": f"Bearer {user_token}"}).status_code == 200
+        assert client.get("/admin/metrics/cache", headers={"Authorization": f"Bearer {user_token}"}).status_code == 403
+    assert statements == []
+
+def test_email_change_revokes_tokens_until_next_login(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    client.put("/users/1", json={"email": "renamed@test.com"})
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+    # A fresh login carries the new version
+    token = client.post("/auth/login", data={"username": "renamed@test.com", "password": "testpassword"}).json()["access_token"]
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {token}"}).json() == {"email": "renamed@test.com"}
+
+    # A name change doesn't log anybody out
+    client.put("/users/1", json={"name": "Still Me"})
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+def test_revocation_by_another_worker(client, user_token):
+    from app.cache import TokenRevocations, handle_invalidation
+    from app.cache_backend import get_cache_backend
+
+    headers = {"Authorization": f"Bearer {user_token}"}
+    assert client.get("/auth/me", headers=headers).status_code == 200 # "not revoked" now cached here
+
+    # Another worker revoked user 1: shared tier updated, invalidation broadcast
+    get_cache_backend().set(f"{TokenRevocations.prefix}1", b"1", 60)
+    handle_invalidation(f"{TokenRevocations.prefix}1")
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+def test_revocation_survives_an_empty_shared_tier(client, user_token, db_session):
+    from app.cache import TokenRevocations, get_token_revocations
+    from app.cache_backend import set_cache_backend
+    from app.crud.users import get_token_version
+
+    headers = {"Authorization": f"Bearer {user_token}"}
+    client.put("/users/1", json={"email": "moved@test.com"}) # revoked in this worker and the shared tier
+
+    # Another worker: its own memory backend (CACHE_BACKEND=memory) and nothing cached locally
+    set_cache_backend(None)
+    other_worker = TokenRevocations(maxsize=10, ttl=60)
+    assert get_token_version(db_session, 1, revocations=other_worker) == 1
+    get_token_revocations().clear()
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+    # Deleted users have no version to compare with: every token is refused
+    client.delete("/users/1")
+    set_cache_backend(None)
+    get_token_revocations().clear()
+    assert get_token_version(db_session, 1, revocations=TokenRevocations(maxsize=10, ttl=60)) == float("inf")
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+def test_tokens_without_claims_still_accepted(client, user_token):
+    from app.routes.auth import create_access_token
+
+    legacy = create_access_token(data={"sub": "user@test.com"})
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {legacy}"}).json() == {"email": "user@test.com"}
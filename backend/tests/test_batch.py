@@ -0,0 +1,60 @@
+# Batch lookups: many ids, one request and one query, results keyed by id
+def create_plans(client, admin_token, count):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    return [
+        client.post("/plans/", json={"name": f"Plan {i}", "price": 10 + i, "duration_months": 1}, headers=headers).json()["id"]
+        for i in range(count)
+    ]
+
+def test_plans_batch(client, admin_token):
+    plan_ids = create_plans(client, admin_token, 3)
+    response = client.get(f"/plans/batch?ids={plan_ids[2]},{plan_ids[0]},999")
+    assert response.status_code == 200
+    body = response.json()
+    assert sorted(body["items"]) == sorted(str(plan_id) for plan_id in (plan_ids[0], plan_ids[2]))
+    assert body["items"][str(plan_ids[0])] == client.get(f"/plans/{plan_ids[0]}").json()
+    assert body["missing"] == [999]
+
+def test_subscriptions_batch_checks_each_item(client, admin_token, user_token, count_queries):
+    plan_id = create_plans(client, admin_token, 1)[0]
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    user = {"Authorization": f"Bearer {user_token}"}
+    mine = client.post("/subscriptions/", json={"plan_id": plan_id}, headers=user).json()["id"]
+    theirs = client.post("/subscriptions/", json={"plan_id": plan_id}, headers=admin).json()["id"]
+    ids = f"{mine},{theirs},999"
+
+    with count_queries() as statements:
+        body = client.get(f"/subscriptions/batch?ids={ids}", headers=user).json()
+    assert len(statements) == 1
+    assert list(body["items"]) == [str(mine)]
+    assert body["items"][str(mine)] == client.get(f"/subscriptions/{mine}", headers=user).json()
+    assert body["forbidden"] == [theirs]
+    assert body["missing"] == [999]
+
+    # Admins see everything
+    body = client.get(f"/subscriptions/batch?ids={ids}", headers=admin).json()
+    assert sorted(body["items"]) == sorted([str(mine), str(theirs)])
+    assert body["forbidden"] == []
+
+    assert client.get(f"/subscriptions/batch?ids={ids}").status_code == 401
+
+def test_users_batch(client, admin_token, user_token, count_queries):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    client.get("/auth/me", headers=admin) # load the admin's token version first
+    with count_queries() as statements:
+        body = client.get("/users/batch?ids=1,2,2,999", headers=admin).json()
+    assert len(statements) == 2 # the users, then their subscriptions (selectinload)
+    assert body["items"]["2"] == client.get("/users/2").json()
+    assert sorted(body["items"]) == ["1", "2"]
+    assert body["missing"] == [999]
+
+    # Other callers only get themselves (the admin was created first: id 1, the user is 2)
+    body = client.get("/users/batch?ids=1,2", headers={"Authorization": f"Bearer {user_token}"}).json()
+    assert list(body["items"]) == ["2"]
+    assert body["forbidden"] == [1]
+
+def test_batch_ids_are_validated(client):
+    assert client.get("/plans/batch?ids=1,x").status_code == 422
+    assert client.get("/plans/batch?ids=").status_code == 422
+    assert client.get("/plans/batch?ids=" + ",".join(map(str, range(101)))).status_code == 422
+    assert client.get("/plans/batch").status_code == 422
@@ -0,0 +1,163 @@
+import time
+
+import fakeredis
+import pytest
+
+from app.cache import get_plan_catalog_cache, get_principal_cache, handle_invalidation
+from app.cache_backend import INVALIDATION_CHANNEL, RedisBackend, set_cache_backend
+from app.database.schemas.user import Principal
+
+@pytest.fixture
+def redis_server(db_session):
+    """Every test client shares one fake Redis server, like workers sharing one Redis."""
+    server = fakeredis.FakeServer()
+    backend = RedisBackend(fakeredis.FakeRedis(server=server))
+    set_cache_backend(backend)
+    yield server
+    backend.close()
+    set_cache_backend(None)
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+def test_plan_catalog_served_from_shared_tier(redis_server, client, admin_token, count_queries):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/plans/", json={"name": "Basic", "price": 9.99, "duration_months": 1}, headers=headers)
+    first = client.get("/plans/")
+
+    # A worker that hasn't loaded the catalog yet gets it from Redis, not from the database
+    get_plan_catalog_cache().drop_local()
+    with count_queries() as statements:
+        second = client.get("/plans/")
+    assert statements == []
+    assert second.headers["etag"] == first.headers["etag"]
+
+    stats = client.get("/admin/metrics/cache", headers=headers).json()
+    assert stats["shared"]["backend"] == "redis"
+    assert stats["shared"]["hits"] >= 1
+    assert stats["plan_catalog"]["misses"] >= 1
+
+def test_catalog_loaded_before_a_write_is_not_shared(redis_server, db_session, monkeypatch):
+    from app.cache import PlanCatalogCache
+    from app.crud import plans as plan_crud
+    from app.database.models import Plan
+    from app.database.schemas.plan import Plan as PlanSchema
+
+    db_session.add(Plan(name="Old", price=1, duration_months=1))
+    db_session.commit()
+    other_worker = PlanCatalogCache(ttl=30)
+    load = plan_crud.get_plans
+
+    def load_then_write(db):
+        plans = [PlanSchema.model_validate(plan) for plan in load(db)] # what was read, not live ORM objects
+        # Another worker renames the plan and invalidates after this one read the plans, before it stores
+        # the catalog, and its pub/sub message hasn't arrived here yet
+        db.query(Plan).update({"name": "New"})
+        db.commit()
+        other_worker.invalidate()
+        return plans
+
+    monkeypatch.setattr(plan_crud, "get_plans", load_then_write)
+    assert b"Old" in plan_crud.get_plan_catalog(db_session).body
+    monkeypatch.undo()
+
+    # A worker without a local copy must not be handed the stale catalog by the shared tier
+    get_plan_catalog_cache().drop_local()
+    assert b"New" in plan_crud.get_plan_catalog(db_session).body
+
+def test_plan_write_publishes_invalidation(redis_server, client, admin_token):
+    listener = fakeredis.FakeRedis(server=redis_server).pubsub(ignore_subscribe_messages=True)
+    listener.subscribe(INVALIDATION_CHANNEL)
+    client.post("/plans/", json={"name": "Basic", "price": 9.99, "duration_months": 1},
+                headers={"Authorization": f"Bearer {admin_token}"})
+
+    def received():
+        message = listener.get_message()
+        return message is not None and message["data"] == b"plans:catalog"
+    assert wait_for(received)
+
+def test_invalidation_from_another_worker_drops_local_copy(redis_server, client):
+    # client started the app, so this process listens to the invalidation channel
+    principal = Principal(id=1, email="someone@test.com", name="Someone", is_active=True, is_admin=False)
+    principal_cache = get_principal_cache()
+    principal_cache.local.set(principal.email, principal)
+
+    other_worker = fakeredis.FakeRedis(server=redis_server)
+    other_worker.publish(INVALIDATION_CHANNEL, "principal:someone@test.com")
+    assert wait_for(lambda: principal_cache.get_local(principal.email) is None)
+
+def test_redis_errors_count_as_misses():
+    class BrokenRedis:
+        def get(self, key):
+            raise ConnectionError("redis is down")
+
+        def register_script(self, script):
+            def run(keys, args):
+                raise ConnectionError("redis is down")
+            return run
+
+    backend = RedisBackend(BrokenRedis())
+    assert backend.get("principal:x") is None
+    assert backend.stats()["errors"] == 1
+    assert backend.stats()["misses"] == 1
+    # Rate limiting fails open
+    assert backend.take_token("login:ip:1.2.3.4", 1, 1) == 0
+
+def test_handle_invalidation_drops_plan_catalog():
+    plan_catalog = get_plan_catalog_cache()
+    version = plan_catalog.version
+    handle_invalidation("plans:catalog")
+    assert plan_catalog.version == version + 1
+
+def test_listener_survives_redis_outages(db_session):
+    server = fakeredis.FakeServer()
+    server.connected = False # Redis down when the worker boots
+    backend = RedisBackend(fakeredis.FakeRedis(server=server))
+    backend.retry_delay = backend.max_retry_delay = 0.05
+    received, subscribed = [], []
+    backend.subscribe(received.append, on_subscribe=lambda: subscribed.append(True)) # doesn't raise
+    try:
+        assert wait_for(lambda: backend.errors >= 1)
+        assert subscribed == []
+
+        server.connected = True
+        assert wait_for(lambda: len(subscribed) == 1)
+        publisher = fakeredis.FakeRedis(server=server)
+        publisher.publish(INVALIDATION_CHANNEL, "plans:catalog")
+        assert wait_for(lambda: received == ["plans:catalog"])
+
+        # The connection drops: the listener subscribes again (and local caches are dropped again)
+        server.connected = False
+        assert wait_for(lambda: backend.errors >= 2)
+        server.connected = True
+        assert wait_for(lambda: len(subscribed) == 2)
+        publisher.publish(INVALIDATION_CHANNEL, "principal:x")
+        assert wait_for(lambda: received[-1:] == ["principal:x"])
+    finally:
+        backend.close()
+
+def test_resubscribe_drops_local_copies(redis_server, client, admin_token):
+    from app.cache import drop_local_caches
+
+    client.post("/plans/", json={"name": "Basic", "price": 9.99, "duration_months": 1},
+                headers={"Authorization": f"Bearer {admin_token}"})
+    client.get("/plans/")
+    plan_catalog = get_plan_catalog_cache()
+    assert plan_catalog.get() is not None
+    drop_local_caches()
+    assert plan_catalog.get() is None
+
+def test_local_plan_catalog_expires(client, admin_token, env):
+    client.post("/plans/", json={"name": "Basic", "price": 9.99, "duration_months": 1},
+                headers={"Authorization": f"Bearer {admin_token}"})
+    env(PLAN_CATALOG_LOCAL_TTL="0.05")
+    client.get("/plans/")
+    plan_catalog = get_plan_catalog_cache()
+    assert plan_catalog.get() is not None
+    time.sleep(0.1)
+    assert plan_catalog.get() is None # an invalidation may have been missed: reload
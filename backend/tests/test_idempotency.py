@@ -0,0 +1,73 @@
+# Idempotency-Key: retries get the first response back instead of running (and failing) again
+import json
+import threading
+
+from app.cache_backend import get_cache_backend
+from app.idempotency import fingerprint
+from app.database.schemas.subscription import SubscriptionCreate
+
+NEW_USER = {"email": "retry@test.com", "name": "Retry", "password": "testpassword"}
+
+def test_retried_registration_is_replayed(client, count_queries):
+    headers = {"Idempotency-Key": "signup-1"}
+    first = client.post("/users/", json=NEW_USER, headers=headers)
+    assert first.status_code == 201
+
+    # No email check, no bcrypt, no insert: the stored response comes straight back
+    with count_queries() as statements:
+        retry = client.post("/users/", json=NEW_USER, headers=headers)
+    assert statements == []
+    assert retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+
+    # Without the key it is a new request, and the email is taken by now
+    assert client.post("/users/", json=NEW_USER).status_code == 400
+
+def test_key_reused_with_another_body_is_refused(client):
+    headers = {"Idempotency-Key": "signup-2"}
+    client.post("/users/", json=NEW_USER, headers=headers)
+    other = client.post("/users/", json={**NEW_USER, "name": "Someone Else"}, headers=headers)
+    assert other.status_code == 422
+
+def test_unrelated_signups_with_the_same_key_dont_collide(client):
+    # Two clients that happen to pick the same key (a counter, a UUID reused by a buggy SDK)
+    headers = {"Idempotency-Key": "1"}
+    first = client.post("/users/", json=NEW_USER, headers=headers)
+    second = client.post("/users/", json={**NEW_USER, "email": "other@test.com", "name": "Other"}, headers=headers)
+    assert (first.status_code, second.status_code) == (201, 201)
+    assert second.json()["email"] == "other@test.com"
+    assert "idempotent-replayed" not in second.headers
+
+def test_retried_subscription_gets_the_first_response(client, admin_token, user_token):
+    plan_id = client.post(
+        "/plans/", json={"name": "Gold", "price": 10, "duration_months": 1}, headers={"Authorization": f"Bearer {admin_token}"}
+    ).json()["id"]
+    headers = {"Authorization": f"Bearer {user_token}", "Idempotency-Key": "sub-1"}
+    first = client.post("/subscriptions/", json={"plan_id": plan_id}, headers=headers)
+    retry = client.post("/subscriptions/", json={"plan_id": plan_id}, headers=headers)
+    assert first.status_code == retry.status_code == 200 # not 400 "already has an active subscription"
+    assert retry.json()["id"] == first.json()["id"]
+
+    # Keys are per caller: the admin's "sub-1" is a different request
+    admin_headers = {"Authorization": f"Bearer {admin_token}", "Idempotency-Key": "sub-1"}
+    assert client.post("/subscriptions/", json={"plan_id": plan_id}, headers=admin_headers).json()["user_id"] == 1
+
+def test_concurrent_duplicate_waits_for_the_first(client, user_token):
+    # The first request (user 1, key "sub-2") is still running: its pending marker holds the key
+    backend = get_cache_backend()
+    key = "idem:subscriptions:1:sub-2"
+    fp = fingerprint(SubscriptionCreate(plan_id=7))
+    backend.set(key, json.dumps({"state": "pending", "fp": fp}).encode(), 30)
+
+    def first_request_finishes():
+        done = {"state": "done", "fp": fp, "status": 200, "body": json.dumps({"id": 42})}
+        backend.set(key, json.dumps(done).encode(), 60)
+
+    timer = threading.Timer(0.3, first_request_finishes)
+    timer.start()
+    headers = {"Authorization": f"Bearer {user_token}", "Idempotency-Key": "sub-2"}
+    response = client.post("/subscriptions/", json={"plan_id": 7}, headers=headers)
+    timer.join()
+    assert response.status_code == 200
+    assert response.json() == {"id": 42}
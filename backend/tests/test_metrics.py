@@ -0,0 +1,29 @@
+import re
+
+def server_timing(response) -> dict:
+    header = response.headers["server-timing"]
+    return {
+        "app_ms": float(re.search(r"app;dur=([\d.]+)", header).group(1)),
+        "db_ms": float(re.search(r"db;dur=([\d.]+)", header).group(1)),
+        "queries": int(re.search(r'desc="(\d+) queries"', header).group(1)),
+    }
+
+def test_server_timing_counts_queries(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    client.get("/auth/me", headers=headers) # the token version is now known to this worker
+    timing = server_timing(client.get("/subscriptions/me", headers=headers))
+    assert timing["queries"] == 1 # subscriptions, the caller comes from the token
+    assert timing["app_ms"] >= timing["db_ms"] > 0
+
+def test_prometheus_histograms_use_route_template(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    client.get("/subscriptions/12345", headers=headers)
+
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/subscriptions/{sub_id}",status="404"}' in body
+    assert 'http_request_db_queries_bucket{le="1.0",method="GET",route="/subscriptions/{sub_id}"}' in body
+    assert "/subscriptions/12345" not in body
+
+def test_unmatched_routes_share_a_label(client):
+    client.get("/no/such/path/123")
+    assert 'route="unmatched"' in client.get("/metrics").text
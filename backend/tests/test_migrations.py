@@ -0,0 +1,50 @@
+# The Alembic history must build exactly the schema the models describe
+import os
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.migration import MigrationContext
+from sqlalchemy import text
+
+from app.database.connection import Base
+from tests.conftest import SQLALCHEMY_DATABASE_URL, engine
+
+def alembic_config():
+    cfg = Config(os.path.join(os.path.dirname(__file__), "..", "alembic.ini"))
+    cfg.set_main_option("sqlalchemy.url", SQLALCHEMY_DATABASE_URL)
+    return cfg
+
+def test_migrations_match_models():
+    cfg = alembic_config()
+    Base.metadata.drop_all(bind=engine)
+    try:
+        command.upgrade(cfg, "head")
+        with engine.connect() as conn:
+            diff = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+        assert diff == []
+        command.downgrade(cfg, "base")
+    finally:
+        Base.metadata.drop_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+
+def test_one_active_subscription_enforced_by_db(db_session):
+    import pytest
+    from sqlalchemy.exc import IntegrityError
+    from app.database.models import Plan, Subscription, User
+
+    user = User(email="race@test.com", name="Race", hashed_password="...")
+    plan = Plan(name="Race", price=1, duration_months=1)
+    db_session.add_all([user, plan])
+    db_session.flush()
+    # Inactive history is fine, a second active row is not
+    db_session.add_all([
+        Subscription(user_id=user.id, plan_id=plan.id, is_active=False),
+        Subscription(user_id=user.id, plan_id=plan.id, is_active=True),
+    ])
+    db_session.commit()
+    db_session.add(Subscription(user_id=user.id, plan_id=plan.id, is_active=True))
+    with pytest.raises(IntegrityError):
+        db_session.commit()
+    db_session.rollback()
@@ -94,4 +94,39 @@ def test_delete_plan_success(client, admin_token):
 def test_admin_get_plans_list(client, admin_token):
     headers = {"Authorization": f"Bearer {admin_token}"}
     response = client.get("/plans/", headers=headers)
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+# --- CONDITIONAL GET TESTS ---
+def test_plans_etag_and_not_modified(client, admin_token, count_queries):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.post("/plans/", headers=headers, json={"name": "Cached", "price": 3.0, "duration_months": 1})
+
+    first = client.get("/plans/")
+    assert first.status_code == 200
+    assert first.json()[0]["name"] == "Cached"
+    assert "max-age" in first.headers["cache-control"]
+    etag = first.headers["etag"]
+
+    # Revalidation is answered from memory
+    with count_queries() as statements:
+        again = client.get("/plans/", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert statements == []
+
+def test_plan_write_changes_etag(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    plan = client.post("/plans/", headers=headers, json={"name": "Before", "price": 3.0, "duration_months": 1}).json()
+    list_etag = client.get("/plans/").headers["etag"]
+    item = client.get(f"/plans/{plan['id']}")
+    assert item.json()["name"] == "Before"
+
+    client.put(f"/plans/{plan['id']}", headers=headers, json={"name": "After"})
+
+    # Old tags no longer match, clients get the new body
+    response = client.get("/plans/", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+    assert response.json()[0]["name"] == "After"
+    response = client.get(f"/plans/{plan['id']}", headers={"If-None-Match": item.headers["etag"]})
+    assert response.status_code == 200
+    assert response.json()["name"] == "After"
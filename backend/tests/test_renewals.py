@@ -0,0 +1,82 @@
+# Renewal engine: chunked set-based renewals with a resumable checkpoint
+from datetime import datetime, timedelta, timezone
+
+from app.crud.renewals import run_renewals
+from app.database.models import Plan, RenewalRun, Subscription, User
+
+def seed(db_session, now):
+    """Seven subscribers: five due (one on a yearly plan), one not due yet, one on a retired plan."""
+    monthly = Plan(name="Monthly", price=10, duration_months=1)
+    yearly = Plan(name="Yearly", price=100, duration_months=12)
+    retired = Plan(name="Retired", price=5, duration_months=1, is_active=False)
+    db_session.add_all([monthly, yearly, retired])
+    db_session.flush()
+    plans = [monthly, monthly, monthly, monthly, yearly, monthly, retired]
+    ends = [now - timedelta(hours=h) for h in (1, 2, 3, 4, 5)] + [now + timedelta(days=10), now - timedelta(hours=1)]
+    subs = []
+    for i, (plan, end) in enumerate(zip(plans, ends)):
+        user = User(email=f"renew{i}@test.com", name="Renew", hashed_password="...")
+        db_session.add(user)
+        db_session.flush()
+        subs.append(Subscription(user_id=user.id, plan_id=plan.id, end_date=end, is_active=True))
+    db_session.add_all(subs)
+    db_session.commit()
+    return {sub.id: sub.end_date for sub in subs}
+
+def end_dates(db_session):
+    db_session.expire_all()
+    return {sub.id: sub.end_date for sub in db_session.query(Subscription)}
+
+def test_renewal_extends_by_the_plan_duration(db_session, count_queries):
+    now = datetime.now(timezone.utc)
+    before = seed(db_session, now)
+
+    with count_queries() as statements:
+        report = run_renewals(db_session, batch_size=10, cutoff=now)
+    assert report["rows"] == 5
+    assert report["finished"] is True
+    # Open the run, then per chunk: lock the run, one UPDATE ... FROM plans, save the checkpoint
+    assert sum(s.lstrip().upper().startswith(("UPDATE", "WITH")) for s in statements) == 2
+
+    after = end_dates(db_session)
+    ids = sorted(before)
+    for sub_id in ids[:4]:
+        assert after[sub_id].month == (before[sub_id].month % 12) + 1
+    assert after[ids[4]].year == before[ids[4]].year + 1
+    # Not due yet, and retired plans aren't renewed
+    assert after[ids[5]] == before[ids[5]]
+    assert after[ids[6]] == before[ids[6]]
+
+    # A new run with the same cutoff finds nothing left
+    assert run_renewals(db_session, cutoff=now)["rows"] == 0
+
+def test_interrupted_run_resumes_from_its_checkpoint(db_session):
+    now = datetime.now(timezone.utc)
+    before = seed(db_session, now)
+
+    first = run_renewals(db_session, batch_size=2, cutoff=now, max_batches=1)
+    assert (first["rows"], first["finished"]) == (2, False)
+    run = db_session.get(RenewalRun, first["run_id"])
+    assert (run.renewed, run.last_subscription_id, run.finished_at) == (2, sorted(before)[1], None)
+
+    # The next call picks the open run up (its cutoff, not the new one) and renews each subscription once
+    rest = run_renewals(db_session, batch_size=2, cutoff=now + timedelta(days=30))
+    assert rest["run_id"] == first["run_id"]
+    assert (rest["rows"], rest["finished"]) == (3, True)
+    db_session.refresh(run)
+    assert (run.renewed, run.batches) == (5, 3)
+    assert run.finished_at is not None
+
+    after = end_dates(db_session)
+    assert sum(after[sub_id] != before[sub_id] for sub_id in before) == 5
+
+def test_renewal_task_renews_ahead_of_the_end_date(db_session):
+    from app.database import connection
+    from app.worker import renew_subscriptions
+
+    now = datetime.now(timezone.utc)
+    before = seed(db_session, now + timedelta(hours=6)) # not ended yet, but within RENEWAL_LEAD (a day)
+    report = renew_subscriptions()
+    connection.reset_engines()
+    assert (report["rows"], report["finished"]) == (5, True)
+    assert end_dates(db_session) != before
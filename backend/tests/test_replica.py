@@ -0,0 +1,72 @@
+# Read replica routing: GET endpoints read from the replica, unless the caller just wrote or the replica is unhealthy
+# The "replica" here is a second, empty database: whatever a read returns tells which one served it
+import pytest
+from sqlalchemy import create_engine, make_url, text
+
+from app.database import connection
+from app.database.connection import Base, get_read_db
+from app.database.replica import RecentWriters, ReplicaHealth, caller_key
+from app.cache_backend import get_cache_backend
+from tests.conftest import SQLALCHEMY_DATABASE_URL
+
+PRIMARY_URL = make_url(SQLALCHEMY_DATABASE_URL)
+REPLICA_URL = PRIMARY_URL.set(database=f"{PRIMARY_URL.database}_replica")
+
+def create_replica_database():
+    admin = create_engine(PRIMARY_URL.set(database="postgres"), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        if not conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": REPLICA_URL.database}).scalar():
+            conn.execute(text(f'CREATE DATABASE "{REPLICA_URL.database}"'))
+    admin.dispose()
+
+@pytest.fixture
+def replica(client, env):
+    create_replica_database()
+    engine = create_engine(REPLICA_URL)
+    Base.metadata.create_all(bind=engine)
+    # Real routing: reads use get_read_db itself, not the test session
+    client.app.dependency_overrides.pop(get_read_db)
+    connection._read_engine = engine
+    env(REPLICA_MAX_LAG="5", REPLICA_CHECK_INTERVAL="5")
+    yield engine
+    connection._read_engine = None
+    Base.metadata.drop_all(bind=engine)
+    engine.dispose()
+
+def emails(response):
+    assert response.status_code == 200
+    return [user["email"] for user in response.json()]
+
+def test_reads_stick_to_the_primary_after_a_write(client, admin_token, replica):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    # Nothing written by this caller yet: the (empty) replica answers
+    assert emails(client.get("/users/", headers=admin)) == []
+
+    # A write marks the caller, their next read sees it on the primary
+    assert client.post("/plans/", json={"name": "Gold", "price": 10, "duration_months": 1}, headers=admin).status_code == 200
+    assert emails(client.get("/users/", headers=admin)) == ["admin@test.com"]
+
+    # A refused write changes nothing and doesn't count
+    get_cache_backend().delete(RecentWriters.prefix + caller_key(admin["Authorization"]))
+    assert client.post("/plans/", json={"name": "Gold"}, headers=admin).status_code == 422
+    assert emails(client.get("/users/", headers=admin)) == []
+
+def test_unhealthy_replica_falls_back_to_the_primary(client, admin_token, replica):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    connection._read_engine = create_engine(REPLICA_URL.set(database="no_such_replica"), connect_args={"connect_timeout": 1})
+    assert emails(client.get("/users/", headers=admin)) == ["admin@test.com"]
+
+    metrics = client.get("/admin/metrics/replica", headers=admin).json()
+    assert metrics["configured"] is True
+    assert metrics["healthy"] is False
+    assert metrics["failed_checks"] == 1
+    connection._read_engine.dispose()
+
+def test_lagging_replica_is_unhealthy(replica):
+    assert ReplicaHealth(max_lag=5, check_interval=0).check(replica) is True
+    assert ReplicaHealth(max_lag=-1, check_interval=0).check(replica) is False
+
+    # A standby whose WAL receiver stopped streaming reports infinite lag
+    broken = ReplicaHealth(max_lag=5, check_interval=0)
+    broken._record(float("inf"))
+    assert broken.stats() == {"healthy": False, "lag_seconds": None, "failed_checks": 0}
@@ -0,0 +1,46 @@
+# List endpoints skip Pydantic and write ORM rows straight to JSON: the output must still match the schemas
+from datetime import datetime, timezone
+
+from pydantic import TypeAdapter
+
+from app.crud import users as user_crud
+from app.database.schemas.plan import Plan
+from app.database.schemas.subscription import Subscription
+from app.database.schemas.user import User
+from app.serialization import dump_rows
+
+def test_list_output_matches_the_schema(client, admin_token, user_token, db_session):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    plan_id = client.post("/plans/", json={"name": "Gold", "price": 20, "duration_months": 1}, headers=admin).json()["id"]
+    client.post("/subscriptions/", json={"plan_id": plan_id}, headers=admin)
+    client.post("/subscriptions/", json={"plan_id": plan_id}, headers={"Authorization": f"Bearer {user_token}"})
+
+    response = client.get("/users/", headers=admin)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+
+    # Same document as FastAPI's own response_model path would have produced
+    adapter = TypeAdapter(list[User])
+    expected = adapter.validate_python(user_crud.get_users(db_session), from_attributes=True)
+    assert adapter.validate_json(response.content) == expected
+    assert response.json() == adapter.dump_python(expected, mode="json")
+    assert response.json()[0]["subscriptions"][0]["plan"]["price"] == 20.0
+
+    mine = client.get("/subscriptions/me", headers={"Authorization": f"Bearer {user_token}"}).json()
+    assert [sub["plan"]["name"] for sub in mine] == ["Gold"]
+    assert mine[0]["start_date"].endswith("Z")
+
+class Row:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+def test_rows_sharing_a_nested_object():
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    plan = Row(id=1, name="Gold", price=9.5, description=None, duration_months=1, is_active=True, created_at=now, updated_at=now)
+    rows = [Row(id=i, user_id=7, plan_id=1, start_date=now, end_date=None, is_active=True, plan=plan) for i in range(3)]
+
+    body = dump_rows(Subscription, rows)
+    parsed = TypeAdapter(list[Subscription]).validate_json(body)
+    assert [sub.id for sub in parsed] == [0, 1, 2]
+    assert parsed[0].plan == Plan(id=1, name="Gold", price=9.5, duration_months=1, is_active=True, created_at=now, updated_at=now)
+    assert b'"2026-01-01T00:00:00Z"' in body
@@ -0,0 +1,10 @@
+import os
+import subprocess
+import sys
+
+# Importing the app must not connect to the database: DATABASE_URL points at an unroutable address here
+def test_import_does_not_touch_the_database():
+    code = "import app.main, app.database.connection as c; assert c.get_engines() == {}"
+    env = {**os.environ, "DATABASE_URL": "postgresql://nobody@203.0.113.1:5432/none"}
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
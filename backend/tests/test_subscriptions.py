@@ -1,3 +1,14 @@
+import csv
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.crud.subscriptions import deactivate_expired_subscriptions
+from app.database.models.plan import Plan
+from app.database.models.subscription import Subscription
+from app.database.models.user import User
+
 # Testing data logic (1 month/12-month calculations)
 
 def test_subscription_duration_logic(client, admin_token, user_token):
@@ -20,7 +31,6 @@ def test_subscription_duration_logic(client, admin_token, user_token):
     data = sub_res.json()
 
     #3. Verify math: end_date should be ~90 days after start_date
-    from datetime import datetime
     start = datetime.fromisoformat(data["start_date"].replace("Z", "+00:00"))
     end = datetime.fromisoformat(data["end_date"].replace("Z", "+00:00"))
     diff_days = (end - start).days
@@ -68,8 +78,6 @@ def test_prevent_duplicate_active_subscription(client, admin_token, user_token):
     assert "already has an active subscription" in response.json()["detail"]
 
 def test_user_forbidden_from_viewing_others_sub(client, user_token, db_session, admin_token):
-    from app.database.models.subscription import Subscription
-    
     # 1. We need a valid Plan ID first (using admin_token to create it)
     headers_a = {"Authorization": f"Bearer {admin_token}"}
     plan = client.post("/plans/", headers=headers_a, json={
@@ -77,7 +85,6 @@ def test_user_forbidden_from_viewing_others_sub(client, user_token, db_session,
     }).json()
 
     # 2. Create another user manually to be the 'victim'
-    from app.database.models.user import User
     victim = User(email="victim@test.com", name="Victim", hashed_password="...", is_admin=False)
     db_session.add(victim)
     db_session.commit()
@@ -98,4 +105,112 @@ def test_user_forbidden_from_viewing_others_sub(client, user_token, db_session,
 def test_admin_read_all_subscriptions(client, admin_token):
     headers = {"Authorization": f"Bearer {admin_token}"}
     response = client.get("/subscriptions/all", headers=headers)
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+# --- QUERY COUNT TESTS (no N+1 on nested plan/subscription responses) ---
+@pytest.mark.parametrize("rows", [1, 10])
+def test_my_subscriptions_query_count(client, user_token, seed_subscriptions, count_queries, rows):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    client.get("/auth/me", headers=headers) # resolve the principal first
+    seed_subscriptions(1, rows)
+
+    with count_queries() as statements:
+        response = client.get("/subscriptions/me", headers=headers)
+    assert len(response.json()) == rows
+    assert all(s["plan"] is not None for s in response.json())
+    assert len(statements) == 1
+
+@pytest.mark.parametrize("rows", [1, 10])
+def test_all_subscriptions_query_count(client, admin_token, seed_subscriptions, count_queries, rows):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    client.get("/auth/me", headers=headers)
+    seed_subscriptions(1, rows)
+
+    with count_queries() as statements:
+        response = client.get("/subscriptions/all", headers=headers)
+    assert len(response.json()) == rows
+    assert len(statements) == 1
+
+
+# --- KEYSET PAGINATION TESTS ---
+def test_all_subscriptions_cursor_pages(client, admin_token, seed_subscriptions):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    seed_subscriptions(1, 5)
+
+    seen, cursor = [], None
+    for _ in range(3):
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/subscriptions/all", headers=headers, params=params)
+        assert response.status_code == 200
+        seen += [s["id"] for s in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+    assert seen == sorted(seen) and len(seen) == 5
+    assert cursor is None # last page
+
+def test_all_subscriptions_filters(client, admin_token, seed_subscriptions):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    seed_subscriptions(1, 3) # only the last one is active
+
+    active = client.get("/subscriptions/all", headers=headers, params={"is_active": True}).json()
+    assert len(active) == 1
+    by_plan = client.get("/subscriptions/all", headers=headers, params={"plan_id": active[0]["plan_id"]}).json()
+    assert [s["id"] for s in by_plan] == [active[0]["id"]]
+
+def test_all_subscriptions_bad_cursor(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.get("/subscriptions/all", headers=headers, params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+# --- STREAMING EXPORT TESTS ---
+def test_export_ndjson(client, admin_token, seed_subscriptions):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    seed_subscriptions(1, 5)
+
+    response = client.get("/subscriptions/export", headers=headers, params={"batch_size": 2})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["id"] for r in rows] == sorted(r["id"] for r in rows)
+    assert len(rows) == 5
+    assert rows[0]["user_email"] == "admin@test.com"
+    assert rows[0]["plan_name"] == "Seed plan 1-0"
+
+def test_export_csv(client, admin_token, seed_subscriptions):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    seed_subscriptions(1, 3)
+
+    response = client.get("/subscriptions/export", headers=headers, params={"format": "csv"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(response.text.splitlines()))
+    assert len(rows) == 3
+    assert rows[-1]["is_active"] == "True"
+
+def test_export_forbidden_for_user(client, user_token):
+    response = client.get("/subscriptions/export", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+
+# --- EXPIRY SWEEPER TESTS ---
+def test_sweeper_deactivates_only_expired(db_session):
+    now = datetime.now(timezone.utc)
+    plan = Plan(name="Sweep", price=1, duration_months=1)
+    db_session.add(plan)
+    db_session.flush()
+    ends = [now - timedelta(days=d) for d in (1, 2, 3, 4, 5)] + [now + timedelta(days=1), None]
+    for i, end in enumerate(ends):
+        user = User(email=f"sweep{i}@test.com", name="Sweep", hashed_password="...")
+        db_session.add(user)
+        db_session.flush()
+        db_session.add(Subscription(user_id=user.id, plan_id=plan.id, end_date=end, is_active=True))
+    db_session.commit()
+
+    report = deactivate_expired_subscriptions(db_session, batch_size=2)
+    assert report["rows"] == 5
+    assert report["batches"] == 3 # 2 + 2 + 1
+    # The future and open-ended subscriptions stay active
+    assert db_session.query(Subscription).filter(Subscription.is_active == True).count() == 2
+
+    # Nothing left to do on the next run
+    assert deactivate_expired_subscriptions(db_session)["rows"] == 0
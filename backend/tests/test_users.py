@@ -1,3 +1,5 @@
+import pytest
+
 # --- POST TESTS ---
 def test_create_user_success(client):
     # 1. Action: Send a POST request to our FastAPI route
@@ -99,4 +101,79 @@ def test_user_cannot_get_all_subscriptions(client, user_token):
     # This checks your 'get_current_admin' dependency
     headers = {"Authorization": f"Bearer {user_token}"}
     response = client.get("/subscriptions/all", headers=headers)
-    assert response.status_code == 403
\ No newline at end of file
+    assert response.status_code == 403
+
+# --- QUERY COUNT TESTS ---
+@pytest.mark.parametrize("rows", [0, 1, 10])
+def test_get_user_query_count(client, seed_subscriptions, count_queries, rows):
+    user = client.post("/users/", json={"email": "nested@test.com", "name": "Nested", "password": "testpassword"}).json()
+    seed_subscriptions(user["id"], rows)
+
+    # One query for the user, one for its subscriptions with their plans
+    with count_queries() as statements:
+        response = client.get(f"/users/{user['id']}")
+    assert len(response.json()["subscriptions"]) == rows
+    assert len(statements) == 2
+
+def test_admin_list_users_pages(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for i in range(3):
+        client.post("/users/", json={"email": f"page{i}@test.com", "name": "Page", "password": "testpassword"})
+
+    first = client.get("/users/", headers=headers, params={"limit": 2})
+    assert first.status_code == 200
+    assert len(first.json()) == 2
+    second = client.get("/users/", headers=headers, params={"limit": 2, "cursor": first.headers["x-next-cursor"]})
+    assert len(second.json()) == 2 # admin + 3 users = 4
+    assert "x-next-cursor" not in second.headers
+
+def test_user_cannot_list_users(client, user_token):
+    response = client.get("/users/", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+
+# --- BULK IMPORT TESTS ---
+def test_bulk_import_json(client, admin_token, count_queries):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    rows = [
+        {"email": "new1@test.com", "name": "New One", "password": "pw1"},
+        {"email": "not-an-email", "name": "Bad", "password": "pw"},
+        {"email": "new1@test.com", "name": "Again", "password": "pw"},
+        {"email": "admin@test.com", "name": "Taken", "password": "pw"},
+        {"email": "new2@test.com", "name": "New Two", "password": "pw2"},
+    ]
+    with count_queries() as statements:
+        response = client.post("/users/bulk", json=rows, headers=headers)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["created"], report["duplicates"], report["invalid"]) == (2, 2, 1)
+    assert [r["status"] for r in report["results"]] == ["created", "invalid", "duplicate", "duplicate", "created"]
+    # one lookup for every email, one multi-row insert
+    assert sum(s.lstrip().upper().startswith("SELECT USERS.EMAIL") for s in statements) == 1
+    assert sum(s.lstrip().upper().startswith("INSERT INTO USERS") for s in statements) == 1
+
+    # Imported users can log in with their password
+    login = client.post("/auth/login", data={"username": "new2@test.com", "password": "pw2"})
+    assert login.status_code == 200
+
+def test_bulk_import_csv(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}", "Content-Type": "text/csv"}
+    body = "email,name,password\r\ncsv1@test.com,Csv One,pw\r\ncsv2@test.com,Csv Two,pw\r\n"
+    response = client.post("/users/bulk", content=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["created"] == 2
+
+    bad = client.post("/users/bulk", content="email,name\r\nx@test.com,X\r\n", headers=headers)
+    assert bad.status_code == 400
+
+def test_bulk_import_reports_non_string_email(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    rows = [{"email": 5, "name": "Number", "password": "pw123456"}, {"email": None, "name": "Null", "password": "pw123456"}]
+    response = client.post("/users/bulk", json=rows, headers=headers)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [(r["status"], r["email"]) for r in results] == [("invalid", "5"), ("invalid", None)]
+
+def test_bulk_import_forbidden_for_user(client, user_token):
+    headers = {"Authorization": f"Bearer {user_token}"}
+    response = client.post("/users/bulk", json=[], headers=headers)
+    assert response.status_code == 403
@@ -0,0 +1,59 @@
+# Multi-worker deployment (gunicorn.conf.py): connection budget per worker and engines across fork
+import os
+import runpy
+from pathlib import Path
+
+from sqlalchemy import text
+
+from app.config import Settings
+from app.database import connection
+
+def test_connection_budget_is_split_between_workers(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "5")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "10")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    # No budget: every worker gets the full pool
+    assert Settings.from_env().pool_options["max_overflow"] == 10
+
+    monkeypatch.setenv("DB_CONNECTION_BUDGET", "30")
+    options = Settings.from_env().pool_options
+    assert (options["pool_size"], options["max_overflow"]) == (5, 2) # 7 each, 28 in all
+
+    monkeypatch.setenv("DB_CONNECTION_BUDGET", "8")
+    options = Settings.from_env().pool_options
+    assert (options["pool_size"], options["max_overflow"]) == (2, 0)
+
+def test_forked_worker_gets_its_own_connections(db_session, monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "1") # loading the config must not switch /metrics to multiprocess mode
+    engine = connection.get_engine()
+    with engine.connect() as conn:
+        parent_pid = conn.execute(text("SELECT pg_backend_pid()")).scalar()
+
+    pid = os.fork()
+    if pid == 0: # the worker: what gunicorn's post_fork does, then a query
+        code = 1
+        try:
+            hooks = runpy.run_path(str(Path(__file__).parents[1] / "gunicorn.conf.py"))
+            hooks["post_fork"](None, None)
+            with connection.get_engine().connect() as conn:
+                code = 0 if conn.execute(text("SELECT pg_backend_pid()")).scalar() != parent_pid else 2
+        finally:
+            os._exit(code)
+    assert os.waitpid(pid, 0)[1] == 0
+
+    # The parent's pooled connection was left alone by the child
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT pg_backend_pid()")).scalar() == parent_pid
+    connection.reset_engines()
+
+def test_several_workers_need_a_shared_cache_backend(monkeypatch):
+    import logging
+    from types import SimpleNamespace
+
+    import pytest
+
+    monkeypatch.setenv("WEB_CONCURRENCY", "1")
+    hooks = runpy.run_path(str(Path(__file__).parents[1] / "gunicorn.conf.py"))
+    server = SimpleNamespace(num_workers=2, log=logging.getLogger("gunicorn.test"))
+    with pytest.raises(SystemExit):
+        hooks["on_starting"](server) # the test settings use CACHE_BACKEND=memory
@@ -0,0 +1,44 @@
+# Every write endpoint should cost one SQL statement (INSERT/UPDATE ... RETURNING), not SELECT + write + refresh
+
+def test_write_endpoints_use_one_statement(client, admin_token, user_token, count_queries):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    user = {"Authorization": f"Bearer {user_token}"}
+    # Warm the principal cache so authentication doesn't add its own lookup
+    client.get("/auth/me", headers=admin)
+    client.get("/auth/me", headers=user)
+
+    with count_queries() as statements:
+        plan = client.post("/plans/", json={"name": "Gold", "price": 20.0, "duration_months": 1}, headers=admin)
+    assert plan.status_code == 200
+    assert len(statements) == 1
+    plan_id = plan.json()["id"]
+
+    with count_queries() as statements:
+        updated = client.put(f"/plans/{plan_id}", json={"price": 25.0})
+    assert updated.json()["price"] == 25.0
+    assert len(statements) == 1
+
+    with count_queries() as statements:
+        sub = client.post("/subscriptions/", json={"plan_id": plan_id}, headers=user)
+    assert sub.status_code == 200
+    assert sub.json()["plan"]["id"] == plan_id
+    assert len(statements) == 1
+
+    with count_queries() as statements:
+        cancelled = client.patch(f"/subscriptions/{sub.json()['id']}/cancel", headers=user)
+    assert cancelled.json()["is_active"] is False
+    assert len(statements) == 1
+
+    with count_queries() as statements:
+        created = client.post("/users/", json={"email": "one@test.com", "name": "One", "password": "pw"})
+    assert created.status_code == 201
+    assert len(statements) == 2 # duplicate email check + INSERT ... RETURNING
+
+def test_cancel_someone_elses_subscription_is_forbidden(client, admin_token, user_token):
+    admin = {"Authorization": f"Bearer {admin_token}"}
+    plan_id = client.post("/plans/", json={"name": "Gold", "price": 20.0, "duration_months": 1}, headers=admin).json()["id"]
+    sub_id = client.post("/subscriptions/", json={"plan_id": plan_id}, headers=admin).json()["id"]
+
+    response = client.patch(f"/subscriptions/{sub_id}/cancel", headers={"Authorization": f"Bearer {user_token}"})
+    assert response.status_code == 403
+    assert client.patch("/subscriptions/9999/cancel", headers=admin).status_code == 404